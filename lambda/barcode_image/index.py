@@ -1,24 +1,38 @@
 import json
-import boto3
 from botocore.exceptions import ClientError
 import os
 import hashlib
 import uuid
 import base64
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger
+from aws_clients import lazy_client, lazy_resource
+from bedrock_client import ModelUnavailableError, invoke_model
+from model_metrics import record_cache_hit
+from item_codec import PRODUCT_ATTRIBUTES, decode_attributes
+from ttl_cache import MISSING, TTLCache
 
-tracer = Tracer()
 logger = Logger()
 
-bedrock = boto3.client("bedrock-runtime")
-dynamodb = boto3.resource('dynamodb')
-s3 = boto3.client('s3')
+# Created on first use, an image already generated only needs DynamoDB
+dynamodb = lazy_resource('dynamodb')
+s3 = lazy_client('s3')
 
 
 PRODUCT_SUMMARY_TABLE_NAME = os.environ['PRODUCT_SUMMARY_TABLE_NAME']
 PRODUCT_TABLE_NAME = os.environ['PRODUCT_TABLE_NAME']
 S3_BUCKET_NAME = os.environ['S3_BUCKET_NAME']
 
+# Models writing the prompt of the image, and generating the image
+PROMPT_MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+IMAGE_MODEL_ID = 'amazon.nova-canvas-v1:0'
+
+# Product table items read in this container, kept between invocations. The app retries while
+# a scanned product is still being generated, so its negative entry expires quickly.
+product_cache = TTLCache(maxsize=1024, ttl=300, negative_ttl=2)
+# Comma separated codes of the most scanned products, read into the cache at init
+PRELOAD_PRODUCT_CODES = [code for code in os.environ.get('PRELOAD_PRODUCT_CODES', '').split(',') if code]
+PRELOAD_LANGUAGES = os.environ.get('PRELOAD_LANGUAGES', 'english,french,italian').split(',')
+
 def generate_product_summary_prompt(
     user_preference_data, product_composition, product_name
 ):
@@ -95,23 +109,23 @@ def get_bedrock_text_reponse(response):
     return text
 
 
-def query_bedrock(payload, model_id):
+def query_bedrock(payload, model_id, call_site):
     try:
-        response = bedrock.invoke_model(
-            body=payload,
-            modelId=model_id,
+        response = invoke_model(
+            model_id,
+            payload,
+            call_site,
             contentType="application/json",
             accept="*/*",
             performanceConfigLatency='standard',
         )
         logger.debug("Bedrock response: %s", response)
-        input_token_count = response["ResponseMetadata"]["HTTPHeaders"]["x-amzn-bedrock-input-token-count"]
-        output_token_count = response["ResponseMetadata"]["HTTPHeaders"]["x-amzn-bedrock-output-token-count"]
-        logger.debug("Input_tokens = {}, Output_tokens = {}".format(input_token_count, output_token_count))
 
         return response
     except ClientError as error:
         logger.error(error.response)
+    except ModelUnavailableError as error:
+        logger.error(str(error))
     return None
 
     
@@ -145,13 +159,14 @@ def get_image(prompt):
    
     accept = "application/json"
     content_type = "application/json"
-    model_id = 'amazon.nova-canvas-v1:0'
+    model_id = IMAGE_MODEL_ID
 
     logger.debug(f"Generating image with Nova Canvas model {model_id}")
 
-    response = bedrock.invoke_model(
-        body=body,
-        modelId=model_id,
+    response = invoke_model(
+        model_id,
+        body,
+        'product_image',
         accept=accept,
         contentType=content_type,
         performanceConfigLatency='standard'
@@ -187,23 +202,28 @@ def map(input_json):
 
 
 def get_product_from_db(product_code, language):
-    table = dynamodb.Table(PRODUCT_TABLE_NAME)
-
     try:
-        response = table.get_item(
-            Key={
-                'product_code': product_code,
-                'language' : language
-            }
-        )
+        item = product_cache.get((product_code, language))
+        if item is None:
+            table = dynamodb.Table(PRODUCT_TABLE_NAME)
+            response = table.get_item(
+                Key={
+                    'product_code': product_code,
+                    'language' : language
+                }
+            )
+            item = decode_attributes(response['Item'], PRODUCT_ATTRIBUTES) if 'Item' in response else MISSING
+            # A product still being generated only has its generation lease
+            if item is not MISSING and item.get('ingredients') is None:
+                item = MISSING
+            product_cache.put((product_code, language), item)
         # Check if the item exists
-        if 'Item' in response:
-            item = response['Item']
+        if item is not MISSING:
             return item.get('product_name'), item.get('ingredients'), item.get('additives')
         else:
             return None, None, None
     except Exception as e:
-        logger.error("Error: get_product_from_db", e)
+        logger.error("Error: get_product_from_db: %s", e)
         return None, None, None
 
 def generate_combined_string(obj):
@@ -255,10 +275,10 @@ def call_bedrock(prompt_text):
 
     body = json.dumps(prompt_config)
 
-    modelId = "anthropic.claude-3-haiku-20240307-v1:0"
+    modelId = PROMPT_MODEL_ID
 
     response = get_bedrock_text_reponse(
-            query_bedrock(payload=body, model_id=modelId)
+            query_bedrock(payload=body, model_id=modelId, call_site='product_image_prompt')
     )
     
     return response
@@ -319,6 +339,28 @@ def get_image_url(product_code, params_hash):
             return response['Item']['imageUrl']  # Return the imageUrl if it exists
     return None  # Return None if imageUrl does not exist
 
+def preload_products(product_codes, languages):
+    """
+    Reads the given products from the product table into the cache.
+
+    Args:
+        product_codes (list): The codes of the products to preload.
+        languages (list): The languages of the items to preload.
+    """
+    try:
+        keys = [{'product_code': code, 'language': language} for code in product_codes for language in languages]
+        # BatchGetItem reads up to 100 keys per request, the unprocessed ones are left to the first requests
+        for i in range(0, len(keys), 100):
+            response = dynamodb.batch_get_item(RequestItems={PRODUCT_TABLE_NAME: {'Keys': keys[i:i + 100]}})
+            for item in response['Responses'].get(PRODUCT_TABLE_NAME, []):
+                product_cache.put((item['product_code'], item['language']), decode_attributes(item, PRODUCT_ATTRIBUTES))
+        logger.info("Preloaded products", extra={"products": len(product_cache)})
+    except Exception as e:
+        logger.error("Error while preloading the products: %s", e)
+
+if PRELOAD_PRODUCT_CODES:
+    preload_products(PRELOAD_PRODUCT_CODES, PRELOAD_LANGUAGES)
+
 @logger.inject_lambda_context(log_event=True)
 def handler(event, context):
     logger.info(event)
@@ -333,6 +375,7 @@ def handler(event, context):
         user_allergies = json_body.get("allergies")
 
         product_name, product_ingredients, product_additives = get_product_from_db(product_code, language)
+        logger.info("Cache statistics", extra={"product_cache": product_cache.stats()})
 
         if product_name is not None:
             logger.debug("Product found in the database")
@@ -340,6 +383,8 @@ def handler(event, context):
             image_url = get_image_url(product_code, hash_value)
             if image_url:
                 logger.debug("Image URL exists for the product_code and params_hash.")
+                record_cache_hit(PROMPT_MODEL_ID, 'product_image_prompt')
+                record_cache_hit(IMAGE_MODEL_ID, 'product_image')
             else:
                 logger.debug("Image URL does not exist yet for the product_code and params_hash.")
                 prompt_text = generate_product_summary_prompt(
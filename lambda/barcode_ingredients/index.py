@@ -1,23 +1,31 @@
 import time
-import boto3
+import concurrent.futures
 import json
+import math
+from collections import namedtuple
 from decimal import Decimal
 from botocore.exceptions import ClientError
 import urllib.parse
-import requests
-import json
+import base64
+import html
 import os
 import re
 import xml.etree.ElementTree as ET
 from aws_lambda_powertools import Logger, Tracer
-from typing import Dict, List, Optional, Tuple, Union, Any
-import re
+from aws_clients import lazy_client, lazy_resource
+from bedrock_client import invoke_model, invoke_model_stream
+from model_metrics import record_cache_hit
+from ingredients_text import canonical_name, ingredient_tokens, strip_brackets
+from item_codec import OPEN_FOOD_FACTS_ATTRIBUTES, PRODUCT_ATTRIBUTES, decode_attributes, encode_attributes
+from ttl_cache import MISSING, TTLCache
+from typing import Dict, List, Optional, Any
 
 tracer = Tracer()
 logger = Logger()
 
-bedrock = boto3.client("bedrock-runtime")
-dynamodb = boto3.resource('dynamodb')
+# Created on first use, as is the Bedrock client of bedrock_client, which a product already stored never needs
+dynamodb = lazy_resource('dynamodb')
+s3 = lazy_client('s3')
 
 class DecimalEncoder(json.JSONEncoder):
     """Enhanced JSON encoder for Decimal types with better error handling."""
@@ -29,6 +37,82 @@ class DecimalEncoder(json.JSONEncoder):
 
 PRODUCT_TABLE_NAME = os.environ['PRODUCT_TABLE_NAME']
 OPEN_FOOD_FACTS_TABLE_NAME = os.environ['OPEN_FOOD_FACTS_TABLE_NAME']
+# Descriptions of single ingredients, shared by all the products
+INGREDIENT_TABLE_NAME = os.environ.get('INGREDIENT_TABLE_NAME')
+# Barcodes unknown to the Open Food Facts API, and the number of seconds they are remembered
+NOT_FOUND_TABLE_NAME = os.environ.get('NOT_FOUND_TABLE_NAME')
+NOT_FOUND_TTL = int(os.environ.get('NOT_FOUND_TTL', '86400'))
+# Seconds to connect to and read from the Open Food Facts API, and before a second request is sent
+API_CONNECT_TIMEOUT = 3.05
+API_READ_TIMEOUT = float(os.environ.get('API_READ_TIMEOUT', '5'))
+API_HEDGE_DELAY = float(os.environ.get('API_HEDGE_DELAY', '1.5'))
+# Model generating the ingredients and additives descriptions
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+# Seconds the ingredients and additives generations may take together before the product is returned without them
+GENERATION_TIMEOUT = float(os.environ.get('GENERATION_TIMEOUT', '60'))
+# Seconds a product is leased to the invocation generating it, which also fetches and stores it
+GENERATION_LEASE = GENERATION_TIMEOUT + 30
+# Seconds another invocation generating the same product is waited for before generating it anyway,
+# as long as its lease so that a slow generation still runs once
+GENERATION_WAIT = float(os.environ.get('GENERATION_WAIT', GENERATION_LEASE))
+# Stores the large attributes of the product table items as compressed binary values
+COMPRESS_ATTRIBUTES = os.environ.get('COMPRESS_ATTRIBUTES', 'false').lower() == 'true'
+# Optional directory of a barcode index built by the Open Food Facts loader (--index-dir)
+BARCODE_INDEX_DIR = os.environ.get('BARCODE_INDEX_DIR')
+
+_barcode_index = None
+
+# Items read in this container, kept between invocations. A product missing from the product
+# table is soon generated by another invocation, so its negative entry expires quickly.
+product_cache = TTLCache(maxsize=1024, ttl=300, negative_ttl=10)
+open_food_facts_cache = TTLCache(maxsize=4096, ttl=3600, negative_ttl=300)
+# Expiry time of the barcodes known to be unknown to the Open Food Facts API
+not_found_cache = TTLCache(maxsize=4096, ttl=3600, negative_ttl=60)
+# Comma separated codes of the most scanned products, read into the caches at init
+PRELOAD_PRODUCT_CODES = [code for code in os.environ.get('PRELOAD_PRODUCT_CODES', '').split(',') if code]
+PRELOAD_LANGUAGES = os.environ.get('PRELOAD_LANGUAGES', 'english,french,italian').split(',')
+
+# Additive descriptions generated by scripts/additives/build-additives.py, per language, bundled in
+# ADDITIVES_DIR or written to ADDITIVES_BUCKET by the Open Food Facts load project
+ADDITIVES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'additives')
+ADDITIVES_BUCKET = os.environ.get('ADDITIVES_BUCKET')
+_additive_descriptions = {}
+
+# Maximum number of barcodes of a batch request, and number of its products generated at the same time
+BATCH_MAX_PRODUCTS = int(os.environ.get('BATCH_MAX_PRODUCTS', '100'))
+BATCH_GENERATION_CONCURRENCY = int(os.environ.get('BATCH_GENERATION_CONCURRENCY', '4'))
+# Seconds kept from the Lambda timeout to answer a batch request with the products generated so far
+BATCH_RESPONSE_MARGIN = 10
+
+# Kept across invocations so a generation past the timeout does not hold the response.
+# Each product generates its ingredients and additives descriptions at the same time.
+generation_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2 * max(BATCH_GENERATION_CONCURRENCY, 2))
+batch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_GENERATION_CONCURRENCY)
+
+# Maximum number of ingredients and characters of the list sent in one prompt. A longer list is split
+# between ingredients into chunks generated at the same time, so their answers stay well under max_tokens.
+INGREDIENTS_CHUNK_SIZE = int(os.environ.get('INGREDIENTS_CHUNK_SIZE', '25'))
+INGREDIENTS_CHUNK_LENGTH = int(os.environ.get('INGREDIENTS_CHUNK_LENGTH', '1500'))
+INGREDIENTS_CHUNK_CONCURRENCY = int(os.environ.get('INGREDIENTS_CHUNK_CONCURRENCY', '4'))
+# Separate from generation_executor, whose workers wait for the chunks
+chunk_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=INGREDIENTS_CHUNK_CONCURRENCY * max(BATCH_GENERATION_CONCURRENCY, 2))
+
+_api_session = None
+api_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2 * BATCH_GENERATION_CONCURRENCY)
+
+def get_barcode_index():
+    """
+    Opens the memory-mapped barcode index once per container, if one is configured.
+
+    Returns:
+        BarcodeIndex: The index, or None if BARCODE_INDEX_DIR is not set.
+    """
+    global _barcode_index
+    if _barcode_index is None and BARCODE_INDEX_DIR:
+        from barcode_index import BarcodeIndex
+        _barcode_index = BarcodeIndex(BARCODE_INDEX_DIR)
+    return _barcode_index
 
 def generate_ingredients_description(ingredients: str, language: str) -> str:
     """Generate ingredients description prompt with improved type safety."""
@@ -40,9 +124,11 @@ def generate_ingredients_description(ingredients: str, language: str) -> str:
 
 Extract each ingredient and generate a description for each ingredient to explain it to a 5 years old child. 
 Translate each ingredient name from its original language to {language} and provide the description in {language}.
+Copy the ingredient exactly as it is written in the list in the original element.
 Skip the preamble and provide only the response in this XML format:
 <ingredients>
     <ingredient>
+        <original>{{ORIGINAL}}</original>
         <name>{{INGREDIENT}}</name>
         <description>{{DESCRIPTION}}</description>
     </ingredient>
@@ -62,7 +148,7 @@ Extract each additive and generate a description for each additive to explain it
 Provide the description in {language}, skip the preambule and provide only the response in this XML format:
 <additives>
     <additive>
-        <name{{ADDITIVE}}</name>
+        <name>{{ADDITIVE}}</name>
         <description>{{DESCRIPTION}}</description>
     </additive>
 </additives>
@@ -95,6 +181,99 @@ class APIRequestError(Exception):
 class ProductNotFoundError(Exception):
     pass
 
+def get_api_session():
+    """
+    Returns the session kept across invocations to reuse the connections to the Open Food Facts API.
+
+    Failed connections, throttling and server errors are retried, other HTTP errors are returned at once.
+    requests is only imported by the invocations calling the API.
+    """
+    global _api_session
+    if _api_session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(
+            pool_maxsize=2 * BATCH_GENERATION_CONCURRENCY,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False),
+        ))
+        _api_session = session
+    return _api_session
+
+def hedged_get(url, headers, hedge_delay=API_HEDGE_DELAY):
+    """
+    Sends a GET request with the API session, and a second one if the first has not answered within the hedge delay.
+
+    Args:
+        url (str): The URL to get.
+        headers (dict): The headers of the request.
+        hedge_delay (float): The number of seconds before the second request is sent.
+
+    Returns:
+        requests.Response: The first response received.
+
+    Raises:
+        requests.RequestException: When both requests fail.
+    """
+    import requests
+
+    session = get_api_session()
+
+    def get():
+        return session.get(url, headers=headers, timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT))
+
+    first = api_executor.submit(get)
+    done, _ = concurrent.futures.wait([first], timeout=hedge_delay)
+    if done:
+        return first.result()
+    logger.debug("Slow API response, sending a second request")
+    error = None
+    for future in concurrent.futures.as_completed([first, api_executor.submit(get)]):
+        try:
+            return future.result()
+        except requests.RequestException as e:
+            error = e
+    raise error
+
+def is_product_not_found(product_code):
+    """
+    Checks whether a barcode was recently found unknown to the Open Food Facts API.
+
+    Args:
+        product_code (str): The code of the product.
+
+    Returns:
+        bool: True if the API answered 404 for the barcode less than NOT_FOUND_TTL seconds ago.
+    """
+    expires_at = not_found_cache.get(product_code)
+    if expires_at is None and NOT_FOUND_TABLE_NAME:
+        try:
+            response = dynamodb.Table(NOT_FOUND_TABLE_NAME).get_item(Key={'product_code': product_code})
+            # Expired items are only deleted by DynamoDB within a few days
+            expires_at = response['Item']['expires_at'] if 'Item' in response else MISSING
+        except Exception as e:
+            logger.error("Error while reading the not found products table: %s", e)
+            return False
+        not_found_cache.put(product_code, expires_at)
+    return expires_at not in (None, MISSING) and expires_at > time.time()
+
+def remember_product_not_found(product_code):
+    """
+    Records that a barcode is unknown to the Open Food Facts API for NOT_FOUND_TTL seconds.
+
+    Args:
+        product_code (str): The code of the product.
+    """
+    expires_at = int(time.time()) + NOT_FOUND_TTL
+    not_found_cache.put(product_code, expires_at)
+    if NOT_FOUND_TABLE_NAME:
+        try:
+            dynamodb.Table(NOT_FOUND_TABLE_NAME).put_item(Item={'product_code': product_code, 'expires_at': expires_at})
+        except Exception as e:
+            logger.error("Error while writing the not found products table: %s", e)
+
 @tracer.capture_method
 def make_api_request(product_code: str) -> Optional[Dict[str, Any]]:
     """
@@ -113,6 +292,8 @@ def make_api_request(product_code: str) -> Optional[Dict[str, Any]]:
         ValueError: For other HTTP errors
         Exception: For general request failures
     """
+    import requests
+
     api_url = os.environ.get('API_URL')
     if not api_url:
         raise ValueError("API_URL environment variable is not set")
@@ -124,7 +305,7 @@ def make_api_request(product_code: str) -> Optional[Dict[str, Any]]:
     logger.debug("Calling the API to get the product informations")
 
     try:
-        response = requests.get(full_url, headers=headers, timeout=5)
+        response = hedged_get(full_url, headers)
         response.raise_for_status()  # Optional: Raises an exception for 4xx and 5xx status codes.
         json_data = response.json()
 
@@ -149,7 +330,7 @@ def make_api_request(product_code: str) -> Optional[Dict[str, Any]]:
         logger.error(error_message)
         raise Exception(error_message)
 
-def call_claude_haiku(prompt_text):
+def call_claude_haiku(prompt_text, call_site):
 
     prompt_config = {
         "anthropic_version": "bedrock-2023-05-31",
@@ -169,13 +350,13 @@ def call_claude_haiku(prompt_text):
 
     body = json.dumps(prompt_config)
 
-    modelId = "anthropic.claude-3-haiku-20240307-v1:0"
     accept = "application/json"
     contentType = "application/json"
 
-    response = bedrock.invoke_model(
-        body=body,
-        modelId=modelId,
+    response = invoke_model(
+        MODEL_ID,
+        body,
+        call_site,
         accept=accept,
         contentType=contentType,
         performanceConfigLatency='standard',
@@ -185,6 +366,34 @@ def call_claude_haiku(prompt_text):
     results = response_body.get("content")[0].get("text")
     return results
 
+def call_claude_haiku_stream(prompt_text, call_site):
+    """
+    Same as call_claude_haiku, but yields the text of the answer as it is generated.
+
+    Args:
+        prompt_text (str): The prompt.
+        call_site (str): The feature the model is called for, in the metrics of the call.
+
+    Yields:
+        str: The next piece of the answer.
+    """
+    body = json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 4096,
+        "messages": [{"role": "user", "content": [{"type": "text", "text": prompt_text}]}],
+    })
+    chunks = invoke_model_stream(
+        MODEL_ID,
+        body,
+        call_site,
+        accept="application/json",
+        contentType="application/json",
+        performanceConfigLatency='standard',
+    )
+    for chunk in chunks:
+        if chunk.get("type") == "content_block_delta":
+            yield chunk["delta"].get("text", "")
+
 def filter_nutriments(nutriments: Optional[Dict[str, Any]]) -> Dict[str, Decimal]:
     """
     Filters nutriments to only include key nutritional fields.
@@ -235,134 +444,499 @@ def clean_text_in_brackets(text):
     Returns:
         str: The extracted text without any enclosed text within parentheses, square brackets, or curly braces.
     """
-    # Initialize a counter to keep track of the depth of nested brackets
-    bracket_depth = 0
-    cleaned_text = ''
-
-    # Iterate over each character in the text
-    for char in text:
-        if char == '(' or char == '[' or char == '{':
-            # If we encounter an opening bracket, increase the depth counter
-            bracket_depth += 1
-        elif char == ')' or char == ']' or char == '}':
-            # If we encounter a closing bracket, decrease the depth counter
-            bracket_depth -= 1
-        elif bracket_depth == 0:
-            # If we are not inside any bracketed expression, add the character to the cleaned text
-            cleaned_text += char
-    
-    # Remove any extra spaces and return the result
-    cleaned_text = ' '.join(cleaned_text.split())
-
-    words = cleaned_text.split()  # Split the text into words
+    words = strip_brackets(text).split()
     if words:
         words[0] = words[0].capitalize()  # Capitalize the first word
-    cleaned_text = ' '.join(words)  # Join the words back together
-    
-    return cleaned_text
+    return ' '.join(words)
 
 
-def parse_ingredients_description(ingredients, language):
+def get_cached_ingredients(names, language):
     """
-    Parses the ingredients' descriptions from the provided XML format and returns a dictionary.
+    Retrieves the cached descriptions of ingredients.
+
+    Args:
+        names (list): The normalized ingredient names.
+        language (str): The language of the descriptions.
+
+    Returns:
+        dict: The (name, description) tuple of each cached normalized name.
+    """
+    cached = {}
+    if not INGREDIENT_TABLE_NAME or not names:
+        return cached
+    try:
+        keys = [{'ingredient': name, 'language': language} for name in dict.fromkeys(names)]
+        # BatchGetItem reads up to 100 keys per request
+        for i in range(0, len(keys), 100):
+            request = {INGREDIENT_TABLE_NAME: {'Keys': keys[i:i + 100]}}
+            for _ in range(3):
+                response = dynamodb.batch_get_item(RequestItems=request)
+                for item in response['Responses'].get(INGREDIENT_TABLE_NAME, []):
+                    cached[item['ingredient']] = (item['name'], item['description'])
+                request = response.get('UnprocessedKeys')
+                if not request:
+                    break
+    except Exception as e:
+        logger.error("Error while getting the ingredients from the cache: %s", e)
+    return cached
+
+
+def cache_ingredients(descriptions, language):
+    """
+    Stores generated ingredient descriptions in the cache.
+
+    Args:
+        descriptions (dict): The (name, description) tuple of each normalized name.
+        language (str): The language of the descriptions.
+    """
+    if not INGREDIENT_TABLE_NAME or not descriptions:
+        return
+    try:
+        with dynamodb.Table(INGREDIENT_TABLE_NAME).batch_writer() as batch:
+            for ingredient, (name, description) in descriptions.items():
+                batch.put_item(Item={
+                    'ingredient': ingredient,
+                    'language': language,
+                    'name': name,
+                    'description': description,
+                })
+    except Exception as e:
+        logger.error("Error while saving the ingredients into the cache: %s", e)
+
+
+class XmlItemStream:
+    """
+    Extracts the items with a given tag from XML text received in pieces, such as a model answer.
+
+    The answer does not need to be a well-formed document: each item is parsed on its own as soon
+    as it is complete. An item rejected by the XML parser, for instance because of an unescaped &
+    or a broken tag, is salvaged by reading its fields one by one. Items that still miss a required
+    field, and an item left unfinished by a truncated answer, are recorded in dropped.
 
     Args:
-        ingredients (list): A list of ingredients.
+        tag (str): The tag of the items to extract, such as ingredient.
+        fields (tuple): The tags of the fields to read from each item.
+        required (tuple): The fields an item cannot be used without, all of them if None.
+
+        >>> stream = XmlItemStream('ingredient', ('name', 'description'))
+        >>> stream.feed("<ingredients><ingredient><name>Salt</name><descr")
+        []
+        >>> stream.feed("iption>Sodium chloride</description></ingredient>")
+        [{'name': 'Salt', 'description': 'Sodium chloride'}]
+        >>> stream.feed("<ingredient><name>M&M's</name><description>Candy &amp; chocolate</description></ingredient>")
+        [{'name': "M&M's", 'description': 'Candy & chocolate'}]
+        >>> stream.feed("<ingredient><name>Water</name></ingredient><ingredient><name>Sug")
+        []
+        >>> [entry['reason'] for entry in stream.dropped], stream.buffer
+        (['missing description'], '<ingredient><name>Sug')
+    """
+
+    def __init__(self, tag, fields, required=None):
+        self.tag = tag
+        self.fields = fields
+        self.required = fields if required is None else required
+        self.item_pattern = re.compile(r'<{0}\b[^<]*>(.*?)</{0}\s*>'.format(tag), re.DOTALL)
+        self.field_patterns = {
+            field: re.compile(r'<{0}([^<]*)</{0}\s*>'.format(field), re.DOTALL) for field in fields
+        }
+        self.buffer = ''
+        self.dropped = []
+
+    def parse_item(self, text):
+        """
+        Reads the fields of an item.
+
+        Args:
+            text (str): The XML of the item, its own tag included.
+
+        Returns:
+            dict: The stripped text of each field found in the item, None if a required field is missing.
+        """
+        try:
+            element = ET.fromstring(text)
+            item = {field: (element.findtext(field) or '').strip() for field in self.fields}
+        except ET.ParseError:
+            item = {}
+            for field, pattern in self.field_patterns.items():
+                match = pattern.search(text)
+                if match is None:
+                    continue
+                value = match.group(1)
+                # Drops what is left of the opening tag, such as '>' or attributes
+                if '>' in value:
+                    value = value.split('>', 1)[1]
+                item[field] = html.unescape(value).strip()
+        missing = [field for field in self.required if not item.get(field)]
+        if missing:
+            self.dropped.append({'reason': f"missing {', '.join(missing)}", 'text': text[:200]})
+            return None
+        return item
+
+    def feed(self, text):
+        """
+        Adds a piece of text.
+
+        Args:
+            text (str): The next piece of the XML text.
+
+        Returns:
+            list: The items completed by the piece, as dictionaries of their fields.
+        """
+        self.buffer += text
+        items = []
+        end = 0
+        for match in self.item_pattern.finditer(self.buffer):
+            end = match.end()
+            item = self.parse_item(match.group(0))
+            if item is not None:
+                items.append(item)
+        self.buffer = self.buffer[end:]
+        return items
+
+    def close(self):
+        """
+        Ends the text and records the unfinished item left by a truncated answer, if any.
+        """
+        match = re.search(r'<{}\b'.format(self.tag), self.buffer)
+        if match:
+            self.dropped.append({'reason': 'truncated', 'text': self.buffer[match.start():match.start() + 200]})
+        self.buffer = ''
+        if self.dropped:
+            logger.warning(f"Dropped {len(self.dropped)} {self.tag} entries from the model answer",
+                           extra={"dropped": self.dropped})
+
+
+def chunk_ingredients(parts, max_size=INGREDIENTS_CHUNK_SIZE, max_length=INGREDIENTS_CHUNK_LENGTH):
+    """
+    Splits a list of ingredients into chunks of about the same size.
+
+    Args:
+        parts (list): The canonical names of the ingredients, in the order of the ingredients text.
+        max_size (int): The maximum number of ingredients of a chunk.
+        max_length (int): The maximum number of characters of a chunk, exceeded only by a single longer ingredient.
 
     Returns:
-        dict: A dictionary containing ingredient names as keys and their descriptions as values.
+        list: The chunks, lists of consecutive ingredients in the order of the text.
+
+        >>> [len(chunk) for chunk in chunk_ingredients(['salt'] * 60, max_size=25)]
+        [20, 20, 20]
+        >>> chunk_ingredients(['wheat flour', 'cocoa butter', 'salt'], max_length=20)
+        [['wheat flour'], ['cocoa butter', 'salt']]
+        >>> chunk_ingredients([])
+        []
+    """
+    count = max(math.ceil(len(parts) / max_size), math.ceil(sum(len(part) + 2 for part in parts) / max_length), 1)
+    size = math.ceil(len(parts) / count)
+    chunks = []
+    chunk = []
+    length = 0
+    for part in parts:
+        if chunk and (len(chunk) >= size or length + len(part) > max_length):
+            chunks.append(chunk)
+            chunk = []
+            length = 0
+        chunk.append(part)
+        length += len(part) + 2
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def describe_ingredients(parts, language, stream=False):
     """
+    Asks the model to describe a list of ingredients.
+
+    Args:
+        parts (list): The canonical names of the ingredients.
+        language (str): The language of the descriptions.
+        stream (bool): Yields the descriptions while the answer of the model is streamed.
+
+    Yields:
+        dict: The original, name and description of an ingredient, in the order of the answer.
+    """
+    prompt = generate_ingredients_description(', '.join(parts), language)
+    answer = call_claude_haiku_stream(prompt, 'ingredients') if stream else [call_claude_haiku(prompt, 'ingredients')]
+    items = XmlItemStream('ingredient', ('original', 'name', 'description'), required=('name', 'description'))
+    for text in answer:
+        yield from items.feed(text)
+    items.close()
+
+
+def iter_generated_ingredients(parts, language, stream=False):
+    """
+    Describes the ingredients, in parallel chunks when the list is long.
+
+    The answers are merged in the order of the chunks, whatever order they complete in. While the
+    first chunk is streamed, the others are generated in the background. A chunk that fails or does
+    not complete within GENERATION_TIMEOUT only leaves out its own ingredients.
+
+    Args:
+        parts (list): The canonical names of the ingredients.
+        language (str): The language of the descriptions.
+        stream (bool): Yields the descriptions of the first chunk while its answer is streamed.
+
+    Yields:
+        dict: The original, name and description of an ingredient.
+    """
+    chunks = chunk_ingredients(parts)
+    if len(chunks) == 1:
+        yield from describe_ingredients(chunks[0], language, stream)
+        return
+
+    logger.debug(f"{len(parts)} ingredients generated in {len(chunks)} chunks")
+    deadline = time.monotonic() + GENERATION_TIMEOUT
+    futures = [chunk_executor.submit(lambda chunk: list(describe_ingredients(chunk, language)), chunk)
+               for chunk in chunks[1:]]
     try:
-        xml_ingredients = call_claude_haiku(generate_ingredients_description(ingredients, language))
-        ingredients_and_descriptions = {}
+        yield from describe_ingredients(chunks[0], language, stream)
+    except Exception as e:
+        logger.error("Impossible to generate the descriptions of a chunk of ingredients: %s", e)
+    for i, future in enumerate(futures, 1):
+        try:
+            yield from future.result(timeout=max(deadline - time.monotonic(), 0))
+        except concurrent.futures.TimeoutError:
+            logger.error(f"The descriptions of chunk {i + 1} of {len(chunks)} were not generated within {GENERATION_TIMEOUT} seconds")
+        except Exception as e:
+            logger.error("Impossible to generate the descriptions of a chunk of ingredients: %s", e)
 
-        root = ET.fromstring(xml_ingredients)
-        for ingredient in root.iter('ingredient'):
-            name = clean_text_in_brackets(ingredient.find('name').text)
-            description = ingredient.find('description').text
-            ingredients_and_descriptions[name] = description
-        return ingredients_and_descriptions
 
+def iter_ingredients_description(ingredients, language, stream=False):
+    """
+    Yields the description of each ingredient as soon as it is known.
+
+    Descriptions already generated for another product are read from the ingredient cache and
+    yielded first, only the other ingredients are sent to the model and their descriptions are cached.
+    The ingredients and their bracketed sub-ingredients are looked up and sent one by one, by their
+    canonical names, so a list gets the same descriptions whatever is already in the cache.
+
+    Args:
+        ingredients (str): The ingredients text of the product.
+        language (str): The language of the descriptions.
+        stream (bool): Yields the generated descriptions while the answer of the model is streamed.
+
+    Yields:
+        tuple: The name and the description of an ingredient.
+    """
+    # The allergen statements are left out, and each ingredient is described once
+    names = ingredient_tokens(ingredients, nested=True) or [name for name in (canonical_name(ingredients),) if name]
+    cached = get_cached_ingredients(names, language)
+    uncached = []
+    for name in names:
+        if name in cached:
+            yield cached[name]
+        else:
+            uncached.append(name)
+    logger.debug(f"{len(names) - len(uncached)} of {len(names)} ingredients found in the cache")
+    if not uncached:
+        record_cache_hit(MODEL_ID, 'ingredients')
+        return
+
+    generated = {}
+    for ingredient in iter_generated_ingredients(uncached, language, stream):
+        name = clean_text_in_brackets(ingredient['name'])
+        description = ingredient['description']
+        yield name, description
+        if ingredient.get('original') and name:
+            generated[canonical_name(ingredient['original'])] = (name, description)
+    generated.pop('', None)
+    cache_ingredients(generated, language)
+
+
+def parse_ingredients_description(ingredients, language):
+    """
+    Parses the ingredients' descriptions from the provided XML format and returns a dictionary.
+
+    Args:
+        ingredients (str): The ingredients text of the product.
+
+    Returns:
+        dict: A dictionary containing ingredient names as keys and their descriptions as values,
+              None if no description could be generated. Entries dropped from a partial answer are left out.
+    """
+    try:
+        return dict(iter_ingredients_description(ingredients, language)) or None
     except Exception as e:
-        logger.error("Impossible to generate ingrediens descriptions", e)
+        logger.error("Impossible to generate ingrediens descriptions: %s", e)
         return None
     
 
+def get_additive_descriptions(language):
+    """
+    Loads the precomputed additive descriptions of a language once per container, from the
+    files bundled with the function or else from the additives bucket.
+
+    Args:
+        language (str): The language of the descriptions.
+
+    Returns:
+        dict: The name and description of each additive tag, empty if none were generated for the language.
+    """
+    if language not in _additive_descriptions:
+        file_name = f'{os.path.basename(language.lower())}.json'
+        path = os.path.join(ADDITIVES_DIR, file_name)
+        descriptions = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                descriptions = json.load(f)
+        elif ADDITIVES_BUCKET:
+            try:
+                response = s3.get_object(Bucket=ADDITIVES_BUCKET, Key=file_name)
+                descriptions = json.loads(response['Body'].read())
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'NoSuchKey':
+                    # Not remembered, the next invocation reads the bucket again
+                    logger.error("Error while reading the additive descriptions: %s", e)
+                    return descriptions
+        _additive_descriptions[language] = descriptions
+    return _additive_descriptions[language]
+
+
 def parse_additives_description(additives, language):
     """
     Parses the additives' descriptions from the provided XML format and returns a dictionary.
 
+    The additives are looked up in the precomputed descriptions first, only the unknown
+    ones are sent to the model.
+
     Args:
         additives (list): A list of additives.
 
     Returns:
-        dict: A dictionary containing additive names as keys and their descriptions as values.
+        dict: A dictionary containing additive names as keys and their descriptions as values,
+              None if no description could be generated. Entries dropped from a partial answer are left out.
     """
     try:
-        xml_additives= call_claude_haiku(generate_additives_description(additives, language))
+        known = get_additive_descriptions(language)
         additives_and_descriptions = {}
-        root = ET.fromstring(xml_additives)
-
-        for additive in root.iter('additive'):
-            name = clean_text_in_brackets(additive.find('name').text)
-            description = additive.find('description').text
-            additives_and_descriptions[name] = description
-
-        
-        return additives_and_descriptions
+        unknown = []
+        for additive in additives:
+            entry = known.get(additive.strip().lower())
+            if entry:
+                additives_and_descriptions[entry['name']] = entry['description']
+            else:
+                unknown.append(additive)
+        if not unknown:
+            record_cache_hit(MODEL_ID, 'additives')
+            return additives_and_descriptions
+        logger.debug(f"{len(unknown)} additives without a precomputed description", extra={"additives": unknown})
+
+        xml_additives= call_claude_haiku(generate_additives_description(unknown, language), 'additives')
+        items = XmlItemStream('additive', ('name', 'description'))
+        for additive in items.feed(xml_additives):
+            name = clean_text_in_brackets(additive['name'])
+            additives_and_descriptions[name] = additive['description']
+        items.close()
+
+        return additives_and_descriptions or None
     except Exception as e:
-        logger.error("Impossible to generate additives descriptions", e)
+        logger.error("Impossible to generate additives descriptions: %s", e)
         return None
 
+# A product of the product table, with the body of its response rendered once per container.
+# A cached product is answered with its body as is, without building or encoding the response.
+ProductRecord = namedtuple('ProductRecord', (
+    'product_name', 'ingredients', 'additives', 'allergens_tags', 'nutriments', 'labels_tags', 'categories',
+    'nova_group', 'nutriscore_grade', 'ecoscore_grade', 'brands', 'image_small_url', 'image_thumb_url', 'body',
+))
+
+def product_response(product):
+    """
+    Builds the response of a product.
+
+    Args:
+        product (ProductRecord): The product.
+
+    Returns:
+        dict: The product fields sent to the app.
+    """
+    product_name, response_ingredients, response_additives, allergens, nutriments, labels, categories, nova_group, nutriscore_grade, ecoscore_grade, brands, image_small_url, image_thumb_url = product[:-1]
+    if(response_ingredients is None):
+        response_ingredients = {"Ingredients Generation Error": "Description Generation Unavailable"}
+    return {
+            "ingredients_description": response_ingredients,
+            "additives_description": response_additives,
+            "product_name": product_name,
+            "allergens_tags": allergens,
+            "nutriments": nutriments,
+            "labels_tags": labels,
+            "categories": categories,
+            "nova_group": nova_group,
+            "nutriscore_grade": nutriscore_grade,
+            "ecoscore_grade": ecoscore_grade,
+            "brands": brands,
+            "image_small_url": image_small_url,
+            "image_thumb_url": image_thumb_url
+    }
+
+def make_product_record(product_name, ingredients, additives, allergens_tags, nutriments, labels_tags, categories, nova_group, nutriscore_grade, ecoscore_grade, brands, image_small_url=None, image_thumb_url=None):
+    """
+    Builds the record of a product and renders its response body.
+
+    Returns:
+        ProductRecord: The product.
+    """
+    product = ProductRecord(product_name, ingredients, additives, allergens_tags, nutriments, labels_tags, categories,
+                            nova_group, nutriscore_grade, ecoscore_grade, brands, image_small_url, image_thumb_url, None)
+    return product._replace(body=json.dumps(product_response(product), cls=DecimalEncoder))
+
+def product_record_from_item(item):
+    """
+    Builds the record of a product from its decoded product table item.
+
+    Args:
+        item (dict): The item.
+
+    Returns:
+        ProductRecord: The product, or MISSING if the item is only the generation lease of a product being generated.
+    """
+    if item.get('ingredients') is None or item.get('additives') is None:
+        return MISSING
+    return make_product_record(
+        item.get('product_name'), item.get('ingredients'), item.get('additives'), item.get('allergens_tags', []),
+        item.get('nutriments', {}), item.get('labels_tags', []), item.get('categories', ''), item.get('nova_group'),
+        item.get('nutriscore_grade'), item.get('ecoscore_grade'), item.get('brands'), item.get('image_small_url'),
+        item.get('image_thumb_url'),
+    )
+
+def record_stored_products(count=1):
+    """
+    Records the products answered from the product table, whose descriptions needed no model call.
+
+    Args:
+        count (int): The number of products.
+    """
+    for call_site in ('ingredients', 'additives'):
+        record_cache_hit(MODEL_ID, call_site, count)
+
 @tracer.capture_method
-def get_product_from_db(product_code, language):
+def get_product_from_db(product_code, language, use_cache=True):
     """
     Retrieves product information from the database using the provided product code.
 
     Args:
         product_code (str): The code of the product to retrieve information for.
+        use_cache (bool): Whether to answer from the cache of the container.
 
     Returns:
-        tuple: A tuple containing product name, ingredients, additives, allergens, nutriments, labels, categories,
-               nova_group, nutriscore_grade, ecoscore_grade, brands, and image URLs if the product is found in the database;
-               otherwise, returns (None, None, None, None, None, None, None, None, None, None, None, None, None).
+        ProductRecord: The product if it is found in the database, otherwise None.
     """
 
-    table = dynamodb.Table(PRODUCT_TABLE_NAME)
     try:
-        response = table.get_item(
-            Key={
-                'product_code': product_code,
-                'language' : language
-            }
-        )
-        if 'Item' in response:
-
-            item = response['Item']
-            
-            product_name = item.get('product_name')
-            ingredients = item.get('ingredients')
-            additives = item.get('additives')
-            allergens = item.get('allergens_tags', [])
-            nutriments = item.get('nutriments', {})
-            labels = item.get('labels_tags', [])
-            categories = item.get('categories', '')
-            nova_group = item.get('nova_group')
-            nutriscore_grade = item.get('nutriscore_grade')
-            ecoscore_grade = item.get('ecoscore_grade')
-            brands = item.get('brands')
-            image_small_url = item.get('image_small_url')
-            image_thumb_url = item.get('image_thumb_url')
-            
-            # Check if either ingredients or additives don't exist, then return None
-            if ingredients is None or additives is None:
-                return None, None, None, None, None, None, None, None, None, None, None, None, None
-            return product_name, ingredients, additives, allergens, nutriments, labels, categories, nova_group, nutriscore_grade, ecoscore_grade, brands, image_small_url, image_thumb_url
-        else:
-            return None, None, None, None, None, None, None, None, None, None, None, None, None
+        product = product_cache.get((product_code, language)) if use_cache else None
+        if product is None:
+            table = dynamodb.Table(PRODUCT_TABLE_NAME)
+            response = table.get_item(
+                Key={
+                    'product_code': product_code,
+                    'language' : language
+                }
+            )
+            product = product_record_from_item(decode_attributes(response['Item'], PRODUCT_ATTRIBUTES)) if 'Item' in response else MISSING
+            product_cache.put((product_code, language), product)
+        return None if product is MISSING else product
     except Exception as e:
-        logger.error("Error while getting the Product from database", e)
-        return None, None, None, None, None, None, None, None, None, None, None, None, None
+        logger.error("Error while getting the Product from database: %s", e)
+        return None
 
 @tracer.capture_method
 def write_product_to_db(product_code, language, product_name, ingredients, additives, allergens, nutriments, labels, categories, nova_group, nutriscore_grade, ecoscore_grade, brands, image_small_url=None, image_thumb_url=None):
@@ -438,8 +1012,13 @@ def write_product_to_db(product_code, language, product_name, ingredients, addit
         if image_thumb_url:
             item['image_thumb_url'] = image_thumb_url
 
+        cached_item = item
+        if COMPRESS_ATTRIBUTES:
+            item = encode_attributes(item, PRODUCT_ATTRIBUTES)
+
         # Write item to DynamoDB table
         response = table.put_item(Item=item)
+        product_cache.put((product_code, language), product_record_from_item(cached_item))
         
         # Check if write was successful
         if response['ResponseMetadata']['HTTPStatusCode'] == 200:
@@ -449,7 +1028,7 @@ def write_product_to_db(product_code, language, product_name, ingredients, addit
             logger.debug("Product written successfully to Product Table")
 
     except Exception as e:
-        logger.error("Error while saving the Product into database", e)
+        logger.error("Error while saving the Product into database: %s", e)
         raise Exception("Error while saving the Product into database")
 
 
@@ -467,23 +1046,92 @@ def get_product_from_open_food_facts_db(product_code):
     dict: The item from the table if found, otherwise an error message.
     """
     
-    # Reference to the DynamoDB table
-    table = dynamodb.Table(OPEN_FOOD_FACTS_TABLE_NAME)
-    
     try:
+        item = open_food_facts_cache.get(product_code)
+        if item is not None:
+            return None if item is MISSING else item
+
+        # Look up the local barcode index first, it answers without a network round trip
+        try:
+            barcode_index = get_barcode_index()
+            if barcode_index is not None:
+                item = barcode_index.get_item(product_code)
+                if item is not None:
+                    logger.debug("Product found in barcode index")
+                    return item
+        except Exception as e:
+            # The table still answers when the index cannot be opened or read
+            logger.error("Error while reading the barcode index: %s", e)
+
+        # Reference to the DynamoDB table
+        table = dynamodb.Table(OPEN_FOOD_FACTS_TABLE_NAME)
+
         # Get the item from the table
         response = table.get_item(Key={"product_code": product_code})
         # Check if the item exists in the response
         if 'Item' in response:
             logger.debug("Product found in local database")
-            return response['Item']
+            item = response['Item']
+            # The loader may store the large product attributes compressed (--compress)
+            item['product'] = decode_attributes(item.get('product', {}), OPEN_FOOD_FACTS_ATTRIBUTES)
+            open_food_facts_cache.put(product_code, item)
+            return item
         else:
+            open_food_facts_cache.put(product_code, MISSING)
             return None
     except Exception as e:
-        logger.error("Error while getting the Product from get_product_from_open_food_facts_db table", e)
+        logger.error("Error while getting the Product from get_product_from_open_food_facts_db table: %s", e)
         return None
     
-def fetch_new_product(product_code, language):
+def generate_descriptions(ingredients, additives, language, timeout=GENERATION_TIMEOUT):
+    """
+    Generates the ingredients and additives descriptions concurrently.
+
+    A generation that fails or does not complete within the timeout only leaves its own
+    descriptions out, the other one is still returned.
+
+    Args:
+        ingredients (str): The ingredients text of the product.
+        additives (list): The additives tags of the product, no generation is made if empty.
+        language (str): The language of the descriptions.
+        timeout (float): The number of seconds shared by both generations.
+
+    Returns:
+        tuple: The ingredients and additives descriptions, each None if its generation failed.
+    """
+    deadline = time.monotonic() + timeout
+    futures = {'ingredients': generation_executor.submit(parse_ingredients_description, ingredients, language)}
+    if additives:
+        futures['additives'] = generation_executor.submit(parse_additives_description, additives, language)
+
+    results = {'additives': additives}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+        except concurrent.futures.TimeoutError:
+            logger.error(f"The {name} descriptions were not generated within {timeout} seconds")
+            results[name] = None
+        except Exception as e:
+            logger.error(f"Impossible to generate {name} descriptions: %s", e)
+            results[name] = None
+    return results['ingredients'], results['additives']
+
+# Product fields sent along the descriptions, with their value when the product does not have them
+PRODUCT_FACTS = {
+    'product_name': None,
+    'allergens_tags': [],
+    'nutriments': {},
+    'labels_tags': [],
+    'categories': '',
+    'nova_group': None,
+    'nutriscore_grade': None,
+    'ecoscore_grade': None,
+    'brands': None,
+    'image_small_url': None,
+    'image_thumb_url': None,
+}
+
+def fetch_product_facts(product_code):
     """
     Fetches product information from the local table, if not found call the API using the provided product code.
 
@@ -491,86 +1139,386 @@ def fetch_new_product(product_code, language):
         product_code (str): The code of the product to fetch.
 
     Returns:
-        tuple: A tuple containing dictionaries of ingredients, additives, allergens, nutriments, labels, categories,
-               nova_group, nutriscore_grade, ecoscore_grade, brands, and product name,
-               if the product information is successfully fetched from the API; otherwise, returns (None, None, None, None, None, None, None, None, None, None, None).
-    """
+        tuple: The ingredients text, the additives tags and a dictionary of the PRODUCT_FACTS fields,
+               or (None, None, None) if the product information could not be fetched.
 
+    Raises:
+        ProductNotFoundError: When the product is unknown to the Open Food Facts API, recently or now.
+    """
     response_data = get_product_from_open_food_facts_db(product_code)
     if response_data is None:
         logger.debug("Product not found in local table, trying the API")
-        response_data = make_api_request(product_code)
-
-    if response_data is not None:
-
-        additives=[]
-        allergens=[]
-        nutriments={}
-        labels=[]
-        categories=''
-        nova_group=None
-        nutriscore_grade=None
-        ecoscore_grade=None
-        brands=None
-        image_small_url=None
-        image_thumb_url=None
-        
-        if 'product' not in response_data or 'ingredients_text' not in response_data['product']:
-            raise ValueError("Missing ingredients in Open Food Facts API. Unable to generate a personalized summary for this product.")
+        if is_product_not_found(product_code):
+            raise ProductNotFoundError("Product not found on Open Food Facts API")
+        try:
+            response_data = make_api_request(product_code)
+        except ProductNotFoundError:
+            remember_product_not_found(product_code)
+            raise
 
-        ingredients=response_data['product']['ingredients_text']
-        product_name=response_data['product']['product_name']
-        if not ingredients:
-            raise ValueError("Missing ingredients in Open Food Facts API. Unable to generate a personalized summary for this product.")
-        response_ingredients = parse_ingredients_description(ingredients, language)
+    if response_data is None:
+        return None, None, None
 
-        if 'product' in response_data and 'additives_tags' in response_data['product'] and response_data['product']['additives_tags']:
-            additives = response_data['product']['additives_tags']
+    if 'product' not in response_data or 'ingredients_text' not in response_data['product']:
+        raise ValueError("Missing ingredients in Open Food Facts API. Unable to generate a personalized summary for this product.")
 
-        response_additives = additives
-        if additives:
-            response_additives = parse_additives_description(additives, language)
-            
-        # Extract allergens
-        if 'product' in response_data and 'allergens_tags' in response_data['product']:
-            allergens = response_data['product']['allergens_tags']
-            
-        # Extract and filter nutriments
-        if 'product' in response_data and 'nutriments' in response_data['product']:
-            nutriments = filter_nutriments(response_data['product']['nutriments'])
-            
-        # Extract labels
-        if 'product' in response_data and 'labels_tags' in response_data['product']:
-            labels = response_data['product']['labels_tags']
-            
-        # Extract categories
-        if 'product' in response_data and 'categories' in response_data['product']:
-            categories = response_data['product']['categories']
-            
-        # Extract quality indicators
-        if 'product' in response_data and 'nova_group' in response_data['product']:
-            nova_group = response_data['product']['nova_group']
-            
-        if 'product' in response_data and 'nutriscore_grade' in response_data['product']:
-            nutriscore_grade = response_data['product']['nutriscore_grade']
-            
-        if 'product' in response_data and 'ecoscore_grade' in response_data['product']:
-            ecoscore_grade = response_data['product']['ecoscore_grade']
-            
-        if 'product' in response_data and 'brands' in response_data['product']:
-            brands = response_data['product']['brands']
-            
-        # Extract image URLs
-        if 'product' in response_data and 'image_small_url' in response_data['product']:
-            image_small_url = response_data['product']['image_small_url']
-            
-        if 'product' in response_data and 'image_thumb_url' in response_data['product']:
-            image_thumb_url = response_data['product']['image_thumb_url']
+    product = response_data['product']
+    ingredients = product['ingredients_text']
+    if not ingredients:
+        raise ValueError("Missing ingredients in Open Food Facts API. Unable to generate a personalized summary for this product.")
 
-        return response_ingredients, response_additives, product_name, allergens, nutriments, labels, categories, nova_group, nutriscore_grade, ecoscore_grade, brands, image_small_url, image_thumb_url
+    additives = product.get('additives_tags') or []
+    facts = {field: product.get(field, default) for field, default in PRODUCT_FACTS.items()}
+    facts['product_name'] = product['product_name']
+    facts['nutriments'] = filter_nutriments(product['nutriments']) if 'nutriments' in product else {}
+    return ingredients, additives, facts
 
-    else:
-        return None, None, None, None, None, None, None, None, None, None, None, None, None
+def fetch_new_product(product_code, language):
+    """
+    Fetches product information from the local table, if not found call the API using the provided product code.
+
+    Args:
+        product_code (str): The code of the product to fetch.
+
+    Returns:
+        ProductRecord: The product with its generated descriptions, the ingredients are None if their generation failed,
+                       or None if the product information could not be fetched.
+    """
+    ingredients, additives, facts = fetch_product_facts(product_code)
+    if facts is None:
+        return None
+
+    response_ingredients, response_additives = generate_descriptions(ingredients, additives, language)
+    return make_product_record(facts['product_name'], response_ingredients, response_additives, facts['allergens_tags'],
+                               facts['nutriments'], facts['labels_tags'], facts['categories'], facts['nova_group'],
+                               facts['nutriscore_grade'], facts['ecoscore_grade'], facts['brands'],
+                               facts['image_small_url'], facts['image_thumb_url'])
+
+def acquire_generation_lease(product_code, language, owner, duration=GENERATION_LEASE):
+    """
+    Marks a product as being generated by this invocation, unless another one already does.
+
+    The marker is an item of the product table with the key of the product and no ingredients,
+    replaced by the product once generated. A lease past its expiry can be taken over, so a
+    crashed invocation does not block the product, and so can a product stored without its
+    additives, which product_record_from_item does not answer with.
+
+    Args:
+        product_code (str): The code of the product.
+        language (str): The language of the product.
+        owner (str): The identifier of the invocation.
+        duration (float): The number of seconds of the lease.
+
+    Returns:
+        bool: True if this invocation holds the lease and must generate the product.
+    """
+    now = int(time.time())
+    try:
+        dynamodb.Table(PRODUCT_TABLE_NAME).put_item(
+            Item={
+                'product_code': product_code,
+                'language': language,
+                'generation_owner': owner,
+                'generation_lease_until': now + int(duration),
+            },
+            ConditionExpression='(attribute_not_exists(ingredients) OR attribute_not_exists(additives)) AND '
+                                '(attribute_not_exists(generation_lease_until) OR generation_lease_until < :now)',
+            ExpressionAttributeValues={':now': now},
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        logger.error("Error while acquiring the generation lease: %s", e)
+        # Generating without the lease only costs a duplicate generation
+        return True
+
+def release_generation_lease(product_code, language, owner):
+    """Removes the generation marker of a product left without a generated product."""
+    try:
+        dynamodb.Table(PRODUCT_TABLE_NAME).delete_item(
+            Key={'product_code': product_code, 'language': language},
+            ConditionExpression='generation_owner = :owner AND attribute_not_exists(ingredients)',
+            ExpressionAttributeValues={':owner': owner},
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.error("Error while releasing the generation lease: %s", e)
+
+def wait_for_product(product_code, language, deadline, interval=0.5):
+    """
+    Polls the product table while another invocation generates a product.
+
+    Args:
+        product_code (str): The code of the product.
+        language (str): The language of the product.
+        deadline (float): The time.monotonic() value after which the product is not waited for anymore.
+        interval (float): The number of seconds between two reads.
+
+    Returns:
+        ProductRecord: The product, or None if the generation was abandoned or did not complete before the deadline.
+    """
+    table = dynamodb.Table(PRODUCT_TABLE_NAME)
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        product = get_product_from_db(product_code, language, use_cache=False)
+        if product is not None:
+            return product
+        marker = table.get_item(Key={'product_code': product_code, 'language': language}).get('Item')
+        # The generating invocation failed and released or let its lease expire, or the item is
+        # a product stored without its additives, which holds no lease
+        if marker is None or 'generation_owner' not in marker or marker.get('generation_lease_until', 0) < time.time():
+            return None
+    return None
+
+def acquire_generation_lease_or_wait(product_code, language, owner):
+    """
+    Takes the generation lease of a product, or waits for the invocation holding it to generate the product.
+
+    Args:
+        product_code (str): The code of the product.
+        language (str): The language of the product.
+        owner (str): The identifier of the invocation.
+
+    Returns:
+        tuple: Whether this invocation holds the lease, and the ProductRecord generated by another
+               invocation, or None if it must be generated.
+    """
+    deadline = time.monotonic() + GENERATION_WAIT
+    while True:
+        leased = acquire_generation_lease(product_code, language, owner)
+        if leased or time.monotonic() >= deadline:
+            return leased, None
+        logger.debug("Product being generated by another invocation")
+        product = wait_for_product(product_code, language, deadline)
+        if product is not None:
+            return False, product
+
+def generate_product(product_code, language, owner):
+    """
+    Generates and stores a product, once for all the invocations scanning it at the same time.
+
+    The invocation holding the generation lease generates the product, the others wait for it
+    and only generate it themselves if it does not show up in time.
+
+    Args:
+        product_code (str): The code of the product.
+        language (str): The language of the product.
+        owner (str): The identifier of the invocation.
+
+    Returns:
+        ProductRecord: The product, the ingredients are None if their generation failed,
+                       or None if the product information could not be fetched.
+    """
+    leased, product = acquire_generation_lease_or_wait(product_code, language, owner)
+    if product is not None:
+        record_stored_products()
+        return product
+
+    written = False
+    try:
+        product = fetch_new_product(product_code, language)
+        if product is not None and product.ingredients is not None:
+            write_product_to_db(product_code, language, *product[:-1])
+            written = True
+    finally:
+        # Let the waiting invocations try in turn instead of waiting for the lease to expire
+        if leased and not written:
+            release_generation_lease(product_code, language, owner)
+    return product
+
+def batch_get_items(table_name, keys, max_attempts=5):
+    """
+    Reads items with BatchGetItem, 100 keys per request, retrying the keys left unprocessed.
+
+    Args:
+        table_name (str): The name of the table.
+        keys (list): The keys of the items.
+        max_attempts (int): The number of requests made for the same 100 keys.
+
+    Returns:
+        tuple: The items found, and the keys still unprocessed after the last attempt.
+    """
+    items = []
+    unprocessed = []
+    for i in range(0, len(keys), 100):
+        request = {table_name: {'Keys': keys[i:i + 100]}}
+        for attempt in range(max_attempts):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response['Responses'].get(table_name, []))
+            request = response.get('UnprocessedKeys')
+            if not request:
+                break
+            time.sleep(0.05 * 2 ** attempt)
+        if request:
+            unprocessed.extend(request[table_name]['Keys'])
+    return items, unprocessed
+
+def cache_products(product_codes, languages):
+    """
+    Reads products of the product table into the cache, with a negative entry for each missing one.
+
+    Args:
+        product_codes (list): The codes of the products.
+        languages (list): The languages of the product table items.
+    """
+    keys = [{'product_code': code, 'language': language} for code in product_codes for language in languages]
+    items, unprocessed = batch_get_items(PRODUCT_TABLE_NAME, keys)
+    found = set()
+    for item in items:
+        item = decode_attributes(item, PRODUCT_ATTRIBUTES)
+        key = (item['product_code'], item['language'])
+        found.add(key)
+        product_cache.put(key, product_record_from_item(item))
+    # The unprocessed keys are left to get_product_from_db
+    found.update((key['product_code'], key['language']) for key in unprocessed)
+    for key in keys:
+        if (key['product_code'], key['language']) not in found:
+            product_cache.put((key['product_code'], key['language']), MISSING)
+
+def cache_open_food_facts_products(product_codes):
+    """
+    Reads products of the Open Food Facts table into the cache.
+
+    Missing products get no negative entry, get_product_from_open_food_facts_db still looks them up
+    in the barcode index.
+
+    Args:
+        product_codes (list): The codes of the products.
+    """
+    items, _ = batch_get_items(OPEN_FOOD_FACTS_TABLE_NAME, [{'product_code': code} for code in product_codes])
+    for item in items:
+        item['product'] = decode_attributes(item.get('product', {}), OPEN_FOOD_FACTS_ATTRIBUTES)
+        open_food_facts_cache.put(item['product_code'], item)
+
+def preload_products(product_codes, languages):
+    """
+    Reads the given products from the product and Open Food Facts tables into the caches.
+
+    Args:
+        product_codes (list): The codes of the products to preload.
+        languages (list): The languages of the product table items to preload.
+    """
+    try:
+        cache_products(product_codes, languages)
+        cache_open_food_facts_products(product_codes)
+        logger.info("Preloaded products", extra={"products": len(product_cache), "open_food_facts_products": len(open_food_facts_cache)})
+    except Exception as e:
+        logger.error("Error while preloading the products: %s", e)
+
+if PRELOAD_PRODUCT_CODES:
+    preload_products(PRELOAD_PRODUCT_CODES, PRELOAD_LANGUAGES)
+
+def get_products(product_codes, language, owner, timeout):
+    """
+    Retrieves many products at once, generating the missing ones a few at a time.
+
+    The stored products are read with BatchGetItem, as are the Open Food Facts products of the missing ones.
+
+    Args:
+        product_codes (list): The codes of the products, duplicates are answered once.
+        language (str): The language of the products.
+        owner (str): The identifier of the invocation, used for the generation leases.
+        timeout (float): The number of seconds the generations may take.
+
+    Returns:
+        list: One result per product code, with its status: found, generated, not_found,
+              error, or pending when its generation did not complete in time and must be requested again.
+              The found and generated results have the ProductRecord in product.
+    """
+    deadline = time.monotonic() + timeout
+    product_codes = list(dict.fromkeys(product_codes))
+    results = {}
+
+    try:
+        cache_products([code for code in product_codes if product_cache.get((code, language)) is None], [language])
+    except Exception as e:
+        logger.error("Error while reading the products in batch: %s", e)
+
+    missing = []
+    for product_code in product_codes:
+        product = get_product_from_db(product_code, language)
+        if product is not None:
+            results[product_code] = {"status": "found", "product": product}
+        else:
+            missing.append(product_code)
+    logger.debug(f"{len(product_codes) - len(missing)} of {len(product_codes)} products found in the database")
+    record_stored_products(len(product_codes) - len(missing))
+
+    if missing:
+        try:
+            cache_open_food_facts_products([code for code in missing if open_food_facts_cache.get(code) is None])
+        except Exception as e:
+            logger.error("Error while reading the Open Food Facts products in batch: %s", e)
+
+        futures = {batch_executor.submit(generate_product, product_code, language, owner): product_code for product_code in missing}
+        done, not_done = concurrent.futures.wait(futures, timeout=max(deadline - time.monotonic(), 0))
+        for future in done:
+            product_code = futures[future]
+            try:
+                product = future.result()
+                if product is None:
+                    results[product_code] = {"status": "not_found"}
+                else:
+                    results[product_code] = {"status": "generated", "product": product}
+            except ProductNotFoundError:
+                results[product_code] = {"status": "not_found"}
+            except Exception as e:
+                logger.error(f"Error while generating the product {product_code}: %s", e)
+                results[product_code] = {"status": "error", "error": str(e)}
+        for future in not_done:
+            future.cancel()
+            results[futures[future]] = {"status": "pending"}
+
+    return [{"product_code": product_code, **results[product_code]} for product_code in product_codes]
+
+def batch_handler(event, context, language):
+    """
+    Answers POST /batch/{language} with the products of the product_codes list of the body.
+    """
+    try:
+        body = event.get("body") or "{}"
+        if event.get("isBase64Encoded"):
+            body = base64.b64decode(body)
+        request = json.loads(body)
+        product_codes = request.get("product_codes") if isinstance(request, dict) else None
+        if (not isinstance(product_codes, list) or not product_codes
+                or not all(isinstance(code, str) and code.strip() for code in product_codes)):
+            raise ValueError("product_codes must be a non empty list of barcodes")
+        if len(product_codes) > BATCH_MAX_PRODUCTS:
+            raise ValueError(f"At most {BATCH_MAX_PRODUCTS} barcodes can be requested at once")
+    except ValueError as e:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": str(e)}),
+            "headers": {
+                "Access-Control-Allow-Headers": "*",
+                "Access-Control-Allow-Origin": "*",
+                "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+            },
+        }
+
+    timeout = context.get_remaining_time_in_millis() / 1000 - BATCH_RESPONSE_MARGIN
+    results = get_products([code.strip() for code in product_codes], language, context.aws_request_id, timeout)
+    logger.info("Cache statistics", extra={"product_cache": product_cache.stats(), "open_food_facts_cache": open_food_facts_cache.stats()})
+
+    # The rendered body of each product is spliced in its result instead of being encoded again
+    entries = []
+    for result in results:
+        product = result.pop("product", None)
+        entry = json.dumps(result)
+        if product is not None:
+            entry = entry[:-1] + ", " + product.body[1:]
+        entries.append(entry)
+    return {
+        "statusCode": 200,
+        "body": '{"products": [' + ', '.join(entries) + ']}',
+        "headers": {
+            "Access-Control-Allow-Headers": "*",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "OPTIONS,POST,GET",
+        },
+    }
 
 @logger.inject_lambda_context(log_event=True)
 @tracer.capture_lambda_handler
@@ -578,48 +1526,30 @@ def handler(event, context):
     logger.info(event)
     try:
         fields = event["rawPath"].split("/")
+        if fields[1] == "batch" and event.get("requestContext", {}).get("http", {}).get("method") == "POST":
+            return batch_handler(event, context, fields[2])
         product_code = fields[1]
         language = fields[2]
         logger.debug("ProductCode="+product_code)
-        product_name, response_ingredients, response_additives, allergens, nutriments, labels, categories, nova_group, nutriscore_grade, ecoscore_grade, brands, image_small_url, image_thumb_url = get_product_from_db(product_code, language)
+        product = get_product_from_db(product_code, language)
         
-        if product_name is not None:        
+        if product is not None:        
             logger.debug("Product found in the database")
+            record_stored_products()
         else:
             logger.debug("Product not found in the database")
 
-            response_ingredients, response_additives, product_name, allergens, nutriments, labels, categories, nova_group, nutriscore_grade, ecoscore_grade, brands, image_small_url, image_thumb_url = fetch_new_product(product_code, language)
-            
-            
-            if  response_ingredients is not None:
-                write_product_to_db(product_code, language, product_name, response_ingredients, response_additives, allergens, nutriments, labels, categories, nova_group, nutriscore_grade, ecoscore_grade, brands, image_small_url, image_thumb_url)
-
-            if(response_ingredients is None):
-                response_ingredients = {"Ingredients Generation Error": "Description Generation Unavailable"}                
-
-
-        response = {
-                "ingredients_description": response_ingredients,
-                "additives_description": response_additives,
-                "product_name": product_name,
-                "allergens_tags": allergens,
-                "nutriments": nutriments,
-                "labels_tags": labels,
-                "categories": categories,
-                "nova_group": nova_group,
-                "nutriscore_grade": nutriscore_grade,
-                "ecoscore_grade": ecoscore_grade,
-                "brands": brands,
-                "image_small_url": image_small_url,
-                "image_thumb_url": image_thumb_url
-        }
+            product = generate_product(product_code, language, context.aws_request_id)
+            if product is None:
+                raise ProductNotFoundError("Product not found on Open Food Facts API")
 
-        logger.debug("Response", extra=response)
+        logger.debug("Response", extra={"product_name": product.product_name})
+        logger.info("Cache statistics", extra={"product_cache": product_cache.stats(), "open_food_facts_cache": open_food_facts_cache.stats()})
 
         # Return JSON response
         return {
             "statusCode": 200,
-            "body": json.dumps(response, cls=DecimalEncoder),
+            "body": product.body,
             "headers": {
                 "Access-Control-Allow-Headers": "*",
                 "Access-Control-Allow-Origin": "*",
@@ -638,7 +1568,7 @@ def handler(event, context):
         }
 
     except Exception as e:
-            logger.error("Error", e)
+            logger.error("Error: %s", e)
             return {
             "statusCode": 500,
             "body": json.dumps({"error": str(e)}),
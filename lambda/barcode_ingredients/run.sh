@@ -0,0 +1,4 @@
+#!/bin/bash
+# Started by the Lambda Web Adapter, which forwards the invocations to the server of stream.py
+export PYTHONPATH=/opt/python:$LAMBDA_TASK_ROOT:$PYTHONPATH
+exec python3 stream.py
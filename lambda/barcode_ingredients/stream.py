@@ -0,0 +1,152 @@
+"""
+Streaming variant of the barcode_ingredients handler.
+
+The Python runtime does not stream Lambda responses, so this module runs a small HTTP server
+behind the Lambda Web Adapter (see run.sh), which forwards the chunked response of the server
+through a RESPONSE_STREAM function URL.
+
+GET /{product_code}/{language} answers with one JSON event per line:
+    {"type": "product", ...}: the product facts, sent before any description is generated.
+    {"type": "ingredient", "name": ..., "description": ...}: one per ingredient, as soon as it is parsed.
+    {"type": "additives", "additives_description": {...}}: the additive descriptions.
+    {"type": "done"} or {"type": "error", "error": ...}: the end of the stream.
+"""
+import json
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from index import (GENERATION_TIMEOUT, DecimalEncoder, ProductNotFoundError, acquire_generation_lease_or_wait,
+                   fetch_product_facts, generation_executor, get_product_from_db, iter_ingredients_description,
+                   logger, parse_additives_description, record_stored_products, release_generation_lease,
+                   write_product_to_db)
+
+
+def stored_product_events(product):
+    """
+    Yields the events of a product already in the product table.
+
+    Args:
+        product (ProductRecord): The product as returned by get_product_from_db.
+    """
+    fields = product._asdict()
+    del fields['body']
+    ingredients = fields.pop('ingredients') or {}
+    additives = fields.pop('additives')
+    yield {'type': 'product', **fields}
+    for name, description in ingredients.items():
+        yield {'type': 'ingredient', 'name': name, 'description': description}
+    yield {'type': 'additives', 'additives_description': additives}
+
+
+def generated_product_events(product_code, language):
+    """
+    Yields the events of a product while its descriptions are generated, then stores it.
+
+    The additives are generated in the background while the ingredients are streamed. As in
+    generate_product, the product is not stored when no ingredient description could be parsed.
+
+    Returns:
+        bool: Whether the product was stored.
+    """
+    ingredients, additives, facts = fetch_product_facts(product_code)
+    if facts is None:
+        raise ProductNotFoundError("Product not found on Open Food Facts API")
+    yield {'type': 'product', **facts}
+
+    additives_future = generation_executor.submit(parse_additives_description, additives, language) if additives else None
+    response_ingredients = {}
+    for name, description in iter_ingredients_description(ingredients, language, stream=True):
+        response_ingredients[name] = description
+        yield {'type': 'ingredient', 'name': name, 'description': description}
+
+    response_additives = additives
+    if additives_future:
+        try:
+            response_additives = additives_future.result(timeout=GENERATION_TIMEOUT)
+        except Exception as e:
+            logger.error("Impossible to generate additives descriptions: %s", e)
+            response_additives = None
+    yield {'type': 'additives', 'additives_description': response_additives}
+
+    if not response_ingredients:
+        logger.error("No ingredient description generated, the product is not stored")
+        return False
+    write_product_to_db(product_code, language, facts['product_name'], response_ingredients, response_additives,
+                        facts['allergens_tags'], facts['nutriments'], facts['labels_tags'], facts['categories'],
+                        facts['nova_group'], facts['nutriscore_grade'], facts['ecoscore_grade'], facts['brands'],
+                        facts['image_small_url'], facts['image_thumb_url'])
+    return True
+
+
+def product_events(product_code, language, owner):
+    """
+    Yields the events of a product, generating it once for the invocations scanning it at the same time.
+
+    Args:
+        product_code (str): The code of the product.
+        language (str): The language of the descriptions.
+        owner (str): The identifier of the request, used for the generation lease.
+    """
+    product = get_product_from_db(product_code, language)
+    if product is not None:
+        record_stored_products()
+        yield from stored_product_events(product)
+        return
+
+    leased, product = acquire_generation_lease_or_wait(product_code, language, owner)
+    if product is not None:
+        record_stored_products()
+        yield from stored_product_events(product)
+        return
+
+    written = False
+    try:
+        written = yield from generated_product_events(product_code, language)
+    finally:
+        if leased and not written:
+            release_generation_lease(product_code, language, owner)
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        fields = self.path.split('?')[0].split('/')
+        if len(fields) < 3 or not fields[1] or not fields[2]:
+            self.send_error(400)
+            return
+        product_code, language = fields[1], fields[2]
+        # Set by the Lambda Web Adapter from the invocation context
+        owner = json.loads(self.headers.get('x-amzn-lambda-context', '{}')).get('request_id') or os.urandom(8).hex()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'OPTIONS,POST,GET')
+        self.end_headers()
+
+        try:
+            for event in product_events(product_code, language, owner):
+                self.write_chunk(json.dumps(event, cls=DecimalEncoder).encode('utf-8') + b'\n')
+            self.write_chunk(b'{"type": "done"}\n')
+        except ProductNotFoundError:
+            self.write_chunk(b'{"type": "error", "error": "NOT_FOUND"}\n')
+        except Exception as e:
+            logger.error("Error: %s", e)
+            self.write_chunk(json.dumps({'type': 'error', 'error': str(e)}).encode('utf-8') + b'\n')
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(('127.0.0.1', int(os.environ.get('PORT', '8080'))), StreamHandler)
+    server.serve_forever()
@@ -5,13 +5,31 @@ const client_dynamodb_1 = require("@aws-sdk/client-dynamodb");
 const util_dynamodb_1 = require("@aws-sdk/util-dynamodb");
 const logger_1 = require("@aws-lambda-powertools/logger");
 const crypto_1 = require("crypto");
+const zlib_1 = require("zlib");
 const client_bedrock_runtime_1 = require("@aws-sdk/client-bedrock-runtime");
 const logger = new logger_1.Logger();
 const dynamodb = new client_dynamodb_1.DynamoDBClient({});
 const PRODUCT_TABLE_NAME = process.env.PRODUCT_TABLE_NAME;
 const PRODUCT_SUMMARY_TABLE_NAME = process.env.PRODUCT_SUMMARY_TABLE_NAME;
 const MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0";
+// Version byte of the attributes compressed by lambda/layers/common/python/item_codec.py
+const ZLIB_JSON = 1;
 const bedrockRuntimeClient = new client_bedrock_runtime_1.BedrockRuntimeClient({ region: process.env.REGION || 'us-east-1' });
+/**
+ * Decodes an attribute stored as a compressed binary value.
+ *
+ * @param value - The unmarshalled attribute value.
+ * @returns The original value, or the value itself if it is not a compressed binary value.
+ */
+function decodeAttribute(value) {
+    if (!(value instanceof Uint8Array) || value.length === 0) {
+        return value;
+    }
+    if (value[0] !== ZLIB_JSON) {
+        throw new Error(`Unknown attribute encoding version ${value[0]}`);
+    }
+    return JSON.parse((0, zlib_1.inflateSync)(value.subarray(1)).toString('utf-8'));
+}
 function generateProductSummaryPrompt(userAllergies, userPreference, userHealthGoal, userReligion, productIngredients, productName, productAllergens, productNutriments, productLabels, productCategories, language, nova_group, nutriscore_grade, ecoscore_grade, brands) {
     // Format nutriments for display
     let nutrimentInfo = '';
@@ -170,12 +188,12 @@ async function getProductFromDb(productCode, language) {
             const item = (0, util_dynamodb_1.unmarshall)(Item);
             return [
                 item.product_name || null,
-                item.ingredients || null,
-                item.additives || null,
+                decodeAttribute(item.ingredients) || null,
+                decodeAttribute(item.additives) || null,
                 item.allergens_tags || null,
                 item.nutriments || null,
                 item.labels_tags || null,
-                item.categories || null,
+                decodeAttribute(item.categories) || null,
                 item.nova_group || null,
                 item.nutriscore_grade || null,
                 item.ecoscore_grade || null,
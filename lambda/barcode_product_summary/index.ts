@@ -4,6 +4,7 @@ import { Tracer } from "@aws-lambda-powertools/tracer";
 import { Logger } from "@aws-lambda-powertools/logger";
 import { APIGatewayProxyEventV2, Handler, Context } from 'aws-lambda';
 import { createHash } from 'crypto';
+import { inflateSync } from 'zlib';
 import { BedrockRuntimeClient, InvokeModelWithResponseStreamCommand } from "@aws-sdk/client-bedrock-runtime";
 
 const logger = new Logger();
@@ -12,6 +13,8 @@ const dynamodb = new DynamoDBClient({});
 const PRODUCT_TABLE_NAME = process.env.PRODUCT_TABLE_NAME
 const PRODUCT_SUMMARY_TABLE_NAME = process.env.PRODUCT_SUMMARY_TABLE_NAME
 const MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+// Version byte of the attributes compressed by lambda/layers/common/python/item_codec.py
+const ZLIB_JSON = 1;
 
 
 
@@ -48,6 +51,22 @@ interface ProductItem {
     brands?: string;
 }
 
+/**
+ * Decodes an attribute stored as a compressed binary value.
+ *
+ * @param value - The unmarshalled attribute value.
+ * @returns The original value, or the value itself if it is not a compressed binary value.
+ */
+function decodeAttribute(value: any): any {
+    if (!(value instanceof Uint8Array) || value.length === 0) {
+        return value;
+    }
+    if (value[0] !== ZLIB_JSON) {
+        throw new Error(`Unknown attribute encoding version ${value[0]}`);
+    }
+    return JSON.parse(inflateSync(value.subarray(1)).toString('utf-8'));
+}
+
 interface ProductSummaryItem {
     product_code: string;
     params_hash: string;
@@ -249,12 +268,12 @@ async function getProductFromDb(productCode: string, language: string): Promise<
             const item = unmarshall(Item) as ProductItem;
             return [
                 item.product_name || null, 
-                item.ingredients || null, 
-                item.additives || null,
+                decodeAttribute(item.ingredients) || null, 
+                decodeAttribute(item.additives) || null,
                 item.allergens_tags || null,
                 item.nutriments || null,
                 item.labels_tags || null,
-                item.categories || null,
+                decodeAttribute(item.categories) || null,
                 item.nova_group || null,
                 item.nutriscore_grade || null,
                 item.ecoscore_grade || null,
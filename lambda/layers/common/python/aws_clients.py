@@ -0,0 +1,87 @@
+"""
+AWS clients and resources created on first use, then shared by the invocations of a warm container.
+
+Creating a client loads and parses the model of its service, which takes tens of milliseconds.
+A module-level client built with lazy_client only pays for it when the service is first called,
+so cold starts of invocations that never reach a service, such as cache hits, skip it:
+
+    dynamodb = lazy_resource('dynamodb')
+    table = dynamodb.Table(TABLE_NAME)  # The resource is created here
+"""
+import threading
+
+import boto3
+
+_instances = {}
+_lock = threading.Lock()
+
+
+def _get(kind, service_name, **kwargs):
+    key = (kind, service_name, tuple(sorted(kwargs.items())))
+    instance = _instances.get(key)
+    if instance is None:
+        # The default boto3 session is not safe to use from several threads at once
+        with _lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = getattr(boto3, kind)(service_name, **kwargs)
+                _instances[key] = instance
+    return instance
+
+
+def client(service_name, **kwargs):
+    """
+    Returns the client of a service, created once per container.
+
+    Args:
+        service_name (str): The name of the service, such as bedrock-runtime.
+        **kwargs: The arguments of boto3.client, such as region_name.
+
+    Returns:
+        The boto3 client.
+    """
+    return _get('client', service_name, **kwargs)
+
+
+def resource(service_name, **kwargs):
+    """
+    Returns the resource of a service, created once per container.
+
+    Args:
+        service_name (str): The name of the service, such as dynamodb.
+        **kwargs: The arguments of boto3.resource.
+
+    Returns:
+        The boto3 service resource.
+    """
+    return _get('resource', service_name, **kwargs)
+
+
+class LazyClient:
+    """
+    Stands for a client or resource, created by the first attribute access.
+
+    Args:
+        factory: client or resource.
+        service_name (str): The name of the service.
+        **kwargs: The arguments of the factory.
+    """
+
+    def __init__(self, factory, service_name, **kwargs):
+        self._factory = factory
+        self._service_name = service_name
+        self._kwargs = kwargs
+
+    def __getattr__(self, name):
+        return getattr(self._factory(self._service_name, **self._kwargs), name)
+
+    def __repr__(self):
+        return f"LazyClient({self._factory.__name__}, {self._service_name!r})"
+
+
+def lazy_client(service_name, **kwargs):
+    return LazyClient(client, service_name, **kwargs)
+
+
+def lazy_resource(service_name, **kwargs):
+    return LazyClient(resource, service_name, **kwargs)
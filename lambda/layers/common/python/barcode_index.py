@@ -0,0 +1,171 @@
+"""
+Read-only barcode index of the Open Food Facts products, answering lookups from
+memory-mapped files without any DynamoDB round trip.
+
+The index is made of two files:
+    products.dat: the products as compact JSON records, one after the other.
+    products.idx: a header followed by fixed-size entries sorted by packed product code,
+                  each pointing to the offset and length of a record in products.dat.
+
+The loader writes it with --index-dir. The barcode_ingredients Lambda reads it from the common
+layer when BARCODE_INDEX_DIR is set, with the index files on EFS or in a layer.
+"""
+import json
+import mmap
+import os
+import struct
+from array import array
+from decimal import Decimal
+
+from code_index import encode_product_code
+
+MAGIC = b'OFFIDX01'
+HEADER = struct.Struct('<8sQ')
+ENTRY = struct.Struct('<QQI')
+RECORDS_FILE = 'products.dat'
+INDEX_FILE = 'products.idx'
+
+
+class BarcodeIndexWriter:
+    """
+    Builds the index files from products added in any order.
+
+    A product code added more than once keeps its last record.
+    Codes that cannot be packed in 64 bits are left out of the index.
+
+    Args:
+        directory (str): The directory where the index files are written.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.records = open(os.path.join(directory, RECORDS_FILE), 'wb')
+        self.keys = array('Q')
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        self.offset = 0
+        self.unindexed = 0
+
+    def add(self, product_code, product):
+        """
+        Appends a product to the records file.
+
+        Args:
+            product_code (str): The product code.
+            product (dict): The product fields, as stored in the Open Food Facts table.
+        """
+        key = encode_product_code(product_code)
+        if key is None:
+            self.unindexed += 1
+            return
+        record = json.dumps(product, separators=(',', ':'), ensure_ascii=False, default=float).encode('utf-8')
+        self.records.write(record)
+        self.keys.append(key)
+        self.offsets.append(self.offset)
+        self.lengths.append(len(record))
+        self.offset += len(record)
+
+    def close(self):
+        """
+        Writes the sorted index file.
+
+        Returns:
+            int: The number of indexed products.
+        """
+        self.records.close()
+        # The sort is stable, so the last record of a duplicated code comes last
+        order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        entries = []
+        for position, i in enumerate(order):
+            key = self.keys[i]
+            if position + 1 < len(order) and self.keys[order[position + 1]] == key:
+                continue
+            entries.append(ENTRY.pack(key, self.offsets[i], self.lengths[i]))
+
+        tmp_path = os.path.join(self.directory, INDEX_FILE + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(entries)))
+            f.write(b''.join(entries))
+        os.replace(tmp_path, os.path.join(self.directory, INDEX_FILE))
+        return len(entries)
+
+
+class BarcodeIndex:
+    """
+    Looks up products in the index files with a binary search over memory-mapped entries.
+
+    Args:
+        directory (str): The directory holding the index files.
+    """
+
+    def __init__(self, directory):
+        self._files = []
+        self._index = self._map(os.path.join(directory, INDEX_FILE))
+        self._records = self._map(os.path.join(directory, RECORDS_FILE))
+        magic, self.count = HEADER.unpack_from(self._index, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{directory} does not hold a barcode index")
+
+    def _map(self, path):
+        f = open(path, 'rb')
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def get(self, product_code):
+        """
+        Retrieves the fields of a product.
+
+        Args:
+            product_code (str): The product code.
+
+        Returns:
+            dict: The product fields with numbers as Decimal, or None if the product is not indexed.
+        """
+        key = encode_product_code(product_code)
+        if key is None:
+            return None
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            entry_key, offset, length = ENTRY.unpack_from(self._index, HEADER.size + middle * ENTRY.size)
+            if entry_key < key:
+                low = middle + 1
+            elif entry_key > key:
+                high = middle
+            else:
+                return json.loads(self._records[offset:offset + length], parse_float=Decimal)
+        return None
+
+    def get_item(self, product_code):
+        """
+        Retrieves a product in the same shape as an item of the Open Food Facts table.
+
+        Args:
+            product_code (str): The product code.
+
+        Returns:
+            dict: The item if found, otherwise None.
+        """
+        product = self.get(product_code)
+        if product is None:
+            return None
+        return {'product_code': product_code, 'product': product}
+
+    def close(self):
+        for mapping in (self._index, self._records):
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+        for f in self._files:
+            f.close()
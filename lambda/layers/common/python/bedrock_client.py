@@ -0,0 +1,374 @@
+"""
+Calls to Bedrock models, rate limited per model ID and shared by the threads of a warm container.
+
+Each model has a token bucket of requests per second and a number of requests in flight. A caller
+waits for a free slot and a token, up to its timeout. A ThrottlingException halves the rate of the
+model for every caller and is retried after a jittered exponential backoff, then the rate slowly
+grows back after each success. After BREAKER_THRESHOLD throttled requests in a row, the circuit of
+the model opens: calls fail at once with ModelUnavailableError for BREAKER_COOLDOWN seconds, then
+a single request probes the model before the others are let through again.
+
+Every call is recorded by model_metrics under the call site given by the caller:
+
+    response = invoke_model("anthropic.claude-3-haiku-20240307-v1:0", body, "additives", accept="application/json")
+    for chunk in invoke_model_stream("anthropic.claude-3-haiku-20240307-v1:0", body, "ingredients"):
+        ...
+"""
+import json
+import os
+import random
+import threading
+import time
+
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, HTTPClientError
+
+import aws_clients
+from model_metrics import record_model_call
+
+# Error codes of a request rejected because the model is saturated
+THROTTLING_CODES = frozenset(('ThrottlingException', 'TooManyRequestsException', 'ServiceUnavailableException',
+                              'ModelNotReadyException'))
+# Error codes of a request that failed on the side of the service and may succeed if sent again
+TRANSIENT_CODES = frozenset(('InternalServerException', 'InternalFailure', 'ServiceException'))
+
+# Requests per second, burst and requests in flight of a model, unless set by configure_model
+DEFAULT_RATE = float(os.environ.get('BEDROCK_RATE', '10'))
+DEFAULT_BURST = int(os.environ.get('BEDROCK_BURST', '10'))
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get('BEDROCK_MAX_CONCURRENCY', '8'))
+# The image models have much lower quotas than the text ones
+MODEL_LIMITS = {
+    'amazon.nova-canvas-v1:0': {'rate': 2, 'burst': 2, 'max_concurrency': 4},
+}
+# Lowest rate a model is slowed down to, and the rate regained after each successful request
+MIN_RATE = 0.2
+RATE_INCREASE = 0.5
+# Attempts of a throttled or transiently failed request, and the base and cap in seconds of the backoff between them
+MAX_ATTEMPTS = int(os.environ.get('BEDROCK_MAX_ATTEMPTS', '4'))
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8
+# Seconds a caller waits for a slot and a token, retries included
+QUEUE_TIMEOUT = float(os.environ.get('BEDROCK_QUEUE_TIMEOUT', '30'))
+# Throttled requests in a row that open the circuit of a model, and seconds it stays open
+BREAKER_THRESHOLD = int(os.environ.get('BEDROCK_BREAKER_THRESHOLD', '5'))
+BREAKER_COOLDOWN = float(os.environ.get('BEDROCK_BREAKER_COOLDOWN', '30'))
+
+# The retries are made here, where the throttling of a model is known to all the callers.
+# Throttled and transiently failed requests, connection errors and timeouts included, are retried by _call.
+_CLIENT_CONFIG = Config(retries={'total_max_attempts': 1, 'mode': 'standard'})
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+class ModelUnavailableError(Exception):
+    """
+    Raised when a model is not called, because its circuit is open or no capacity was free in time.
+    """
+
+    def __init__(self, model_id, reason):
+        super().__init__(f"{model_id} is unavailable: {reason}")
+        self.model_id = model_id
+        self.reason = reason
+
+
+class ModelLimiter:
+    """
+    Rate limit, in-flight requests and circuit breaker of one model.
+
+    Args:
+        model_id (str): The ID of the model.
+        rate (float): The requests per second the model starts with, and never exceeds.
+        burst (int): The number of requests that may be sent at once after an idle period.
+        max_concurrency (int): The number of requests in flight.
+
+    A throttled request halves the rate and a successful one makes it grow back:
+
+        >>> limiter = ModelLimiter('model', rate=1000, burst=2, max_concurrency=2)
+        >>> limiter.acquire(time.monotonic() + 1); limiter.acquire(time.monotonic() + 1)
+        >>> limiter.acquire(time.monotonic())
+        Traceback (most recent call last):
+        ...
+        bedrock_client.ModelUnavailableError: model is unavailable: no request slot free in time
+        >>> limiter.release(throttled=True); limiter.rate, limiter.tokens
+        (500.0, 0)
+        >>> limiter.release(); limiter.rate
+        500.5
+
+    BREAKER_THRESHOLD throttled requests in a row open the circuit, then a single request probes the model:
+
+        >>> for _ in range(BREAKER_THRESHOLD):
+        ...     limiter.acquire(time.monotonic() + 1); limiter.release(throttled=True)
+        >>> limiter.acquire(time.monotonic() + 1)
+        Traceback (most recent call last):
+        ...
+        bedrock_client.ModelUnavailableError: model is unavailable: circuit open
+        >>> limiter.open_until = time.monotonic()   # the cooldown is over
+        >>> limiter.acquire(time.monotonic() + 1)
+        >>> limiter.acquire(time.monotonic() + 1)
+        Traceback (most recent call last):
+        ...
+        bedrock_client.ModelUnavailableError: model is unavailable: circuit half open
+        >>> limiter.release(); limiter.open_until, limiter.throttled
+        (0.0, 0)
+    """
+
+    def __init__(self, model_id, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.model_id = model_id
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.throttled = 0
+        self.open_until = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def _check_circuit(self, now):
+        if self.open_until == 0.0:
+            return False
+        if now < self.open_until:
+            raise ModelUnavailableError(self.model_id, "circuit open")
+        # Half open: one request tests the model, the others still fail fast
+        if self.probing:
+            raise ModelUnavailableError(self.model_id, "circuit half open")
+        self.probing = True
+        return True
+
+    def acquire(self, deadline):
+        """
+        Waits for a slot and a token.
+
+        Args:
+            deadline (float): The time.monotonic() time after which the caller gives up.
+
+        Raises:
+            ModelUnavailableError: If the circuit is open, or the deadline passed.
+        """
+        with self._lock:
+            probe = self._check_circuit(time.monotonic())
+        try:
+            if not self.slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise ModelUnavailableError(self.model_id, "no request slot free in time")
+        except BaseException:
+            self._end_probe(probe)
+            raise
+        try:
+            while True:
+                with self._lock:
+                    now = time.monotonic()
+                    self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                if now + wait > deadline:
+                    raise ModelUnavailableError(self.model_id, "rate limited")
+                time.sleep(wait)
+        except BaseException:
+            self.slots.release()
+            self._end_probe(probe)
+            raise
+
+    def _end_probe(self, probe):
+        # Lets another request probe the model when this one was not sent
+        if probe:
+            with self._lock:
+                self.probing = False
+
+    def release(self, throttled=False, transient=False):
+        """
+        Frees the slot of a request and adapts the rate and the circuit to its outcome.
+
+        Args:
+            throttled (bool): Whether the model rejected the request because it is saturated.
+            transient (bool): Whether the request failed for a reason unrelated to the load of the
+                              model, such as a connection error, which leaves the rate and the circuit as they are.
+        """
+        with self._lock:
+            if throttled:
+                self.rate = max(self.rate / 2, MIN_RATE)
+                self.tokens = min(self.tokens, 0)
+                self.throttled += 1
+                if self.probing or self.throttled >= BREAKER_THRESHOLD:
+                    self.open_until = time.monotonic() + BREAKER_COOLDOWN
+            elif not transient:
+                self.rate = min(self.rate + RATE_INCREASE, self.max_rate)
+                self.throttled = 0
+                self.open_until = 0.0
+            self.probing = False
+        self.slots.release()
+
+
+def configure_model(model_id, **limits):
+    """
+    Sets the limits of a model, before its first call.
+
+    Args:
+        model_id (str): The ID of the model.
+        **limits: The rate, burst and max_concurrency arguments of ModelLimiter.
+    """
+    with _models_lock:
+        MODEL_LIMITS[model_id] = {**MODEL_LIMITS.get(model_id, {}), **limits}
+        _models.pop(model_id, None)
+
+
+def get_limiter(model_id):
+    limiter = _models.get(model_id)
+    if limiter is None:
+        with _models_lock:
+            limiter = _models.get(model_id)
+            if limiter is None:
+                limiter = ModelLimiter(model_id, **MODEL_LIMITS.get(model_id, {}))
+                _models[model_id] = limiter
+    return limiter
+
+
+def is_throttling(error):
+    if not isinstance(error, ClientError):
+        return False
+    # The errors of a response stream are named in camel case, such as throttlingException
+    code = error.response.get('Error', {}).get('Code') or ''
+    return code[:1].upper() + code[1:] in THROTTLING_CODES
+
+
+def is_transient(error):
+    """
+    Tells whether a request failed for a reason that may not happen again, other than throttling.
+    """
+    if isinstance(error, (BotocoreConnectionError, HTTPClientError)):
+        # Connection errors, connect and read timeouts, and connections closed by the service
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    code = error.response.get('Error', {}).get('Code') or ''
+    status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+    return code[:1].upper() + code[1:] in TRANSIENT_CODES or (status >= 500 and not is_throttling(error))
+
+
+def _elapsed(started):
+    return (time.monotonic() - started) * 1000
+
+
+def _header_count(response, name):
+    value = response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get(name)
+    return int(value) if value is not None else None
+
+
+def _call(method, model_id, timeout, kwargs, stats):
+    """
+    Calls the model until it is not throttled and does not fail transiently, holding a slot of the
+    model during each request.
+
+    The number of retries made so far is kept in stats['retries'], also when the call fails.
+
+    Returns:
+        tuple: The response, with the number of retries in ResponseMetadata.RetryAttempts,
+               and the limiter whose slot is still held by the request.
+    """
+    limiter = get_limiter(model_id)
+    deadline = time.monotonic() + timeout
+    client = aws_clients.client('bedrock-runtime', config=_CLIENT_CONFIG)
+    for attempt in range(MAX_ATTEMPTS):
+        stats['retries'] = attempt
+        limiter.acquire(deadline)
+        try:
+            response = getattr(client, method)(modelId=model_id, **kwargs)
+        except Exception as e:
+            throttled = is_throttling(e)
+            transient = not throttled and is_transient(e)
+            limiter.release(throttled, transient)
+            if not (throttled or transient) or attempt + 1 == MAX_ATTEMPTS:
+                raise
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            if time.monotonic() + delay > deadline:
+                raise
+            time.sleep(delay)
+            continue
+        response.setdefault('ResponseMetadata', {})['RetryAttempts'] = attempt
+        return response, limiter
+
+
+def invoke_model(model_id, body, call_site, timeout=QUEUE_TIMEOUT, **kwargs):
+    """
+    Calls a model, such as bedrock-runtime invoke_model.
+
+    Args:
+        model_id (str): The ID of the model.
+        body (str): The request body.
+        call_site (str): The feature the model is called for, the CallSite dimension of its metrics.
+        timeout (float): The seconds to wait for the capacity of the model, retries included.
+        **kwargs: The other arguments of invoke_model, such as accept or performanceConfigLatency.
+
+    Returns:
+        dict: The response of invoke_model.
+
+    Raises:
+        ModelUnavailableError: If the model was not called.
+        ClientError: If the request failed, or was still throttled or failing after MAX_ATTEMPTS attempts.
+        BotoCoreError: If the connection to the service still failed after MAX_ATTEMPTS attempts.
+    """
+    started = time.monotonic()
+    stats = {'retries': 0}
+    try:
+        response, limiter = _call('invoke_model', model_id, timeout, {'body': body, **kwargs}, stats)
+    except Exception:
+        record_model_call(model_id, call_site, _elapsed(started), retries=stats['retries'], error=True)
+        raise
+    limiter.release()
+    record_model_call(model_id, call_site, _elapsed(started),
+                      input_tokens=_header_count(response, 'x-amzn-bedrock-input-token-count'),
+                      output_tokens=_header_count(response, 'x-amzn-bedrock-output-token-count'),
+                      retries=stats['retries'])
+    return response
+
+
+def invoke_model_stream(model_id, body, call_site, timeout=QUEUE_TIMEOUT, **kwargs):
+    """
+    Calls a model with invoke_model_with_response_stream, holding its slot until the answer ends.
+
+    Args:
+        model_id (str): The ID of the model.
+        body (str): The request body.
+        call_site (str): The feature the model is called for, the CallSite dimension of its metrics.
+        timeout (float): The seconds to wait for the capacity of the model, retries included.
+        **kwargs: The other arguments of invoke_model_with_response_stream.
+
+    Yields:
+        dict: The decoded chunks of the answer.
+
+    Raises:
+        ModelUnavailableError: If the model was not called.
+        ClientError: If the request failed, or was still throttled or failing after MAX_ATTEMPTS attempts.
+        BotoCoreError: If the connection to the service still failed after MAX_ATTEMPTS attempts.
+    """
+    started = time.monotonic()
+    stats = {'retries': 0}
+    try:
+        response, limiter = _call('invoke_model_with_response_stream', model_id, timeout, {'body': body, **kwargs}, stats)
+    except Exception:
+        record_model_call(model_id, call_site, _elapsed(started), retries=stats['retries'], error=True)
+        raise
+    throttled = False
+    failed = False
+    # Sent by the model with the last chunk of the answer
+    invocation_metrics = {}
+    try:
+        for event in response.get('body'):
+            if 'chunk' in event:
+                chunk = json.loads(event['chunk']['bytes'])
+                invocation_metrics = chunk.get('amazon-bedrock-invocationMetrics', invocation_metrics)
+                yield chunk
+    except Exception as e:
+        throttled = is_throttling(e)
+        failed = True
+        raise
+    finally:
+        limiter.release(throttled)
+        record_model_call(model_id, call_site, _elapsed(started),
+                          input_tokens=invocation_metrics.get('inputTokenCount'),
+                          output_tokens=invocation_metrics.get('outputTokenCount'),
+                          retries=stats['retries'], error=failed)
@@ -0,0 +1,94 @@
+from array import array
+
+# Numeric codes up to 17 digits fit in 64 bits along with their length
+MAX_PACKED_DIGITS = 17
+_FIBONACCI = 11400714819323198485
+_MASK_64 = (1 << 64) - 1
+
+
+def encode_product_code(code):
+    """
+    Packs a numeric product code in a 64-bit integer.
+
+    The length of the code is kept in the 5 low bits so codes that only differ by
+    leading zeros stay distinct, and no code is encoded as 0.
+
+    Args:
+        code (str): The product code.
+
+    Returns:
+        int: The packed code, or None if the code is not made of up to 17 ASCII digits.
+    """
+    if len(code) > MAX_PACKED_DIGITS or not code.isascii() or not code.isdigit():
+        return None
+    return int(code) << 5 | len(code)
+
+
+class ProductCodeIndex:
+    """
+    Set of product codes packed in an open addressing table of 64-bit integers.
+
+    Holds the millions of codes of the dump in a fraction of the memory of a set of strings.
+    The few codes that are not numeric are kept in a regular set.
+
+    Args:
+        capacity (int): The initial number of slots, rounded up to a power of two.
+    """
+
+    def __init__(self, capacity=1 << 20):
+        self._bits = max(capacity - 1, 1).bit_length()
+        self._slots = array('Q', bytes(8 << self._bits))
+        self._packed = 0
+        self._others = set()
+
+    def __len__(self):
+        return self._packed + len(self._others)
+
+    def __contains__(self, code):
+        key = encode_product_code(code)
+        if key is None:
+            return code in self._others
+        return self._slots[self._find(key)] == key
+
+    def add(self, code):
+        """
+        Adds a product code to the index.
+
+        Args:
+            code (str): The product code.
+
+        Returns:
+            bool: True if the code was already in the index.
+        """
+        key = encode_product_code(code)
+        if key is None:
+            if code in self._others:
+                return True
+            self._others.add(code)
+            return False
+
+        slot = self._find(key)
+        if self._slots[slot] == key:
+            return True
+        self._slots[slot] = key
+        self._packed += 1
+        # Keep the table at most half full so probe sequences stay short
+        if self._packed * 2 > len(self._slots):
+            self._grow()
+        return False
+
+    def _find(self, key):
+        mask = len(self._slots) - 1
+        slot = ((key * _FIBONACCI) & _MASK_64) >> (64 - self._bits)
+        slots = self._slots
+        while slots[slot] and slots[slot] != key:
+            slot = (slot + 1) & mask
+        return slot
+
+    def _grow(self):
+        old_slots = self._slots
+        self._bits += 1
+        self._slots = array('Q', bytes(8 << self._bits))
+        for key in old_slots:
+            if key:
+                self._slots[self._find(key)] = key
@@ -0,0 +1,304 @@
+"""
+Deterministic segmentation of the Open Food Facts ingredients_text.
+
+    >>> [(i.name, i.percent) for i in parse_ingredients("Ingrédients : sucre, beurre de cacao 12,5 %, "
+    ...                                                  "chocolat (sucre, _lait_ en poudre). Peut contenir des noisettes.")]
+    [('sucre', None), ('beurre de cacao', 12.5), ('chocolat', None)]
+
+The text is split at the commas, semicolons and sentence ends outside of any brackets. Bracket
+groups hold sub-ingredient lists or percentages, and a class name may introduce its ingredient
+after a colon, as in "emulsifier: soy lecithin". Allergen statements such as "may contain",
+"peut contenir" or "kann Spuren von ... enthalten" end the ingredient list. A bare "contains"
+only does at the start of a sentence or after a colon, and "contains 2% or less of" goes on
+with the list:
+
+    >>> [i.name for i in parse_ingredients("Enriched flour (wheat flour, niacin), sugar, "
+    ...                                    "contains 2% or less of: salt, yeast, soybean oil.")]
+    ['enriched flour', 'sugar', 'salt', 'yeast', 'soybean oil']
+    >>> [i.name for i in parse_ingredients("Water, sugar, contains less than 2% of citric acid, natural flavor")]
+    ['water', 'sugar', 'citric acid', 'natural flavor']
+    >>> [i.name for i in parse_ingredients("Milk, cocoa butter. Contains: milk, soy.")]
+    ['milk', 'cocoa butter']
+    >>> [i.name for i in parse_ingredients("Lait, sucre, contient moins de 2% de : sel, arôme. Allergy advice: contains milk")]
+    ['lait', 'sucre', 'sel', 'arôme']
+
+A period ends a sentence only before a space and an upper case word, and not after an
+abbreviation:
+
+    >>> [i.name for i in parse_ingredients("Sugar, St. John's bread flour, vitamins (vit. C, vit. B6). Salt 1.2%. Yeast")]
+    ['sugar', 'st john s bread flour', 'vitamins', 'salt', 'yeast']
+    >>> ingredient_tokens("Sugar, vitamins (vit. C, vit. E), acid (min. 30%)", nested=True)
+    ['sugar', 'vitamins', 'vit c', 'vit e', 'acid']
+"""
+import re
+from collections import namedtuple
+
+# text: the ingredient as written, name: its canonical token, percent: its share when given,
+# ingredients: its sub-ingredients
+Ingredient = namedtuple('Ingredient', ('text', 'name', 'percent', 'ingredients'))
+
+_BRACKETS = re.compile(r'[()\[\]{}]')
+_DELIMITERS = re.compile(r'[()\[\]{},;.:]')
+_PERCENT = re.compile(r'(\d+(?:[.,]\d+)?)\s*%')
+_PERCENT_ONLY = re.compile(r'(?:(?:min|max)(?:imum|imal)?\.?\s*)?(\d+(?:[.,]\d+)?)\s*%(?:\s*(?:min|max)(?:imum|imal)?\.?)?')
+_NON_WORD = re.compile(r'[^\w\s-]')
+_NEXT_CHARACTER = re.compile(r'\s*(\S?)')
+
+# "Ingredients:" heading of the text, in the languages of the app and the most frequent ones of the dump
+_HEADING = re.compile(
+    r'^\W*(?:ingredients?|ingr[ée]dients?|ingredienti|zutaten|ingredientes|ingredi[ëe]nten)\s*:\s*',
+    re.IGNORECASE,
+)
+# Allergen statements, starting a clause. A bare "contains" also names the minor ingredients
+# of a list, so it only starts a statement at the start of a sentence or after a heading and a colon.
+_CONTAINS = re.compile(
+    r'(?:^|(?<=[.,;:(\[{]))\s*(?:(?:'
+    r'may\s+contain|can\s+contain|traces?\s+of|'
+    r'peut\s+contenir|traces?\s+(?:éventuelles?\s+)?de|'
+    r'pu[òo]\s+contenere|contiene|tracce\s+di|'
+    r'kann\s+(?:spuren|\w+\s+enthalten)|spuren\s+von|'
+    r'puede\s+contener|trazas\s+de'
+    r')\b|allerg(?:ens?|[èe]nes?|eni|ene)\s*:)'
+    r'|(?:(?:^|(?<=[.]))|(?:^|(?<=[.,;]))[^.,;:()\[\]{}]*:)\s*(?:contains|contient|enth[äa]lt)\b',
+    re.IGNORECASE,
+)
+# "contains 2% or less of:" introducing the minor ingredients of the list, as a delimiter
+_LESS_THAN = re.compile(
+    r'\b(?:contains|contient|enth[äa]lt)\s+'
+    r'(?:(?:less\s+than|not\s+more\s+than|moins\s+de|weniger\s+als)\s+)?\d+(?:[.,]\d+)?\s*%'
+    r'(?:\s+(?:or\s+less|ou\s+moins|oder\s+weniger))?'
+    r"(?:\s+(?:of\b(?:\s+each\s+of)?(?:\s+the\s+following)?|de|d'|von))?\s*:?",
+    re.IGNORECASE,
+)
+_STRIP = ' .:\n\t*'
+# Abbreviations ending with a period that do not end a sentence, as in "vit. C" or "St. John's bread"
+_ABBREVIATIONS = frozenset((
+    'vit', 'st', 'ste', 'sp', 'spp', 'ssp', 'subsp', 'var', 'ca', 'env', 'approx', 'min', 'max', 'mind',
+    'no', 'nr', 'incl', 'inkl', 'bzw', 'ggf', 'dr',
+))
+
+
+def split_brackets(text):
+    """
+    Separates the text outside of any brackets from the contents of the top-level bracket groups.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        tuple: The text outside of the brackets, and the list of the contents of the bracket groups.
+               The content of an unclosed group runs to the end of the text, an unmatched closing bracket is dropped.
+    """
+    if _BRACKETS.search(text) is None:
+        return text, []
+    outside = []
+    groups = []
+    depth = 0
+    start = 0
+    for match in _BRACKETS.finditer(text):
+        i = match.start()
+        if match.group() in '([{':
+            if depth == 0:
+                outside.append(text[start:i])
+                start = i + 1
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                groups.append(text[start:i])
+                start = i + 1
+        else:
+            outside.append(text[start:i])
+            start = i + 1
+    if depth:
+        groups.append(text[start:])
+    else:
+        outside.append(text[start:])
+    return ''.join(outside), groups
+
+
+def strip_brackets(text):
+    """
+    Removes the text enclosed within parentheses, square brackets or curly braces, nested ones included.
+
+    Args:
+        text (str): The text.
+
+    Returns:
+        str: The text outside of the brackets.
+    """
+    return split_brackets(text)[0]
+
+
+def canonical_name(text):
+    """
+    Normalizes an ingredient so its spelling variants share the same token.
+
+    Args:
+        text (str): An ingredient as written in the ingredients text.
+
+    Returns:
+        str: The ingredient in lower case, without bracketed details, percentages,
+             allergen underscores, punctuation and extra spaces.
+    """
+    return _canonical(strip_brackets(text))
+
+
+def _canonical(text):
+    name = text.lower().replace('_', ' ')
+    if '%' in name:
+        name = _PERCENT.sub(' ', name)
+    name = _NON_WORD.sub(' ', name)
+    return ' '.join(name.split())
+
+
+def _is_sentence_end(text, i):
+    # A period ends a sentence at the end of the text, or before a space and an upper case letter,
+    # not in "min. 30%", "vit. C" or "St. John's bread"
+    match = _NEXT_CHARACTER.match(text, i + 1)
+    following = match.group(1)
+    if not following:
+        return True
+    if not following.isupper() or match.start(1) == i + 1:
+        return False
+    start = i
+    while start and text[start - 1].isalnum():
+        start -= 1
+    return text[start:i].lower() not in _ABBREVIATIONS
+
+
+def _top_level_delimiters(text):
+    """
+    Yields the position and character of the delimiters outside of any brackets.
+
+    Commas between two digits, as in 12,5%, and periods not ending a sentence are not delimiters.
+    """
+    depth = 0
+    for match in _DELIMITERS.finditer(text):
+        char = match.group()
+        i = match.start()
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            if char == ',' and 0 < i < len(text) - 1 and text[i - 1].isdigit() and text[i + 1].isdigit():
+                continue
+            if char == '.' and not _is_sentence_end(text, i):
+                continue
+            yield i, char
+
+
+def _depth(text, end):
+    depth = 0
+    for match in _BRACKETS.finditer(text, 0, end):
+        depth = depth + 1 if match.group() in '([{' else max(depth - 1, 0)
+    return depth
+
+
+def split_contains(text):
+    """
+    Separates the ingredients from the allergen statement ending the text, if any.
+
+    Args:
+        text (str): An ingredients text, or the content of a bracket group.
+
+    Returns:
+        tuple: The ingredients, and the allergen statement or an empty string.
+    """
+    for match in _CONTAINS.finditer(text):
+        # Only a statement outside of any brackets ends the list
+        if _depth(text, match.start()) == 0:
+            return text[:match.start()], text[match.start():].strip()
+    return text, ''
+
+
+def _percent(text):
+    match = _PERCENT.search(text)
+    return float(match.group(1).replace(',', '.')) if match else None
+
+
+def _parse_ingredient(text, depth):
+    colon = next((i for i, char in _top_level_delimiters(text) if char == ':'), None) if ':' in text else None
+    if colon is not None and text[colon + 1:].strip(_STRIP):
+        # A class name followed by its ingredient, such as "emulsifier: soy lecithin"
+        label = text[:colon]
+        ingredient = _parse_ingredient(text[colon + 1:].strip(_STRIP), depth - 1) if depth else None
+        outside, groups = split_brackets(label)
+        sub_ingredients = [ingredient] if ingredient is not None else []
+    else:
+        outside, groups = split_brackets(text)
+        sub_ingredients = []
+
+    name = _canonical(outside)
+    if not name:
+        return None
+    percent = _percent(outside) if '%' in outside else None
+    for group in groups:
+        group, _ = split_contains(group)
+        group = group.strip(_STRIP)
+        percent_only = _PERCENT_ONLY.fullmatch(group)
+        if percent_only:
+            if percent is None:
+                percent = float(percent_only.group(1).replace(',', '.'))
+        elif depth:
+            sub_ingredients.extend(_parse_list(group, depth - 1))
+    return Ingredient(text, name, percent, tuple(sub_ingredients))
+
+
+def _parse_list(text, depth):
+    ingredients = []
+    start = 0
+    for end, char in _top_level_delimiters(text):
+        if char == ':':
+            continue
+        part = text[start:end].strip(_STRIP)
+        start = end + 1
+        if part:
+            ingredient = _parse_ingredient(part, depth)
+            if ingredient is not None:
+                ingredients.append(ingredient)
+    part = text[start:].strip(_STRIP)
+    if part:
+        ingredient = _parse_ingredient(part, depth)
+        if ingredient is not None:
+            ingredients.append(ingredient)
+    return ingredients
+
+
+def parse_ingredients(text, max_depth=4):
+    """
+    Splits an ingredients text into its ingredients.
+
+    Args:
+        text (str): The ingredients_text of an Open Food Facts product.
+        max_depth (int): The number of nested sub-ingredient lists parsed.
+
+    Returns:
+        list: The top-level ingredients, as Ingredient tuples, in the order of the text.
+    """
+    text = _HEADING.sub('', text, count=1)
+    if '%' in text:
+        text = _LESS_THAN.sub(',', text)
+    text, _ = split_contains(text)
+    return _parse_list(text, max_depth)
+
+
+def ingredient_tokens(text, nested=False):
+    """
+    Lists the canonical tokens of an ingredients text, each once.
+
+    Args:
+        text (str): The ingredients_text of an Open Food Facts product.
+        nested (bool): Includes the tokens of the sub-ingredients.
+
+    Returns:
+        list: The canonical names, in the order they first appear.
+    """
+    tokens = {}
+    pending = list(reversed(parse_ingredients(text, max_depth=4 if nested else 0)))
+    while pending:
+        ingredient = pending.pop()
+        tokens.setdefault(ingredient.name, None)
+        pending.extend(reversed(ingredient.ingredients))
+    return list(tokens)
@@ -0,0 +1,116 @@
+"""
+Compact encoding of the large attributes of the DynamoDB items.
+
+An encoded attribute is stored as a binary value made of a version byte followed by the
+compressed JSON of the original value:
+    0x01: zlib (RFC 1950) compressed UTF-8 JSON.
+
+Any other attribute type is returned as is by decode_attribute, so encoded and plain items
+can be read the same way. The barcode_product_summary Lambda decodes the same format.
+
+    >>> value = {'ingredients_text': 'sugar, cocoa butter, ' * 20, 'percent': Decimal('12.5')}
+    >>> encoded = encode_attribute(value)
+    >>> encoded[0] == ZLIB_JSON, len(encoded) < len(json.dumps(value, default=str)), decode_attribute(encoded) == value
+    (True, True, True)
+    >>> encode_attribute('sugar'), decode_attribute('sugar')
+    ('sugar', 'sugar')
+    >>> decode_attribute(bytes((2,)) + b'sugar')
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown attribute encoding version 2
+"""
+import json
+import zlib
+from decimal import Decimal
+
+ZLIB_JSON = 1
+
+# Attributes of the Open Food Facts table products and of the product table items worth encoding
+OPEN_FOOD_FACTS_ATTRIBUTES = ('ingredients_text', 'categories')
+PRODUCT_ATTRIBUTES = ('ingredients', 'additives', 'categories')
+
+# Values under this size rarely compress enough to pay for the version byte and zlib header
+MIN_ENCODED_SIZE = 128
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_attribute(value, min_size=MIN_ENCODED_SIZE):
+    """
+    Encodes a value as a compressed binary attribute.
+
+    Args:
+        value: A JSON serializable value, Decimal numbers included.
+        min_size (int): The size of the JSON under which the value is kept as is.
+
+    Returns:
+        The encoded bytes, or the original value if encoding does not make it smaller.
+    """
+    if value is None or isinstance(value, (bytes, bytearray)):
+        return value
+    data = json.dumps(value, separators=(',', ':'), ensure_ascii=False, default=_json_default).encode('utf-8')
+    if len(data) < min_size:
+        return value
+    encoded = bytes((ZLIB_JSON,)) + zlib.compress(data, 9)
+    return encoded if len(encoded) < len(data) else value
+
+
+def decode_attribute(value):
+    """
+    Decodes a value written by encode_attribute.
+
+    Args:
+        value: An attribute value, as bytes or boto3 Binary when encoded.
+
+    Returns:
+        The original value, with numbers as Decimal, or the value itself if it is not encoded.
+    """
+    if hasattr(value, 'value') and isinstance(value.value, (bytes, bytearray)):
+        # boto3 returns binary attributes as boto3.dynamodb.types.Binary
+        value = value.value
+    if not isinstance(value, (bytes, bytearray)) or not value:
+        return value
+    if value[0] != ZLIB_JSON:
+        raise ValueError(f"Unknown attribute encoding version {value[0]}")
+    return json.loads(zlib.decompress(value[1:]), parse_float=Decimal)
+
+
+def encode_attributes(item, attributes, min_size=MIN_ENCODED_SIZE):
+    """
+    Encodes some attributes of an item.
+
+    Args:
+        item (dict): The item.
+        attributes (tuple): The names of the attributes to encode.
+        min_size (int): The size of the JSON under which an attribute is kept as is.
+
+    Returns:
+        dict: A copy of the item with the attributes encoded.
+    """
+    encoded = dict(item)
+    for attribute in attributes:
+        if attribute in encoded:
+            encoded[attribute] = encode_attribute(encoded[attribute], min_size)
+    return encoded
+
+
+def decode_attributes(item, attributes=None):
+    """
+    Decodes the encoded attributes of an item.
+
+    Args:
+        item (dict): The item, as returned by the table.
+        attributes (tuple): The names of the attributes to decode, every attribute if None.
+
+    Returns:
+        dict: A copy of the item with the attributes decoded.
+    """
+    decoded = dict(item)
+    for attribute in (attributes if attributes is not None else item):
+        if attribute in decoded:
+            decoded[attribute] = decode_attribute(decoded[attribute])
+    return decoded
@@ -0,0 +1,94 @@
+"""
+Metrics of the model calls, written to the function logs in CloudWatch embedded metric format.
+
+CloudWatch turns each record into metrics of the METRICS_NAMESPACE namespace, with the CallSite and
+ModelId dimensions. A call site names the feature a model is called for, such as ingredients or
+recipe_images. A request served by a cache instead of the model counts in CacheHits, so the hit
+rate of a call site is CacheHits / Requests:
+
+    record_model_call("anthropic.claude-3-haiku-20240307-v1:0", "additives", latency=812.5,
+                      input_tokens=410, output_tokens=958, retries=0)
+    record_cache_hit("anthropic.claude-3-haiku-20240307-v1:0", "additives")
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+METRICS_NAMESPACE = os.environ.get('POWERTOOLS_METRICS_NAMESPACE', 'FoodAnalyzer')
+DIMENSIONS = ('CallSite', 'ModelId')
+UNITS = {
+    'Requests': 'Count',
+    'CacheHits': 'Count',
+    'Errors': 'Count',
+    'Retries': 'Count',
+    'InputTokens': 'Count',
+    'OutputTokens': 'Count',
+    'Latency': 'Milliseconds',
+}
+
+_FUNCTION_NAME = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+# A record is written in a single call, the handlers call models from several threads
+_lock = threading.Lock()
+
+
+def emit(model_id, call_site, **metrics):
+    """
+    Writes one record of metrics.
+
+    Args:
+        model_id (str): The ID of the model.
+        call_site (str): The feature the model is called for.
+        **metrics: The value of each metric of UNITS, the ones that are None are left out.
+    """
+    values = {name: value for name, value in metrics.items() if value is not None}
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [list(DIMENSIONS)],
+                'Metrics': [{'Name': name, 'Unit': UNITS[name]} for name in values],
+            }],
+        },
+        'CallSite': call_site,
+        'ModelId': model_id,
+        **values,
+    }
+    if _FUNCTION_NAME:
+        record['FunctionName'] = _FUNCTION_NAME
+    line = json.dumps(record) + '\n'
+    with _lock:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+
+
+def record_model_call(model_id, call_site, latency, input_tokens=None, output_tokens=None, retries=0, error=False):
+    """
+    Records a request answered by calling a model.
+
+    Args:
+        model_id (str): The ID of the model.
+        call_site (str): The feature the model is called for.
+        latency (float): The milliseconds the caller waited, throttling and retries included.
+        input_tokens (int): The tokens of the prompt, None if the model does not count them.
+        output_tokens (int): The tokens of the answer, None if the model does not count them.
+        retries (int): The number of throttled attempts retried.
+        error (bool): Whether the call failed.
+    """
+    emit(model_id, call_site, Requests=1, CacheHits=0, Errors=int(error), Retries=retries, Latency=latency,
+         InputTokens=input_tokens, OutputTokens=output_tokens)
+
+
+def record_cache_hit(model_id, call_site, count=1):
+    """
+    Records requests served by a cache, without calling the model.
+
+    Args:
+        model_id (str): The ID of the model the requests would have called.
+        call_site (str): The feature the model would have been called for.
+        count (int): The number of requests.
+    """
+    if count:
+        emit(model_id, call_site, Requests=count, CacheHits=count)
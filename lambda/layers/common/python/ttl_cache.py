@@ -0,0 +1,102 @@
+"""
+In-memory cache kept by a warm Lambda container between invocations.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# Cached value of a key known to have no item, as opposed to a key not in the cache
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Size-bounded cache evicting the least recently used entry, whose entries expire after a time to live.
+
+    Negative entries record that a key has no value, with their own, usually shorter, time to live.
+    The cache is safe to use from several threads.
+
+        >>> cache = TTLCache(maxsize=2, ttl=60, negative_ttl=0.05)
+        >>> cache.put('flour', 'Ground wheat'); cache.put('e999', None)
+        >>> cache.get('flour'), cache.get('e999') is MISSING, cache.get('sugar')
+        ('Ground wheat', True, None)
+        >>> time.sleep(0.1); cache.get('e999') is None   # the negative entry expired
+        True
+        >>> cache.put('salt', 'Sodium chloride'); cache.put('sugar', 'Sucrose')   # evicts flour
+        >>> cache.get('flour'), len(cache), cache.stats()['evictions']
+        (None, 2, 1)
+
+    Args:
+        maxsize (int): The maximum number of entries.
+        ttl (float): The number of seconds a value stays in the cache.
+        negative_ttl (float): The number of seconds a negative entry stays in the cache.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, negative_ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Retrieves the value of a key.
+
+        Args:
+            key: The key.
+
+        Returns:
+            The value, MISSING for a negative entry, or None if the key is not in the cache or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            if entry[1] is MISSING:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """
+        Stores the value of a key, or a negative entry if the value is None or MISSING.
+        """
+        if value is None:
+            value = MISSING
+        ttl = self.negative_ttl if value is MISSING else self.ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        """
+        Returns:
+            dict: The hit, negative hit, miss and eviction counters and the number of entries.
+        """
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
@@ -1,20 +1,9 @@
-import time
-import boto3
 import json
-from botocore.exceptions import ClientError
-import urllib.request
-import urllib.parse
-import urllib.error
-import json
-import os
 import re
-import xml.etree.ElementTree as ET
-from aws_lambda_powertools import Logger, Tracer
-
-bedrock = boto3.client("bedrock-runtime")
+from aws_lambda_powertools import Logger
+from bedrock_client import invoke_model
 
 
-tracer = Tracer()
 logger = Logger()
 
 def post_process_answer(response:str)->list:
@@ -32,12 +21,11 @@ def post_process_answer(response:str)->list:
     ingredients=[ingredient for ingredients in json_answer.values() for ingredient in ingredients]
     return ingredients
 
-def generate_vision_answer(bedrock_rt:boto3.client,messages:list, model_id:str, claude_config:dict,system_prompt:str, post_process:bool)->str:
+def generate_vision_answer(messages:list, model_id:str, claude_config:dict,system_prompt:str, post_process:bool)->str:
     """
     Generates a vision answer using the specified model and configuration.
     
     Parameters:
-    - bedrock_rt (boto3.client): The Bedrock runtime client.
     - messages (list): A list of messages.
     - model_id (str): The ID of the model to use.
     - claude_config (dict): The configuration for Claude.
@@ -49,9 +37,10 @@ def generate_vision_answer(bedrock_rt:boto3.client,messages:list, model_id:str,
     
     body={'messages': [messages],**claude_config, "system": system_prompt}
     
-    response = bedrock_rt.invoke_model(
-        modelId=model_id,
-        body=json.dumps(body),
+    response = invoke_model(
+        model_id,
+        json.dumps(body),
+        'recipe_image_ingredients',
         performanceConfigLatency='standard'
     )   
     response = json.loads(response['body'].read().decode('utf-8'))
@@ -113,7 +102,7 @@ def handler(event, context):
     Before answer, think step by step in <thinking> tags and analyze every part of each image. Answer must be in <answer></answer> tags."
     """%(language)
     messages=create_message_few_shot_image(list_images_base64,prompt)
-    ingredients= generate_vision_answer(bedrock, messages, model_id, claude_config, system_prompt=system_prompt,post_process=True)
+    ingredients= generate_vision_answer(messages, model_id, claude_config, system_prompt=system_prompt,post_process=True)
     
 
     
@@ -1,28 +1,20 @@
-import time
-import boto3
 import base64
 import json
 import uuid
-from botocore.exceptions import ClientError
-import urllib.request
-import urllib.parse
-import urllib.error
-import json
 import os
 import re
-import xml.etree.ElementTree as ET
-from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools import Logger
+from aws_clients import lazy_client
+from bedrock_client import invoke_model
 import concurrent.futures
 from functools import partial
 
 
 
-bedrock_rt = boto3.client("bedrock-runtime")
-s3 = boto3.client('s3')
+s3 = lazy_client('s3')
 
 S3_BUCKET_NAME = os.environ['S3_BUCKET_NAME']
 
-tracer = Tracer()
 logger = Logger()
 
 def call_bedrock_thread(prompt, model_id, accept, content_type):
@@ -42,9 +34,10 @@ def call_bedrock_thread(prompt, model_id, accept, content_type):
         }
     })
 
-    response = bedrock_rt.invoke_model(
-        body=body,
-        modelId=model_id,
+    response = invoke_model(
+        model_id,
+        body,
+        'recipe_images',
         accept=accept,
         contentType=content_type,
         performanceConfigLatency='standard',
@@ -118,9 +111,10 @@ def generate_answer(prompt:str, model_id:str, claude_config:dict,system_prompt:s
                           {"role": "assistant", "content": "The answer is"}]}
     
     body={**message,**claude_config, "system": system_prompt}
-    response = bedrock_rt.invoke_model(
-        modelId=model_id,
-        body=json.dumps(body),
+    response = invoke_model(
+        model_id,
+        json.dumps(body),
+        'recipe_proposals',
         performanceConfigLatency='standard'
     )
     response = json.loads(response['body'].read().decode('utf-8'))
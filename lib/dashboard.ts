@@ -7,18 +7,24 @@ import {
   Metric,
   Row, TextWidget,
   SingleValueWidget,
-  IMetric
+  IMetric,
+  MathExpression
 } from 'aws-cdk-lib/aws-cloudwatch';
 import {Construct} from "constructs";
 
 import _importedTokenMetricsDef from './metrics/token-metric-definition.json'
 import _importedBedrockInvocationCountDef from './metrics/invocation_model_count.json'
 import _importedBedrockInvocationThroughputDef from './metrics/invocation_model_throughput.json'
+import _importedModelCallSitesDef from './metrics/model-call-sites.json'
 import {IFunction} from "aws-cdk-lib/aws-lambda";
 
 const importedTokenMetricsDef = _importedTokenMetricsDef as (string|CloudWatchMetricImportProps)[][]
 const importedBedrockInvocationCountDef = _importedBedrockInvocationCountDef as (string|CloudWatchMetricImportProps)[][]
 const importedBedrockInvocationThroughputDef = _importedBedrockInvocationThroughputDef as (string|CloudWatchMetricImportProps)[][]
+const importedModelCallSitesDef = _importedModelCallSitesDef as ModelCallSite[]
+
+// Namespace of the metrics written by lambda/layers/common/python/model_metrics.py
+const MODEL_METRICS_NAMESPACE = "FoodAnalyzer"
 
 interface CloudWatchMetricImportProps {
   period: number
@@ -27,6 +33,11 @@ interface CloudWatchMetricImportProps {
   region:string
 }
 
+interface ModelCallSite {
+  callSite: string
+  modelId: string
+}
+
 
 export interface FoodAnalyzerDashboardProps {
   stage: string
@@ -168,6 +179,98 @@ export class FoodAnalyzerDashBoard extends Construct {
     dashboard.addWidgets(new Row(invocationPerMinuteWidget, invocationThrottledWidget))
 
 
+    /*
+      Model calls per feature, from the embedded metrics of the Python Lambdas
+     */
+
+    const modelCallSectionWidget = new TextWidget({
+      width: 24,
+      height: 2,
+      markdown: "\n\n## Model calls by feature"
+    })
+    dashboard.addWidgets(new Row(modelCallSectionWidget))
+
+    const modelCallMetric = (site: ModelCallSite, metricName: string, statistic: string, period = Duration.minutes(5)) => {
+      return new Metric({
+        namespace: MODEL_METRICS_NAMESPACE,
+        metricName: metricName,
+        dimensionsMap: {
+          CallSite: site.callSite,
+          ModelId: site.modelId
+        },
+        period: period,
+        label: `${metricName} ${site.callSite}`,
+        statistic: statistic,
+        region: Stack.of(this).region
+      })
+    }
+
+    const tokensByFeatureWidget = new GraphWidget({
+      width: 12,
+      height: 6,
+      title: "Tokens by Feature",
+      region: Stack.of(this).region,
+      view: GraphWidgetView.TIME_SERIES,
+      stacked: true,
+      legendPosition: LegendPosition.RIGHT,
+      left: importedModelCallSitesDef.map((site) => modelCallMetric(site, "InputTokens", "Sum", Duration.hours(1))),
+      right: importedModelCallSitesDef.map((site) => modelCallMetric(site, "OutputTokens", "Sum", Duration.hours(1)))
+    })
+
+    const latencyByFeatureWidget = new GraphWidget({
+      width: 12,
+      height: 6,
+      title: "Model Latency by Feature (p50, p90)",
+      region: Stack.of(this).region,
+      view: GraphWidgetView.TIME_SERIES,
+      stacked: false,
+      legendPosition: LegendPosition.RIGHT,
+      left: importedModelCallSitesDef.flatMap((site) => [
+        modelCallMetric(site, "Latency", "p50").with({label: `p50 ${site.callSite}`}),
+        modelCallMetric(site, "Latency", "p90").with({label: `p90 ${site.callSite}`})
+      ])
+    })
+
+    dashboard.addWidgets(new Row(tokensByFeatureWidget, latencyByFeatureWidget))
+
+    const cacheHitRateMetrics = importedModelCallSitesDef.map((site) => {
+      return new MathExpression({
+        expression: "100 * hits / requests",
+        usingMetrics: {
+          hits: modelCallMetric(site, "CacheHits", "Sum", Duration.hours(1)),
+          requests: modelCallMetric(site, "Requests", "Sum", Duration.hours(1))
+        },
+        label: site.callSite,
+        period: Duration.hours(1)
+      })
+    })
+    const cacheHitRateWidget = new GraphWidget({
+      width: 12,
+      height: 6,
+      title: "Cache Hit Rate by Feature (%)",
+      region: Stack.of(this).region,
+      view: GraphWidgetView.TIME_SERIES,
+      stacked: false,
+      legendPosition: LegendPosition.RIGHT,
+      left: cacheHitRateMetrics,
+      leftYAxis: {min: 0, max: 100}
+    })
+
+    const retriesByFeatureWidget = new GraphWidget({
+      width: 12,
+      height: 6,
+      title: "Model Retries and Errors by Feature",
+      region: Stack.of(this).region,
+      view: GraphWidgetView.TIME_SERIES,
+      stacked: false,
+      legendPosition: LegendPosition.RIGHT,
+      left: importedModelCallSitesDef.map((site) => modelCallMetric(site, "Retries", "Sum")),
+      right: importedModelCallSitesDef.map((site) => modelCallMetric(site, "Errors", "Sum"))
+    })
+
+    dashboard.addWidgets(new Row(cacheHitRateWidget, retriesByFeatureWidget))
+
+
     /*
       Lambda Based metric
      */
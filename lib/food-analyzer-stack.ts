@@ -54,6 +54,12 @@ export class FoodAnalyzerStack extends Stack {
       }:017000801446:layer:AWSLambdaPowertoolsPythonV2:60`
     );
 
+    // Python modules shared by the Lambdas, importable from /opt/python
+    const commonLayer = new lambda.LayerVersion(this, "CommonLayer", {
+      code: lambda.Code.fromAsset("lambda/layers/common"),
+      compatibleRuntimes: [lambda.Runtime.PYTHON_3_14],
+    });
+
     const powerToolsTypeScriptLayer = lambda.LayerVersion.fromLayerVersionArn(
       this,
       "powertools-layer-ts",
@@ -86,6 +92,28 @@ export class FoodAnalyzerStack extends Stack {
       encryption: TableEncryption.DEFAULT,
     });
 
+    // Descriptions of single ingredients, shared by all the products
+    const ingredientsTable = new dynamodb.Table(this, "IngredientsTable", {
+      partitionKey: {
+        name: "ingredient",
+        type: dynamodb.AttributeType.STRING,
+      },
+      sortKey: { name: "language", type: dynamodb.AttributeType.STRING },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      encryption: TableEncryption.DEFAULT,
+    });
+
+    // Barcodes unknown to the Open Food Facts API, forgotten after their expires_at time
+    const notFoundProductsTable = new dynamodb.Table(this, "NotFoundProductsTable", {
+      partitionKey: {
+        name: "product_code",
+        type: dynamodb.AttributeType.STRING,
+      },
+      timeToLiveAttribute: "expires_at",
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      encryption: TableEncryption.DEFAULT,
+    });
+
     const productsSummaryTable = new dynamodb.Table(
       this,
       "ProductsSummaryTable",
@@ -150,6 +178,18 @@ export class FoodAnalyzerStack extends Stack {
       }),
     });
 
+    // Additive descriptions generated by the Open Food Facts load project, read by the ingredients Lambda
+    const additivesBucket = new s3.Bucket(this, "AdditivesBucket", {
+      enforceSSL: true,
+      encryption: s3.BucketEncryption.S3_MANAGED,
+      blockPublicAccess: new s3.BlockPublicAccess({
+        blockPublicPolicy: true,
+        blockPublicAcls: true,
+        ignorePublicAcls: true,
+        restrictPublicBuckets: true,
+      }),
+    });
+
     const hostingOrigin = new origins.S3Origin(hostingBucket);
     const s3ImgOrigin = new origins.S3Origin(imgBucket);
 
@@ -205,44 +245,87 @@ export class FoodAnalyzerStack extends Stack {
       assumedBy: new iam.ServicePrincipal("lambda.amazonaws.com"),
     });
 
+    const barcodeIngredientsCode = lambda.Code.fromAsset("lambda/barcode_ingredients", {
+      bundling: {
+        image: DockerImage.fromRegistry("public.ecr.aws/sam/build-python3.14:latest"),
+        command: [
+          "bash", "-c",
+          "pip install -r requirements.txt -t /asset-output && cp -au . /asset-output"
+        ],
+      },
+    });
+
+    const barcodeIngredientsEnvironment = {
+      POWERTOOLS_SERVICE_NAME: "food-lens",
+      POWERTOOLS_LOG_LEVEL: "DEBUG",
+      API_URL: "https://world.openfoodfacts.org",
+      LANGUAGE: "French",
+      PRODUCT_TABLE_NAME: productsTable.tableName,
+      OPEN_FOOD_FACTS_TABLE_NAME: openFoodFactsProductsTable.tableName,
+      INGREDIENT_TABLE_NAME: ingredientsTable.tableName,
+      NOT_FOUND_TABLE_NAME: notFoundProductsTable.tableName,
+      COMPRESS_ATTRIBUTES: "true",
+      ADDITIVES_BUCKET: additivesBucket.bucketName,
+    };
+
     const barcodeIngredientsFunction = new lambda.Function(
       this,
       "GetIngredients",
       {
         runtime: lambda.Runtime.PYTHON_3_14,
         handler: "index.handler",
-        code: lambda.Code.fromAsset("lambda/barcode_ingredients", {
-          bundling: {
-            image: DockerImage.fromRegistry("public.ecr.aws/sam/build-python3.14:latest"),
-            command: [
-              "bash", "-c",
-              "pip install -r requirements.txt -t /asset-output && cp -au . /asset-output"
-            ],
-          },
-        }),
+        code: barcodeIngredientsCode,
         memorySize: 10240,
         role: lambdaRole,
-        layers: [powerToolsLayer],
+        layers: [powerToolsLayer, commonLayer],
+        tracing: Tracing.ACTIVE,
+        timeout: Duration.minutes(5),
+        logRetention: RetentionDays.ONE_WEEK,
+        retryAttempts: 0,
+        environment: barcodeIngredientsEnvironment,
+      }
+    );
+
+    // Same code served by the HTTP server of stream.py through the Lambda Web Adapter,
+    // as the Python runtime does not stream responses by itself
+    const barcodeIngredientsStreamFunction = new lambda.Function(
+      this,
+      "GetIngredientsStream",
+      {
+        runtime: lambda.Runtime.PYTHON_3_14,
+        handler: "run.sh",
+        code: barcodeIngredientsCode,
+        memorySize: 10240,
+        role: lambdaRole,
+        layers: [
+          powerToolsLayer,
+          commonLayer,
+          lambda.LayerVersion.fromLayerVersionArn(
+            this,
+            "lambda-web-adapter-layer",
+            `arn:aws:lambda:${Stack.of(this).region}:753240598075:layer:LambdaAdapterLayerX86:25`
+          ),
+        ],
         tracing: Tracing.ACTIVE,
         timeout: Duration.minutes(5),
         logRetention: RetentionDays.ONE_WEEK,
         retryAttempts: 0,
         environment: {
-          POWERTOOLS_SERVICE_NAME: "food-lens",
-          POWERTOOLS_LOG_LEVEL: "DEBUG",
-          API_URL: "https://world.openfoodfacts.org",
-          LANGUAGE: "French",
-          PRODUCT_TABLE_NAME: productsTable.tableName,
-          OPEN_FOOD_FACTS_TABLE_NAME: openFoodFactsProductsTable.tableName,
+          ...barcodeIngredientsEnvironment,
+          AWS_LAMBDA_EXEC_WRAPPER: "/opt/bootstrap",
+          AWS_LWA_INVOKE_MODE: "response_stream",
+          PORT: "8080",
         },
       }
     );
 
-
     this.getIngredients = barcodeIngredientsFunction;
 
     productsTable.grantReadWriteData(barcodeIngredientsFunction);
+    ingredientsTable.grantReadWriteData(barcodeIngredientsFunction);
+    notFoundProductsTable.grantReadWriteData(barcodeIngredientsFunction);
     openFoodFactsProductsTable.grantReadData(barcodeIngredientsFunction)
+    additivesBucket.grantRead(barcodeIngredientsFunction);
 
     barcodeIngredientsFunction.metricInvocations();
     barcodeIngredientsFunction.addToRolePolicy(
@@ -260,7 +343,10 @@ export class FoodAnalyzerStack extends Stack {
     barcodeIngredientsFunction.addToRolePolicy(
       new iam.PolicyStatement({
         effect: iam.Effect.ALLOW,
-        actions: ["bedrock:InvokeModel"],
+        actions: [
+          "bedrock:InvokeModel",
+          "bedrock:InvokeModelWithResponseStream",
+        ],
         resources: [
           `arn:${Aws.PARTITION}:bedrock:${Aws.REGION}::foundation-model/*`,
         ],
@@ -272,6 +358,11 @@ export class FoodAnalyzerStack extends Stack {
       invokeMode: lambda.InvokeMode.BUFFERED,
     });
 
+    const ingredientsStreamFunctionUrl = barcodeIngredientsStreamFunction.addFunctionUrl({
+      authType: lambda.FunctionUrlAuthType.AWS_IAM,
+      invokeMode: lambda.InvokeMode.RESPONSE_STREAM,
+    });
+
     const recipeImageIngredientsFunction = new lambda.Function(
       this,
       "GetImageIngredients",
@@ -281,7 +372,7 @@ export class FoodAnalyzerStack extends Stack {
         code: lambda.Code.fromAsset("lambda/recipe_image_ingredients"),
         memorySize: 10240,
         role: lambdaRole,
-        layers: [powerToolsLayer],
+        layers: [powerToolsLayer, commonLayer],
         tracing: Tracing.ACTIVE,
         timeout: Duration.minutes(5),
         logRetention: RetentionDays.ONE_WEEK,
@@ -326,7 +417,7 @@ export class FoodAnalyzerStack extends Stack {
         code: lambda.Code.fromAsset("lambda/recipe_proposals"),
         memorySize: 10240,
         role: lambdaRole,
-        layers: [powerToolsLayer],
+        layers: [powerToolsLayer, commonLayer],
         tracing: Tracing.ACTIVE,
         timeout: Duration.minutes(5),
         logRetention: RetentionDays.ONE_WEEK,
@@ -371,7 +462,7 @@ export class FoodAnalyzerStack extends Stack {
       memorySize: 10240, // 10240 MB
       timeout: Duration.minutes(5),
       role: basicLambdaRole,
-      layers: [powerToolsLayer],
+      layers: [powerToolsLayer, commonLayer],
       environment: {
         POWERTOOLS_SERVICE_NAME: "food-lens",
         POWERTOOLS_LOG_LEVEL: "DEBUG",
@@ -537,6 +628,7 @@ export class FoodAnalyzerStack extends Stack {
         actions: ["lambda:InvokeFunctionUrl"],
         resources: [
           ingredientsFunctionUrl.functionArn,
+          ingredientsStreamFunctionUrl.functionArn,
           recipeImageIngredientsFunctionUrl.functionArn,
           barcodeProductSummaryFunctionUrl.functionArn,
           barcodeImageFunctionUrl.functionArn,
@@ -601,6 +693,12 @@ export class FoodAnalyzerStack extends Stack {
       getBehaviorOptions
     );
 
+    distribution.addBehavior(
+      "/fetchIngredientsStream/*",
+      new HttpOrigin(Fn.select(2, Fn.split("/", ingredientsStreamFunctionUrl.url))),
+      getBehaviorOptions
+    );
+
     distribution.addBehavior(
       "/fetchSummary",
       new HttpOrigin(
@@ -721,7 +819,7 @@ export class FoodAnalyzerStack extends Stack {
 
 
 
-  const loadDatabase = new LoadDatabase(this, "LoadSF", openFoodFactsProductsTable, this.stackName);
+  const loadDatabase = new LoadDatabase(this, "LoadSF", openFoodFactsProductsTable, this.stackName, additivesBucket);
 
   }
 
@@ -15,7 +15,8 @@ import { LogLevel } from "aws-cdk-lib/aws-stepfunctions";
 import { Construct } from "constructs";
 
 export class LoadDatabase extends Construct {
-  constructor(scope: Construct, id: string, tableToLoad: dynamodb.Table, stackName: string) {
+  constructor(scope: Construct, id: string, tableToLoad: dynamodb.Table, stackName: string,
+              additivesBucket: s3.Bucket) {
     super(scope, id);
 
     const loadSourceCode = new s3.Bucket(this, "LoadSourceCode", {
@@ -29,6 +30,18 @@ export class LoadDatabase extends Construct {
       }),
     });
 
+    // Keeps the load checkpoint and the product digests between two runs
+    const loaderState = new s3.Bucket(this, "LoaderState", {
+      enforceSSL: true,
+      encryption: s3.BucketEncryption.S3_MANAGED,
+      blockPublicAccess: new s3.BlockPublicAccess({
+        blockPublicPolicy: true,
+        blockPublicAcls: true,
+        ignorePublicAcls: true,
+        restrictPublicBuckets: true,
+      }),
+    });
+
     const codebuildProject = new codebuild.Project(this, "Project", {
       logging: {
         cloudWatch: {
@@ -55,9 +68,17 @@ export class LoadDatabase extends Construct {
           build: {
             commands: [
               "python3 --version", 
+              // Generates the additive descriptions missing from the bucket read by the ingredients Lambda
+              "cd additives",
+              "pip install -r requirements.txt",
+              "aws s3 sync s3://$ADDITIVES_BUCKET/ descriptions/",
+              "python3 build-additives.py --output-dir descriptions",
+              "aws s3 sync descriptions/ s3://$ADDITIVES_BUCKET/",
+              "cd ..",
               "cd openfoodfacts",
               "pip install -r requirements.txt",
-              `python3 db-loader-jsonl.py ${stackName}`,
+              // The modules shared with the Lambdas are deployed in python/, as in their layer
+              `PYTHONPATH=../python python3 db-loader-jsonl.py ${stackName} --stream --compress`,
             ],
           },
         },
@@ -69,11 +90,13 @@ export class LoadDatabase extends Construct {
     });
 
     loadSourceCode.grantRead(codebuildProject);
+    loaderState.grantReadWrite(codebuildProject);
+    additivesBucket.grantReadWrite(codebuildProject);
 
     tableToLoad.grantReadWriteData(codebuildProject)
 
     new s3deploy.BucketDeployment(this, "DeploySrcCode", {
-      sources: [s3deploy.Source.asset("scripts/")],
+      sources: [s3deploy.Source.asset("scripts/"), s3deploy.Source.asset("lambda/layers/common")],
       destinationBucket: loadSourceCode,
     });
 
@@ -93,6 +116,14 @@ export class LoadDatabase extends Construct {
             type: codebuild.BuildEnvironmentVariableType.PLAINTEXT,
             value: tableToLoad.tableName,
           },
+          STATE_BUCKET: {
+            type: codebuild.BuildEnvironmentVariableType.PLAINTEXT,
+            value: loaderState.bucketName,
+          },
+          ADDITIVES_BUCKET: {
+            type: codebuild.BuildEnvironmentVariableType.PLAINTEXT,
+            value: additivesBucket.bucketName,
+          },
         },
       }
     );
@@ -119,5 +150,14 @@ export class LoadDatabase extends Construct {
         resources: ["*"],
       })
     )
+
+    codebuildProject.addToRolePolicy(
+      new iam.PolicyStatement({
+        actions: ["bedrock:InvokeModel"],
+        resources: [
+          `arn:${Aws.PARTITION}:bedrock:${Aws.REGION}::foundation-model/*`,
+        ],
+      })
+    )
   }
 }
@@ -14,7 +14,7 @@ import Alert from "@cloudscape-design/components/alert";
 import { Container, Tabs, Box, ColumnLayout } from "@cloudscape-design/components";
 import Header from "@cloudscape-design/components/header";
 import { SpaceBetween } from "@cloudscape-design/components";
-import { callAPI } from "../../assets/js/custom";
+import { callStreamingAPI } from "../../assets/js/custom";
 import "../../assets/css/style.css";
 import customTranslations from "../../assets/i18n/all";
 import { FlowItems } from "./flowitems";
@@ -39,6 +39,7 @@ const BarcodeIngredients: React.FC<BarcodeIngredientsProps> = ({
   const [ingredients, setIngredients] = useState<any[]>([]);
   const [additives, setAdditives] = useState<any[]>([]);
   const [apiResponse, setApiResponse] = useState(null);
+  const [productLoaded, setProductLoaded] = useState(false);
   const [loading, setLoading] = useState(true); // Added loading state
   const [productName, setProductName] = useState<string>(""); // Added loading state
   const [ingredientsError, setIngredientsError] = useState("");
@@ -88,68 +89,98 @@ const BarcodeIngredients: React.FC<BarcodeIngredientsProps> = ({
     }
   };
 
+  const applyEvent = (event: any) => {
+    switch (event.type) {
+      case "product":
+        // The product facts come first, before any description is generated
+        setProductName(event.product_name);
+        setNutriments(event.nutriments || null);
+        setAllergensTags(event.allergens_tags || []);
+        setLabelsTags(event.labels_tags || []);
+        setNovaGroup(event.nova_group);
+        setNutriscoreGrade(event.nutriscore_grade);
+        setEcoscoreGrade(event.ecoscore_grade);
+        setBrands(event.brands);
+        setImageSmallUrl(event.image_small_url);
+        setImageThumbUrl(event.image_thumb_url);
+        setProductLoaded(true);
+        setLoading(false);
+        break;
+      case "ingredient":
+        setIngredients((previous) => [
+          ...previous,
+          { label: event.name, description: event.description },
+        ]);
+        break;
+      case "additives": {
+        const myAdditives: Additive[] = Object.entries(
+          event.additives_description || {}
+        ).map(([key, value]) => ({
+          label: key,
+          description: value as string,
+        }));
+        setAdditives(myAdditives);
+        break;
+      }
+      case "done":
+        setApiResponse(event);
+        break;
+      case "error":
+        throw new Error(
+          event.error === "NOT_FOUND"
+            ? currentTranslations["ingredients_not_found"]
+            : event.error
+        );
+    }
+  };
+
   const fetchData = async () => {
 
     setApiResponse(null);
+    setProductLoaded(false);
+    setIngredients([]);
+    setAdditives([]);
     setLoading(true);
 
+    // Extract health goal from user preferences
+    const stored = localStorage.getItem("userPreferences");
+    if (stored) {
+      const prefs = JSON.parse(stored);
+      setHealthGoal(prefs.healthGoal?.label || undefined);
+    }
+
     try {
-      const response = await callAPI(
-        `fetchIngredients/${productCode}/${language}`,
+      const response = await callStreamingAPI(
+        `fetchIngredientsStream/${productCode}/${language}`,
         "GET",
         null
       );
 
-      if (!response.error) {
-        const keyValueArray = Object.entries(response.ingredients_description);
-        const newIngredients = keyValueArray.map(([key, value]) => ({
-          label: key,
-          description: value,
-        }));
-
-        setIngredients(newIngredients);
-
-        setProductName(response.product_name);
-        setNutriments(response.nutriments || null);
-        setAllergensTags(response.allergens_tags || []);
-        setLabelsTags(response.labels_tags || []);
-        setNovaGroup(response.nova_group);
-        setNutriscoreGrade(response.nutriscore_grade);
-        setEcoscoreGrade(response.ecoscore_grade);
-        setBrands(response.brands);
-        setImageSmallUrl(response.image_small_url);
-        setImageThumbUrl(response.image_thumb_url);
-
-        // Extract health goal from user preferences
-        const stored = localStorage.getItem("userPreferences");
-        if (stored) {
-          const prefs = JSON.parse(stored);
-          setHealthGoal(prefs.healthGoal?.label || undefined);
+      // One JSON event per line, a line may be split across chunks
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) {
+          break;
         }
-
-        const myAdditives:Additive [] = [];
-        for (const key in response.additives_description) {
-          if (response.additives_description.hasOwnProperty(key)) {
-            const value = response.additives_description[key];
-            myAdditives.push({
-              label: key,
-              description: value,
-            });
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop() || "";
+        for (const line of lines) {
+          if (line.trim()) {
+            applyEvent(JSON.parse(line));
           }
         }
-
-        setAdditives(myAdditives);
-        setApiResponse(response);
-      } else {
-        setIngredientsError(
-          response.error === "NOT_FOUND"
-            ? currentTranslations["ingredients_not_found"]
-            : response.error
-        );
       }
-    } catch (error) {
+    } catch (error: any) {
       console.error("Error fetching data:", error);
-      setIngredientsError("Ingredients: Error fetching data: " + error);
+      setIngredientsError(
+        error.message === currentTranslations["ingredients_not_found"]
+          ? error.message
+          : "Ingredients: Error fetching data: " + error
+      );
     } finally {
       setLoading(false);
     }
@@ -189,7 +220,7 @@ const BarcodeIngredients: React.FC<BarcodeIngredientsProps> = ({
       ) : (
         <>
           {/* Display loading message or spinner */}
-          {apiResponse && (
+          {productLoaded && (
             <div>
               <SpaceBetween direction="vertical" size="m">
                 {/* Product Header Card */}
@@ -290,11 +321,14 @@ const BarcodeIngredients: React.FC<BarcodeIngredientsProps> = ({
                     {
                       label: currentTranslations["tab_ai_summary"],
                       id: "summary",
-                      content: (
+                      // The summary reads the product stored once all the descriptions are generated
+                      content: apiResponse ? (
                         <IngredientsSummary
                           productCode={productCode}
                           language={language}
                         />
+                      ) : (
+                        <Spinner />
                       ),
                     },
                     {
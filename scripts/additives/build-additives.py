@@ -0,0 +1,143 @@
+"""
+Generates the additive descriptions of every Open Food Facts additive once per language.
+
+The descriptions are written to <output dir>/<language>.json. The Open Food Facts load project
+runs the script with the files of the additives bucket, which the Lambda reads to resolve additives
+without calling the model. Files written to lambda/barcode_ingredients/additives/, the default
+output directory, are bundled with the Lambda instead:
+
+    python3 build-additives.py --languages english french italian
+
+Already generated additives are kept, so the script can be rerun to complete a file or to
+add the additives of a newer taxonomy.
+"""
+import argparse
+import json
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+
+import boto3
+import requests
+from botocore.exceptions import ClientError
+
+TAXONOMY_URL = 'https://static.openfoodfacts.org/data/taxonomies/additives.json'
+MODEL_ID = 'anthropic.claude-3-haiku-20240307-v1:0'
+OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'lambda', 'barcode_ingredients', 'additives')
+
+
+def generate_additives_description(additives, language):
+    language = language.capitalize()
+    return f"""Here is a list of additives:
+<additives>
+{additives}
+</additives>
+Generate a description for each additive to explain it to a 5 years old child.
+Copy the additive exactly as it is written in the list in the tag element.
+Provide the name and the description in {language}, skip the preambule and provide only the response in this XML format:
+<additives>
+    <additive>
+        <tag>{{TAG}}</tag>
+        <name>{{ADDITIVE}}</name>
+        <description>{{DESCRIPTION}}</description>
+    </additive>
+</additives>
+"""
+
+
+def download_additive_tags(url):
+    """
+    Lists the additives of the Open Food Facts taxonomy.
+
+    Args:
+        url (str): The URL of the additives taxonomy.
+
+    Returns:
+        list: The additive tags, such as en:e330.
+    """
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    return sorted(tag for tag in response.json() if re.fullmatch(r'en:e\d+[a-z]*', tag))
+
+
+def call_model(bedrock, prompt_text, max_retries=5):
+    body = json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": 4096,
+        "messages": [{"role": "user", "content": [{"type": "text", "text": prompt_text}]}],
+    })
+    for attempt in range(max_retries + 1):
+        try:
+            response = bedrock.invoke_model(body=body, modelId=MODEL_ID, accept="application/json",
+                                            contentType="application/json")
+            return json.loads(response.get("body").read())["content"][0]["text"]
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ThrottlingException' or attempt == max_retries:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def generate_descriptions(bedrock, tags, language):
+    """
+    Generates the descriptions of a group of additives.
+
+    Args:
+        bedrock: The Bedrock runtime client.
+        tags (list): The additive tags.
+        language (str): The language of the names and descriptions.
+
+    Returns:
+        dict: The name and description of each additive tag found in the answer.
+    """
+    text = call_model(bedrock, generate_additives_description(tags, language))
+    start = text.find('<additives>')
+    root = ET.fromstring(text[start:] if start != -1 else text)
+    descriptions = {}
+    for additive in root.iter('additive'):
+        tag = (additive.findtext('tag') or '').strip().lower()
+        name = (additive.findtext('name') or '').strip()
+        description = (additive.findtext('description') or '').strip()
+        if tag in tags and name and description:
+            descriptions[tag] = {'name': name, 'description': description}
+    return descriptions
+
+
+def build_language(bedrock, tags, language, output_dir, group_size):
+    path = os.path.join(output_dir, f'{language}.json')
+    descriptions = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            descriptions = json.load(f)
+
+    missing = [tag for tag in tags if tag not in descriptions]
+    print(f"{language}: {len(descriptions)} additives already described, {len(missing)} to generate.")
+    for i in range(0, len(missing), group_size):
+        group = missing[i:i + group_size]
+        try:
+            descriptions.update(generate_descriptions(bedrock, group, language))
+        except (ClientError, ET.ParseError) as e:
+            print(f"Skipping additives {group[0]} to {group[-1]}: {e}")
+            continue
+        # Save after every group so an interrupted build keeps its progress
+        with open(path, 'w') as f:
+            json.dump(dict(sorted(descriptions.items())), f, ensure_ascii=False, indent=1)
+
+    print(f"{language}: {len(descriptions)} of {len(tags)} additives described in {path}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate the additive descriptions bundled with the Lambda.")
+    parser.add_argument("--languages", nargs="+", default=["english", "french", "italian"],
+                        help="Languages of the descriptions, as sent by the app.")
+    parser.add_argument("--taxonomy-url", default=TAXONOMY_URL, help="URL of the Open Food Facts additives taxonomy.")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="Directory of the description files.")
+    parser.add_argument("--group-size", type=int, default=25, help="Number of additives described per model call.")
+    args = parser.parse_args()
+
+    tags = download_additive_tags(args.taxonomy_url)
+    print(f"{len(tags)} additives in the taxonomy.")
+    os.makedirs(args.output_dir, exist_ok=True)
+    bedrock = boto3.client("bedrock-runtime", region_name=os.getenv('AWS_REGION'))
+    for language in args.languages:
+        build_language(bedrock, tags, language, args.output_dir, args.group_size)
@@ -0,0 +1,140 @@
+"""
+Measures the time each Python Lambda takes to import its index.py, the bulk of its INIT phase.
+
+Every run imports the handler in a fresh interpreter, from the directory of the Lambda with the
+common layer on the path, and with stand-in environment variables and credentials so nothing is
+read from AWS. The handlers whose median import time is over their budget make the script fail:
+
+    pip install -r requirements.txt
+    python3 profile-init.py
+    python3 profile-init.py barcode_ingredients --runs 10 --modules 15
+
+Budgets are in init-budget.json, in milliseconds. --budget-scale adapts them to a slower machine.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+LAMBDA_DIR = os.path.join(ROOT, 'lambda')
+LAYER_DIR = os.path.join(LAMBDA_DIR, 'layers', 'common', 'python')
+BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'init-budget.json')
+
+# Variables set by the Lambda runtime and by the stack, with stand-in values
+STAND_IN_ENVIRONMENT = {
+    'AWS_REGION': 'us-east-1',
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'stand-in',
+    'AWS_SECRET_ACCESS_KEY': 'stand-in',
+    'AWS_EC2_METADATA_DISABLED': 'true',
+    'POWERTOOLS_SERVICE_NAME': 'food-lens',
+    'POWERTOOLS_LOG_LEVEL': 'DEBUG',
+    'API_URL': 'https://world.openfoodfacts.org',
+    'PRODUCT_TABLE_NAME': 'ProductsTable',
+    'OPEN_FOOD_FACTS_TABLE_NAME': 'allProductsOpenFoodFactsTable',
+    'INGREDIENT_TABLE_NAME': 'IngredientsTable',
+    'NOT_FOUND_TABLE_NAME': 'NotFoundProductsTable',
+    'PRODUCT_SUMMARY_TABLE_NAME': 'ProductsSummaryTable',
+    'S3_BUCKET_NAME': 'images',
+    'COMPRESS_ATTRIBUTES': 'true',
+}
+
+# Run in the Lambda directory, prints the import time of index.py in milliseconds
+IMPORT_HANDLER = """
+import time
+started = time.perf_counter()
+import index
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def list_handlers():
+    return sorted(name for name in os.listdir(LAMBDA_DIR)
+                  if os.path.isfile(os.path.join(LAMBDA_DIR, name, 'index.py')))
+
+
+def parse_import_times(stderr):
+    """
+    Reads the output of python -X importtime.
+
+    Args:
+        stderr (str): The standard error of the interpreter.
+
+    Returns:
+        dict: The self and cumulative microseconds of each imported module.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def profile_handler(name, runs=5):
+    """
+    Imports the index.py of a Lambda in fresh interpreters.
+
+    Args:
+        name (str): The directory of the Lambda in lambda/.
+        runs (int): The number of interpreters started.
+
+    Returns:
+        dict: The import time of each run in milliseconds, their median, and the import times
+              of the modules in the last run.
+    """
+    environment = {key: value for key, value in os.environ.items() if not key.startswith('AWS_')}
+    environment.update(STAND_IN_ENVIRONMENT)
+    environment['AWS_LAMBDA_FUNCTION_NAME'] = name
+    environment['PYTHONPATH'] = LAYER_DIR
+    environment.pop('PYTHONDONTWRITEBYTECODE', None)
+
+    times = []
+    modules = {}
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', IMPORT_HANDLER],
+                                cwd=os.path.join(LAMBDA_DIR, name), env=environment,
+                                capture_output=True, text=True, timeout=120)
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {name} failed:\n{result.stderr[-2000:]}")
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+        modules = parse_import_times(result.stderr)
+    return {'times': times, 'median': statistics.median(times), 'modules': modules}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the INIT import time of the Python Lambdas.")
+    parser.add_argument("handlers", nargs="*", help="Lambda directories to profile, all the Python ones if omitted.")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters per Lambda.")
+    parser.add_argument("--modules", type=int, default=8, help="Number of slowest modules listed per Lambda.")
+    parser.add_argument("--budget-file", default=BUDGET_FILE, help="JSON file of the budget of each Lambda in ms.")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Factor applied to every budget.")
+    args = parser.parse_args()
+
+    with open(args.budget_file) as f:
+        budgets = json.load(f)
+
+    over_budget = []
+    for name in args.handlers or list_handlers():
+        results = profile_handler(name, args.runs)
+        budget = budgets.get(name)
+        status = ''
+        if budget is not None:
+            budget *= args.budget_scale
+            status = f" (budget {budget:.0f} ms{', OVER' if results['median'] > budget else ''})"
+            if results['median'] > budget:
+                over_budget.append(name)
+        print(f"{name}: {results['median']:.0f} ms median of {args.runs} runs, "
+              f"{min(results['times']):.0f} to {max(results['times']):.0f} ms{status}")
+
+        slowest = sorted(results['modules'].items(), key=lambda item: item[1][0], reverse=True)[:args.modules]
+        for module, (self_us, cumulative_us) in slowest:
+            print(f"    {self_us / 1000:7.1f} ms self {cumulative_us / 1000:7.1f} ms cumulative  {module}")
+
+    if over_budget:
+        print(f"Over the INIT budget: {', '.join(over_budget)}")
+        sys.exit(1)
@@ -0,0 +1,183 @@
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import boto3
+from boto3.dynamodb.types import TypeSerializer
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 25
+
+RETRYABLE_ERRORS = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+    'InternalServerError',
+    'ServiceUnavailable',
+}
+
+
+class RateLimiter:
+    """Token bucket shared by the writer threads to cap the number of items written per second."""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.capacity = max(self.rate, MAX_BATCH_SIZE)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class BatchWriter:
+    """
+    Writes batches of DynamoDB put requests from a bounded pool of worker threads.
+
+    Batches are queued by the caller and written concurrently. Unprocessed items and
+    throttled requests are re-submitted with exponential backoff until max_retries is reached.
+
+    Args:
+        table_name (str): The name of the DynamoDB table.
+        workers (int): The number of concurrent writer threads.
+        write_rate (float): The target number of items written per second, unlimited if None.
+        max_retries (int): The number of attempts for a batch before its items are counted as failed.
+        base_delay (float): The initial backoff delay in seconds.
+        max_delay (float): The maximum backoff delay in seconds.
+        client: An optional DynamoDB client, created from the environment if not provided.
+    """
+
+    def __init__(self, table_name, workers=32, write_rate=None, max_retries=10,
+                 base_delay=0.05, max_delay=10.0, client=None):
+        self.table_name = table_name
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.client = client or boto3.client(
+            'dynamodb',
+            region_name=os.getenv('AWS_REGION'),
+            config=Config(max_pool_connections=workers, retries={'max_attempts': 2, 'mode': 'standard'}),
+        )
+        self.rate_limiter = RateLimiter(write_rate) if write_rate else None
+        self.serializer = TypeSerializer()
+
+        self.stats_lock = threading.Lock()
+        self.written = 0
+        self.failed = 0
+        self.retries = 0
+        self.throttles = 0
+
+        self.batches = queue.Queue(maxsize=workers * 2)
+        self.threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, items, on_done=None):
+        """
+        Queues a batch of put requests, blocking while all the workers are busy.
+
+        Args:
+            items (list): Up to 25 put requests in the format accepted by the boto3 resource.
+            on_done (callable): Called from the worker thread with the number of failed items
+                once the batch has been written or has failed.
+        """
+        if not items:
+            return
+        if len(items) > MAX_BATCH_SIZE:
+            raise ValueError(f"A batch holds at most {MAX_BATCH_SIZE} items, got {len(items)}")
+        self.batches.put((items, on_done))
+
+    def flush(self):
+        """Waits until every queued batch has been written or has failed."""
+        self.batches.join()
+
+    def close(self):
+        """Flushes the queued batches and stops the worker threads."""
+        self.flush()
+        for _ in self.threads:
+            self.batches.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def _serialize(self, items):
+        return [
+            {'PutRequest': {'Item': {k: self.serializer.serialize(v) for k, v in item['PutRequest']['Item'].items()}}}
+            for item in items
+        ]
+
+    def _backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        time.sleep(random.uniform(0, delay))
+
+    def _run(self):
+        while True:
+            batch = self.batches.get()
+            try:
+                if batch is None:
+                    return
+                items, on_done = batch
+                try:
+                    failed = self._write(self._serialize(items))
+                except Exception as e:
+                    logger.error("Failed to write a batch of %d items: %s", len(items), e)
+                    failed = len(items)
+                if failed:
+                    with self.stats_lock:
+                        self.failed += failed
+                if on_done:
+                    on_done(failed)
+            finally:
+                self.batches.task_done()
+
+    def _write(self, requests):
+        """Writes a batch until every item is processed, returns the number of items given up on."""
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(len(requests))
+            try:
+                response = self.client.batch_write_item(RequestItems={self.table_name: requests})
+            except ClientError as e:
+                if e.response['Error']['Code'] not in RETRYABLE_ERRORS:
+                    raise
+                with self.stats_lock:
+                    self.throttles += 1
+                unprocessed = requests
+            else:
+                unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                with self.stats_lock:
+                    self.written += len(requests) - len(unprocessed)
+
+            if not unprocessed:
+                return 0
+            if attempt >= self.max_retries:
+                logger.error("Giving up on %d items after %d retries", len(unprocessed), attempt)
+                return len(unprocessed)
+
+            attempt += 1
+            with self.stats_lock:
+                self.retries += 1
+            self._backoff(attempt)
+            requests = unprocessed
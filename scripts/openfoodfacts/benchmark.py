@@ -0,0 +1,544 @@
+"""
+Measures the throughput of the Open Food Facts loader without deploying the stack.
+
+    # Compare the projection of the loader, decoded with orjson, with json.loads on a sample of the real dump
+    curl -s https://static.openfoodfacts.org/data/openfoodfacts-products.jsonl.gz | gunzip | head -n 100000 > sample.jsonl
+    python3 benchmark.py parse --sample sample.jsonl
+
+    # Write a synthetic dump
+    python3 benchmark.py generate synthetic.jsonl --count 100000 --shape large
+
+    # Load synthetic products into an in-process moto table, or into DynamoDB Local
+    python3 benchmark.py load --count 100000 --shape typical
+    python3 benchmark.py load --count 100000 --endpoint-url http://localhost:8000
+
+    # Download a file from a local HTTP server that drops some connections
+    python3 benchmark.py download --size-mb 512 --connections 8 --drop-rate 0.2
+
+    # Compare the DynamoDB size of the items with and without compressed attributes
+    python3 benchmark.py item-size --sample sample.jsonl
+
+    # Measure the ingredient segmenter on the ingredients_text of the dump
+    gunzip -c openfoodfacts-products.jsonl.gz > products.jsonl
+    python3 benchmark.py segment --sample products.jsonl --repeat 1
+
+The load benchmark needs the packages of requirements-benchmark.txt, and every command the
+modules shared with the Lambdas: PYTHONPATH=../../lambda/layers/common/python
+"""
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batch_writer import BatchWriter
+from ingredients_text import ingredient_tokens, parse_ingredients, split_contains
+from item_codec import OPEN_FOOD_FACTS_ATTRIBUTES, encode_attributes
+from projection import NUTRIMENT_FIELDS, project_product, project_product_json
+from ranged_download import download_file
+
+WORDS = (
+    'sugar', 'salt', 'palm oil', 'wheat flour', 'whole milk powder', 'cocoa butter', 'soy lecithin',
+    'hazelnuts', 'emulsifier', 'water', 'yeast', 'rapeseed oil', 'glucose syrup', 'skimmed milk',
+    'farine de blé', 'sucre', 'huile de tournesol', 'lait écrémé', 'sel', 'arôme naturel',
+)
+ADDITIVES = ('en:e322', 'en:e330', 'en:e471', 'en:e300', 'en:e415', 'en:e202', 'en:e150d', 'en:e500')
+
+# Size of the nested blobs of a synthetic product for each shape
+SHAPES = {
+    # Only the fields kept in the table
+    'minimal': {'ingredients': 0, 'images': 0, 'nutriments': 0, 'tags': 0},
+    # Close to an average product of the dump
+    'typical': {'ingredients': 15, 'images': 8, 'nutriments': 20, 'tags': 10},
+    # Multi-component products with many pictures and taxonomy entries
+    'large': {'ingredients': 80, 'images': 40, 'nutriments': 60, 'tags': 60},
+}
+
+
+def generate_product(rng, index, shape, code=None):
+    """
+    Builds a synthetic product with the structure of the Open Food Facts dump.
+
+    Args:
+        rng (random.Random): The random generator.
+        index (int): The index of the product, used for its code and name.
+        shape (dict): The size of the nested blobs, one of SHAPES.
+        code (str): The product code, derived from the index if None.
+
+    Returns:
+        dict: The product.
+    """
+    ingredients = [rng.choice(WORDS) for _ in range(max(shape['ingredients'], 3))]
+    product = {
+        '_id': code or str(3000000000000 + index),
+        'code': code or str(3000000000000 + index),
+        'product_name': f'Product {index}',
+        'ingredients_text': ', '.join(ingredients) + ' (contains [milk], may contain nuts)',
+        'additives_tags': rng.sample(ADDITIVES, rng.randint(0, 4)),
+        'allergens_tags': ['en:milk', 'en:gluten'][:rng.randint(0, 2)],
+        'nutriments': {field: round(rng.uniform(0, 60), 2) for field in NUTRIMENT_FIELDS},
+        'labels_tags': ['en:organic', 'en:vegetarian'][:rng.randint(0, 2)],
+        'categories': 'Snacks, Sweet snacks, Biscuits',
+        'nova_group': rng.randint(1, 4),
+        'nutriscore_grade': rng.choice('abcde'),
+        'ecoscore_grade': rng.choice('abcde'),
+        'brands': f'Brand {index % 97}',
+        'image_small_url': f'https://images.openfoodfacts.org/images/products/{index}/front_en.200.jpg',
+        'image_thumb_url': f'https://images.openfoodfacts.org/images/products/{index}/front_en.100.jpg',
+    }
+    for i in range(shape['nutriments']):
+        product['nutriments'][f'nutrient-{i}_100g'] = round(rng.uniform(0, 10), 3)
+        product['nutriments'][f'nutrient-{i}_unit'] = 'g'
+    if shape['ingredients']:
+        product['ingredients'] = [
+            {'id': 'en:' + name.replace(' ', '-'), 'text': name, 'percent_estimate': rng.uniform(0, 50),
+             'vegan': 'maybe', 'vegetarian': 'yes', 'rank': rank + 1}
+            for rank, name in enumerate(ingredients)
+        ]
+    if shape['images']:
+        product['images'] = {
+            str(i): {'sizes': {size: {'h': int(size), 'w': int(size) * 3 // 4} for size in ('100', '400')},
+                     'uploaded_t': 1600000000 + i, 'uploader': 'openfoodfacts-contributors'}
+            for i in range(shape['images'])
+        }
+    if shape['tags']:
+        product['categories_tags'] = ['en:' + rng.choice(WORDS).replace(' ', '-') for _ in range(shape['tags'])]
+        product['states_tags'] = ['en:to-be-completed', 'en:nutrition-facts-completed'] * (shape['tags'] // 2)
+        product['ecoscore_data'] = {
+            'adjustments': {'packaging': {'packagings': [{'material': 'en:plastic', 'shape': 'en:bag'}]}},
+            'grade': product['ecoscore_grade'],
+            'score': rng.randint(0, 100),
+        }
+    return product
+
+
+def generate_products(count, shape='typical', duplicate_ratio=0.01, seed=0):
+    """
+    Generates synthetic dump lines.
+
+    Args:
+        count (int): The number of lines.
+        shape (str): The record shape, one of SHAPES.
+        duplicate_ratio (float): The share of lines repeating the code of an earlier product.
+        seed (int): The seed of the random generator.
+
+    Yields:
+        bytes: One JSON product per line, including the trailing newline.
+    """
+    rng = random.Random(seed)
+    sizes = SHAPES[shape]
+    for index in range(count):
+        code = None
+        if index and rng.random() < duplicate_ratio:
+            code = str(3000000000000 + rng.randrange(index))
+        product = generate_product(rng, index, sizes, code)
+        yield (json.dumps(product, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def benchmark_parsing(lines, repeat=3):
+    """
+    Compares project_product, which decodes with orjson when it is installed, with json.loads.
+
+    Args:
+        lines (list): JSON product lines.
+        repeat (int): The number of runs of each parser, the fastest one is kept.
+
+    Returns:
+        dict: The products/second of each parser and the number of lines where they disagree.
+    """
+    results = {}
+    for name, parse in (('json', project_product_json), ('projection', project_product)):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            for line in lines:
+                parse(line)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = len(lines) / best
+
+    results['mismatches'] = sum(1 for line in lines if project_product(line) != project_product_json(line))
+    return results
+
+
+def import_loader():
+    # The loader script name is not a valid module name
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db-loader-jsonl.py')
+    spec = importlib.util.spec_from_file_location('db_loader_jsonl', path)
+    loader = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(loader)
+    return loader
+
+
+@contextlib.contextmanager
+def dynamodb_stand_in(endpoint_url):
+    """
+    Provides a DynamoDB client for DynamoDB Local at endpoint_url, or for an in-process moto
+    backend when no endpoint is given.
+    """
+    import boto3
+
+    os.environ.setdefault('AWS_REGION', 'us-east-1')
+    os.environ.setdefault('AWS_DEFAULT_REGION', os.environ['AWS_REGION'])
+    if endpoint_url:
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+        yield lambda **kwargs: boto3.client('dynamodb', endpoint_url=endpoint_url, **kwargs)
+        return
+
+    try:
+        from moto import mock_aws
+    except ImportError:
+        sys.exit("moto is required without --endpoint-url: pip install -r requirements-benchmark.txt")
+    os.environ['AWS_ACCESS_KEY_ID'] = 'testing'
+    os.environ['AWS_SECRET_ACCESS_KEY'] = 'testing'
+    with mock_aws():
+        yield lambda **kwargs: boto3.client('dynamodb', **kwargs)
+
+
+def benchmark_loader(products, endpoint_url=None, workers=32, write_rate=None):
+    """
+    Finds the duplicated products, then loads the products into a fresh table of a local DynamoDB
+    stand-in through fill_table.
+
+    Args:
+        products (list): JSON product lines.
+        endpoint_url (str): The DynamoDB Local endpoint, an in-process moto backend is used if None.
+        workers (int): The number of concurrent batch writers.
+        write_rate (float): The target number of items written per second, unlimited if None.
+
+    Returns:
+        dict: Records/s, bytes/s, peak RSS and the writer counters.
+    """
+    from botocore.config import Config
+
+    loader = import_loader()
+    table_name = f'benchmark-{uuid.uuid4().hex[:8]}'
+    read_bytes = 0
+
+    def counted(lines):
+        nonlocal read_bytes
+        for line in lines:
+            read_bytes += len(line)
+            yield line
+
+    with dynamodb_stand_in(endpoint_url) as make_client:
+        client = make_client(config=Config(max_pool_connections=workers))
+        client.create_table(
+            TableName=table_name,
+            KeySchema=[{'AttributeName': 'product_code', 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': 'product_code', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST',
+        )
+        try:
+            writer = BatchWriter(table_name, workers=workers, write_rate=write_rate, client=client)
+            started = time.perf_counter()
+            last_offsets = loader.find_duplicates(products)
+            written, skipped, unchanged, failed = loader.fill_table(table_name, counted(products), writer=writer,
+                                                                    last_offsets=last_offsets)
+            elapsed = time.perf_counter() - started
+        finally:
+            client.delete_table(TableName=table_name)
+
+    return {
+        'written': written,
+        'skipped': skipped,
+        'failed': failed,
+        'retries': writer.retries,
+        'throttles': writer.throttles,
+        'seconds': elapsed,
+        'records_per_second': written / elapsed,
+        'bytes_per_second': read_bytes / elapsed,
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024),
+    }
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the file of the server with Range support, closing some responses halfway
+    like a dropped connection.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.server.content)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', self.server.etag)
+        self.end_headers()
+
+    def do_GET(self):
+        content = self.server.content
+        start, end = 0, len(content) - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        if_range = self.headers.get('If-Range')
+        if range_header and (if_range is None or if_range == self.server.etag):
+            first, last = range_header.removeprefix('bytes=').split('-')
+            start, end = int(first), min(int(last or end), end)
+            status = 206
+        self.send_response(status)
+        self.send_header('Content-Length', str(end + 1 - start))
+        self.send_header('ETag', self.server.etag)
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(content)}')
+        self.end_headers()
+        if self.server.rng.random() < self.server.drop_rate:
+            end = start + (end - start) // 2
+        self.wfile.write(content[start:end + 1])
+        self.close_connection = True
+
+
+@contextlib.contextmanager
+def local_file_server(content, drop_rate=0.0):
+    """Serves content at the yielded URL until the context exits."""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), RangeRequestHandler)
+    server.content = content
+    server.etag = '"' + hashlib.md5(content).hexdigest() + '"'
+    server.drop_rate = drop_rate
+    server.rng = random.Random(0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}/openfoodfacts-products.jsonl.gz'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def benchmark_download(size, connections=8, chunk_size=8 * 1024 * 1024, drop_rate=0.0):
+    """
+    Downloads random content from a local HTTP server and checks the copy.
+
+    Args:
+        size (int): The number of bytes of the file.
+        connections (int): The number of concurrent Range requests.
+        chunk_size (int): The number of bytes of each Range request.
+        drop_rate (float): The share of responses closed halfway by the server.
+
+    Returns:
+        dict: The download throughput and whether the copy is identical.
+    """
+    content = random.Random(0).randbytes(size)
+    with local_file_server(content, drop_rate) as url, tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'download.gz')
+        started = time.perf_counter()
+        download_file(url, filename, connections=connections, chunk_size=chunk_size, max_retries=20)
+        elapsed = time.perf_counter() - started
+        with open(filename, 'rb') as f:
+            identical = f.read() == content
+
+    return {'seconds': elapsed, 'bytes_per_second': size / elapsed, 'identical': identical}
+
+
+def dynamodb_size(value):
+    """
+    Computes the size DynamoDB accounts for an attribute value, following the item size rules.
+
+    Args:
+        value: A value as written with boto3.
+
+    Returns:
+        int: The size in bytes.
+    """
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if value is None or isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        digits = len(str(value).lstrip('-').replace('.', '').strip('0')) or 1
+        return (digits + 1) // 2 + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(key.encode('utf-8')) + dynamodb_size(item) + 1 for key, item in value.items())
+    return 3 + sum(dynamodb_size(item) + 1 for item in value)
+
+
+def benchmark_item_size(lines):
+    """
+    Compares the size of the Open Food Facts table items with and without compressed attributes.
+
+    Args:
+        lines: An iterable of JSON product lines.
+
+    Returns:
+        dict: The number of items, their average size and the share of items over 1 KB and 4 KB in each encoding.
+    """
+    plain = []
+    compressed = []
+    for line in lines:
+        product_code, product = project_product(line)
+        if not product_code:
+            continue
+        plain.append(dynamodb_size({'product_code': product_code, 'product': product}))
+        compressed.append(dynamodb_size({
+            'product_code': product_code,
+            'product': encode_attributes(product, OPEN_FOOD_FACTS_ATTRIBUTES),
+        }))
+
+    def summary(sizes):
+        return {
+            'average': sum(sizes) / len(sizes),
+            # Each started KB of a write and each started 4 KB of a strongly consistent read costs one unit
+            'write_units': sum(-(-size // 1024) for size in sizes) / len(sizes),
+            'read_units': sum(-(-size // 4096) for size in sizes) / len(sizes),
+        }
+
+    return {'items': len(plain), 'plain': summary(plain), 'compressed': summary(compressed)}
+
+
+def benchmark_segmenting(texts, repeat=3):
+    """
+    Measures the ingredient segmenter on ingredients texts.
+
+    Args:
+        texts (list): The ingredients_text of the products.
+        repeat (int): The number of runs, the fastest one is kept.
+
+    Returns:
+        dict: The texts and MB per second, the average number of ingredients and tokens per text,
+              the number of distinct tokens and the share of texts with an allergen statement.
+    """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for text in texts:
+            parse_ingredients(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    size = sum(len(text.encode('utf-8')) for text in texts)
+    tokens = [ingredient_tokens(text) for text in texts]
+    return {
+        'texts_per_second': len(texts) / best,
+        'bytes_per_second': size / best,
+        'ingredients_per_text': sum(len(parse_ingredients(text)) for text in texts) / len(texts),
+        'tokens_per_text': sum(len(text_tokens) for text_tokens in tokens) / len(texts),
+        'distinct_tokens': len({token for text_tokens in tokens for token in text_tokens}),
+        'with_contains': sum(1 for text in texts if split_contains(text)[1]) / len(texts),
+    }
+
+
+def read_sample(path):
+    with open(path, 'rb') as f:
+        return f.readlines()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Open Food Facts loader.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_source_arguments(command):
+        command.add_argument("--sample", help="JSONL sample of the dump, synthetic products are generated if omitted.")
+        command.add_argument("--count", type=int, default=20000, help="Number of synthetic products.")
+        command.add_argument("--shape", choices=sorted(SHAPES), default="typical", help="Shape of the synthetic products.")
+        command.add_argument("--duplicates", type=float, default=0.01, help="Share of duplicated synthetic products.")
+
+    parse_command = commands.add_parser("parse", help="Compare the projection, decoded with orjson, with json.loads.")
+    add_source_arguments(parse_command)
+    parse_command.add_argument("--repeat", type=int, default=3, help="Number of runs of each parser.")
+
+    generate_command = commands.add_parser("generate", help="Write a synthetic dump.")
+    generate_command.add_argument("output", help="Path of the JSONL file to write.")
+    generate_command.add_argument("--count", type=int, default=100000, help="Number of products.")
+    generate_command.add_argument("--shape", choices=sorted(SHAPES), default="typical", help="Shape of the products.")
+    generate_command.add_argument("--duplicates", type=float, default=0.01, help="Share of duplicated products.")
+
+    load_command = commands.add_parser("load", help="Run fill_table against a local DynamoDB stand-in.")
+    add_source_arguments(load_command)
+    load_command.add_argument("--endpoint-url", help="DynamoDB Local endpoint, moto is used if omitted.")
+    load_command.add_argument("--writers", type=int, default=32, help="Number of concurrent batch writers.")
+    load_command.add_argument("--write-rate", type=float, default=None, help="Target number of items written per second.")
+
+    download_command = commands.add_parser("download", help="Download a file from a local HTTP server.")
+    download_command.add_argument("--size-mb", type=int, default=256, help="Size of the file in MB.")
+    download_command.add_argument("--connections", type=int, default=8, help="Number of concurrent Range requests.")
+    download_command.add_argument("--chunk-mb", type=int, default=8, help="Size of each Range request in MB.")
+    download_command.add_argument("--drop-rate", type=float, default=0.0,
+                                  help="Share of responses closed halfway by the server.")
+
+    item_size_command = commands.add_parser("item-size", help="Compare item sizes with compressed attributes.")
+    add_source_arguments(item_size_command)
+
+    segment_command = commands.add_parser("segment", help="Measure the ingredient segmenter.")
+    add_source_arguments(segment_command)
+    segment_command.add_argument("--repeat", type=int, default=3, help="Number of runs of the segmenter.")
+
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        with open(args.output, 'wb') as f:
+            f.writelines(generate_products(args.count, args.shape, args.duplicates))
+        print(f"Wrote {args.count} {args.shape} products to {args.output}.")
+
+    elif args.command == "parse":
+        if args.sample:
+            lines = read_sample(args.sample)
+        else:
+            lines = list(generate_products(args.count, args.shape, args.duplicates))
+        size = sum(len(line) for line in lines)
+        print(f"{len(lines)} products, {size / len(lines) / 1024:.1f} KB on average.")
+
+        results = benchmark_parsing(lines, args.repeat)
+        print(f"json.loads: {results['json']:.0f} products/s")
+        print(f"projection: {results['projection']:.0f} products/s ({results['projection'] / results['json']:.1f}x)")
+        print(f"Mismatching lines: {results['mismatches']}")
+
+    elif args.command == "load":
+        if args.sample:
+            products = read_sample(args.sample)
+        else:
+            products = list(generate_products(args.count, args.shape, args.duplicates))
+        results = benchmark_loader(products, args.endpoint_url, args.writers, args.write_rate)
+        print(f"Wrote {results['written']} products in {results['seconds']:.1f}s "
+              f"({results['skipped']} skipped, {results['failed']} failed).")
+        print(f"{results['records_per_second']:.0f} records/s, {results['bytes_per_second'] / 1e6:.1f} MB/s")
+        print(f"Peak RSS: {results['peak_rss_mb']:.0f} MB")
+        print(f"Retries: {results['retries']}, throttled requests: {results['throttles']}")
+
+    elif args.command == "download":
+        results = benchmark_download(args.size_mb * 1024 * 1024, args.connections, args.chunk_mb * 1024 * 1024,
+                                     args.drop_rate)
+        print(f"Downloaded {args.size_mb} MB in {results['seconds']:.1f}s "
+              f"({results['bytes_per_second'] / 1e6:.1f} MB/s), identical copy: {results['identical']}")
+
+    elif args.command == "item-size":
+        if args.sample:
+            lines = read_sample(args.sample)
+        else:
+            lines = generate_products(args.count, args.shape, args.duplicates)
+        results = benchmark_item_size(lines)
+        plain, compressed = results['plain'], results['compressed']
+        print(f"{results['items']} items")
+        print(f"Average size: {plain['average']:.0f} bytes plain, {compressed['average']:.0f} bytes compressed "
+              f"({1 - compressed['average'] / plain['average']:.0%} smaller)")
+        print(f"Write units per item: {plain['write_units']:.2f} plain, {compressed['write_units']:.2f} compressed")
+        print(f"Read units per item: {plain['read_units']:.2f} plain, {compressed['read_units']:.2f} compressed")
+
+    elif args.command == "segment":
+        if args.sample:
+            lines = open(args.sample, 'rb')
+        else:
+            lines = generate_products(args.count, args.shape, args.duplicates)
+        texts = [product['ingredients_text'] for _, product in map(project_product, lines)
+                 if product and product.get('ingredients_text')]
+        results = benchmark_segmenting(texts, args.repeat)
+        print(f"{len(texts)} ingredients texts")
+        print(f"{results['texts_per_second']:.0f} texts/s, {results['bytes_per_second'] / 1e6:.1f} MB/s")
+        print(f"{results['ingredients_per_text']:.1f} ingredients and {results['tokens_per_text']:.1f} "
+              f"distinct tokens per text, {results['distinct_tokens']} distinct tokens in total")
+        print(f"Texts with an allergen statement: {results['with_contains']:.0%}")
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import sqlite3
+from decimal import Decimal
+
+from projection import project_values
+
+
+class Checkpoint:
+    """
+    Tracks the position in the dump up to which every batch has been written, so an
+    interrupted load can resume from there instead of starting over.
+
+    Batches complete out of order in the concurrent writer, so the saved offset only
+    moves past a batch once all the batches submitted before it have completed.
+    The projected fields of the duplicated products deferred to the end of the load are saved along with it.
+
+    Args:
+        path (str): The path of the JSON checkpoint file.
+        version (str): The version of the dump, a checkpoint saved for another version is ignored.
+    """
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.offset = 0
+        self.batch_seq = 0
+        self.deferred = {}
+        self._submitted_seq = 0
+        self._pending = {}
+        self._completed = set()
+
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            if data.get('version') == version:
+                self.offset = data['offset']
+                self.batch_seq = data['batch_seq']
+                # Projecting the saved fields again turns their numbers back into the same Decimal values
+                self.deferred = {code: project_values({**fields, 'code': code})[1]
+                                 for code, fields in data.get('deferred', {}).items()}
+                self._submitted_seq = self.batch_seq
+
+    def start_batch(self, end_offset):
+        """
+        Registers a batch submitted to the writer.
+
+        Args:
+            end_offset (int): The offset in the dump right after the last product of the batch.
+
+        Returns:
+            int: The sequence number of the batch.
+        """
+        self._submitted_seq += 1
+        self._pending[self._submitted_seq] = end_offset
+        return self._submitted_seq
+
+    def complete_batch(self, batch_seq):
+        """Marks a batch as written and moves the checkpoint past every contiguous completed batch."""
+        self._completed.add(batch_seq)
+        while self.batch_seq + 1 in self._completed:
+            self.batch_seq += 1
+            self._completed.remove(self.batch_seq)
+            self.offset = self._pending.pop(self.batch_seq)
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': self.version,
+                'offset': self.offset,
+                'batch_seq': self.batch_seq,
+                'deferred': self.deferred,
+            }, f, default=_decimal_number)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DigestStore:
+    """
+    Content digests of the products written to the table, kept in a SQLite file
+    between runs so a reload only writes new or changed products.
+
+    Args:
+        path (str): The path of the SQLite file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # A process crash keeps the file consistent, only an OS crash could lose the last commit
+        self.connection.execute("PRAGMA synchronous = OFF")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS digests (code TEXT PRIMARY KEY, digest BLOB NOT NULL) WITHOUT ROWID"
+        )
+
+    def get(self, code):
+        row = self.connection.execute("SELECT digest FROM digests WHERE code = ?", (code,)).fetchone()
+        return row[0] if row else None
+
+    def update(self, digests):
+        """
+        Records the digests of written products.
+
+        Args:
+            digests (list): (product_code, digest) tuples.
+        """
+        self.connection.executemany("INSERT OR REPLACE INTO digests (code, digest) VALUES (?, ?)", digests)
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+
+def _decimal_number(value):
+    # Writes the Decimal values of the projected fields as the JSON number they were projected from
+    if isinstance(value, Decimal):
+        return float(value) if value.as_tuple().exponent else int(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def product_digest(item):
+    """
+    Computes a digest of the content of a table item.
+
+    Args:
+        item (dict): The item as written to the table.
+
+    Returns:
+        bytes: A 16 bytes digest, stable across runs.
+    """
+    content = json.dumps(item, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
@@ -1,13 +1,23 @@
+import argparse
 import boto3
-import json
 import logging
 import os
+import queue
 import requests
 import gzip
+import threading
+import time
+import zlib
+from botocore.exceptions import ClientError
 from tqdm import tqdm
+from batch_writer import BatchWriter, MAX_BATCH_SIZE
+from checkpoint import Checkpoint, DigestStore, product_digest
+from projection import project_product
+from code_index import ProductCodeIndex
+from barcode_index import BarcodeIndexWriter
+from ranged_download import download_file
+from item_codec import OPEN_FOOD_FACTS_ATTRIBUTES, encode_attributes
 import shutil
-import json
-import sys
 
 logger = logging.getLogger(__name__)
 
@@ -28,19 +38,6 @@ def describe_stack_output(stack_name, output_key):
     except Exception as e:
         print("An error occurred:", e)
 
-def download_file(url, filename):
-    # Stream=True ensures that the file is not downloaded all at once into memory
-    response = requests.get(url, stream=True)
-    total_size = int(response.headers.get('content-length', 0))
-    block_size = 1024*1000  # 1 Mb
-    progress_bar = tqdm(total=total_size, unit='B', unit_scale=True)
-
-    with open(filename, 'wb') as f:
-        for data in response.iter_content(block_size):
-            progress_bar.update(len(data))
-            f.write(data)
-    progress_bar.close()
-
 def unzip_file(gz_file):
     with gzip.open(gz_file, 'rb') as f_in:
         with open(gz_file[:-3], 'wb') as f_out:
@@ -49,75 +46,451 @@ def unzip_file(gz_file):
 def delete_file(file_path):
     os.remove(file_path)
 
+def _download_chunks(response, chunks, block_size):
+    # Runs in a background thread so the network keeps receiving while the
+    # main thread decompresses and loads the previous chunks
+    try:
+        for data in response.iter_content(block_size):
+            chunks.put(data)
+    except Exception as e:
+        chunks.put(e)
+    finally:
+        chunks.put(None)
+
+def stream_products(url, block_size=1024*1000, prefetch=16):
+    """
+    Downloads the gzipped JSONL dump and yields its lines as they are decompressed,
+    without writing the archive or the decompressed file to disk.
+
+    Args:
+        url (str): The URL of the .jsonl.gz dump.
+        block_size (int): The size of the compressed chunks read from the network.
+        prefetch (int): The number of compressed chunks buffered ahead of the decompression.
+
+    Yields:
+        bytes: One JSON product per line, including the trailing newline.
+    """
+    response = requests.get(url, stream=True)
+    response.raise_for_status()
+    total_size = int(response.headers.get('content-length', 0))
+    progress_bar = tqdm(total=total_size, unit='B', unit_scale=True, desc="Downloading")
+
+    chunks = queue.Queue(maxsize=prefetch)
+    downloader = threading.Thread(target=_download_chunks, args=(response, chunks, block_size), daemon=True)
+    downloader.start()
+
+    # 16 + MAX_WBITS expects a gzip header; the dump may hold several gzip members
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    pending = b''
+    try:
+        while True:
+            data = chunks.get()
+            if data is None:
+                break
+            if isinstance(data, Exception):
+                raise data
+            progress_bar.update(len(data))
+            while data:
+                pending += decompressor.decompress(data)
+                if decompressor.eof:
+                    data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                else:
+                    data = b''
+            lines = pending.split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                # Keep the newline so offsets match the decompressed file
+                yield line + b'\n'
+        pending += decompressor.flush()
+        if pending.strip():
+            yield pending
+    finally:
+        progress_bar.close()
+        response.close()
+
         
-def fill_table(table_name, file):
-    index = 0
+class Progress:
+    """Prints aggregate load statistics at a fixed interval instead of once per product."""
+
+    def __init__(self, writer, interval=30, check_every=1000):
+        self.writer = writer
+        self.interval = interval
+        self.check_every = check_every
+        self.products = 0
+        self.bytes = 0
+        self.started = self.last_report = time.monotonic()
+
+    def update(self, size):
+        self.products += 1
+        self.bytes += size
+        if self.products % self.check_every == 0 and time.monotonic() - self.last_report >= self.interval:
+            self.report()
+
+    def report(self):
+        now = time.monotonic()
+        elapsed = max(now - self.started, 1e-9)
+        print(f"{self.products} products read ({self.products / elapsed:.0f} products/s, "
+              f"{self.bytes / elapsed / 1e6:.1f} MB/s), {self.writer.written} written, "
+              f"{self.writer.failed} failed, {self.writer.retries} retries.")
+        self.last_report = now
+
+def make_item(product_code, product_fields, compress=False):
+    if compress:
+        product_fields = encode_attributes(product_fields, OPEN_FOOD_FACTS_ATTRIBUTES)
+    return {
+        'product': product_fields,
+        'product_code': product_code,
+    }
+
+def read_product(product, offset):
+    """
+    Projects a line of the dump, leaving out the lines that are not valid JSON.
+
+    Args:
+        product (bytes): A JSON product line.
+        offset (int): The offset in the dump right after the line, reported for an invalid line.
+
+    Returns:
+        tuple: The product code and the projected fields, or None and None if the line is invalid.
+    """
+    try:
+        return project_product(product)
+    except ValueError as e:
+        print(f"Skipped the invalid product ending at byte {offset}: {e}")
+        return None, None
+
+def submit_batch(writer, items, digests, offset, checkpoint, completed):
+    # The writer drops an empty batch without calling on_done, its sequence would never complete
+    if not items:
+        return
+    batch_seq = checkpoint.start_batch(offset) if checkpoint else None
+    writer.submit(items, on_done=lambda failed: completed.put((batch_seq, failed, digests)))
+
+def process_completed_batches(completed, checkpoint, digest_store):
+    while True:
+        try:
+            batch_seq, failed, digests = completed.get_nowait()
+        except queue.Empty:
+            return
+        # Products of a batch with failed writes keep their previous digest, the next load writes them again
+        if digest_store and not failed:
+            digest_store.update(digests)
+        if checkpoint:
+            checkpoint.complete_batch(batch_seq)
+
+def fill_table(table_name, file, workers=32, write_rate=None, checkpoint=None, digest_store=None,
+               skip_unchanged=True, checkpoint_interval=300, on_checkpoint=None, barcode_index=None,
+               writer=None, compress=False, last_offsets=None):
+    """
+    Loads the products into the table through a pool of concurrent batch writers.
+
+    Args:
+        table_name (str): The name of the Open Food Facts table.
+        file: An iterable of JSON product lines, including their trailing newline.
+        workers (int): The number of concurrent batch writers.
+        write_rate (float): The target number of items written per second, unlimited if None.
+        checkpoint (Checkpoint): Resumes after its offset and records the progress of the load.
+        digest_store (DigestStore): Records the digest of every written product.
+        skip_unchanged (bool): Skips the products whose digest matches the one in the digest store.
+        checkpoint_interval (int): The number of seconds between two checkpoint saves.
+        on_checkpoint (callable): Called after each checkpoint save.
+        barcode_index (BarcodeIndexWriter): Also receives every product of the dump.
+        writer (BatchWriter): The writer to use instead of one created from workers and write_rate.
+        compress (bool): Stores the large product attributes as compressed binary values.
+        last_offsets (dict): The duplicated product codes found by find_duplicates in the same file.
+
+    Returns:
+        tuple: The number of products written, skipped, unchanged and failed.
+
+    A product code found several times in the dump is kept with its last version. With last_offsets,
+    only the last version is written. Without them, as when streaming the dump, a version already
+    submitted in an earlier batch cannot be taken back, so the last version is written again at the end.
+    """
     skipped_index = 0
-    dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
-    table = dynamodb.Table(table_name)
+    unchanged_index = 0
+    duplicate_index = 0
     items = []
-    batch_size = 0
-    product_code_batch = []
-    for product in tqdm(file, desc="Loading data", unit=" products", unit_scale=1):
-        product_json = json.loads(product)
-        product_code = product_json.get('code', None)
-        if product_code:
-            if product_code in product_code_batch:
-                print('same product code found in this batch {}'.format(product_code))
+    batch_digests = []
+    batch_positions = {}
+    offset = 0
+    start_offset = checkpoint.offset if checkpoint else 0
+    completed = queue.SimpleQueue()
+    last_save = time.monotonic()
+
+    # Products seen more than once: the last version in the dump is the one kept in the table
+    seen_codes = ProductCodeIndex()
+    deferred = checkpoint.deferred if checkpoint else {}
+    if last_offsets is not None:
+        # Only keep the deferred products whose last version is not read again by this load
+        deferred = {code: fields for code, fields in deferred.items() if last_offsets.get(code, 0) <= start_offset}
+    for product_code in deferred:
+        seen_codes.add(product_code)
+
+    if start_offset:
+        print(f"Resuming the load after byte {start_offset}.")
+
+    writer = writer or BatchWriter(table_name, workers=workers, write_rate=write_rate)
+    with writer:
+        progress = Progress(writer)
+        for product in file:
+            offset += len(product)
+            if offset <= start_offset:
                 continue
-            product_code_batch.append(product_code)
-            items.append({
-                'PutRequest':{
-                    'Item': {
-                        'product': {
-                            'product_name':product_json.get('product_name', ''),
-                            'additives_tags':product_json.get('additives_tags', []),
-                            'ingredients_text':product_json.get('ingredients_text')
-                        },
-                        'product_code':product_code,
-                        
-                    }
-                }
-            })
-            index += 1
-            batch_size += 1
-            if batch_size % 25 == 0:
-                dynamodb.batch_write_item(RequestItems={table_name: items})
-                items = []
-                product_code_batch = []
-        else:
-            skipped_index += 1
-        logger.info("Loaded data into table %s.", table.name)
+            progress.update(len(product))
+            product_code, product_fields = read_product(product, offset)
+            if product_code:
+                if barcode_index:
+                    barcode_index.add(product_code, product_fields)
+                position = None
+                if last_offsets is not None:
+                    last_offset = last_offsets.get(product_code)
+                    if last_offset is not None and last_offset != offset:
+                        # A later line of the dump holds the version kept in the table
+                        duplicate_index += 1
+                        continue
+                elif seen_codes.add(product_code):
+                    duplicate_index += 1
+                    position = batch_positions.get(product_code)
+                    if position is None:
+                        # The previous version may still be in flight in another batch,
+                        # the last version is written once every other batch is done
+                        deferred[product_code] = product_fields
+                        continue
+                item = make_item(product_code, product_fields, compress)
+                digest = None
+                if digest_store:
+                    digest = product_digest(item)
+                    if position is None and skip_unchanged and digest == digest_store.get(product_code):
+                        unchanged_index += 1
+                        continue
+                if position is not None:
+                    # Replace the previous version of the product in the current batch
+                    items[position] = {'PutRequest': {'Item': item}}
+                    batch_digests[position] = (product_code, digest)
+                    continue
+                batch_positions[product_code] = len(items)
+                items.append({'PutRequest': {'Item': item}})
+                batch_digests.append((product_code, digest))
+                if len(items) == MAX_BATCH_SIZE:
+                    submit_batch(writer, items, batch_digests, offset, checkpoint, completed)
+                    items = []
+                    batch_digests = []
+                    batch_positions = {}
+            else:
+                skipped_index += 1
 
-    return index, skipped_index
+            if checkpoint and time.monotonic() - last_save > checkpoint_interval:
+                process_completed_batches(completed, checkpoint, digest_store)
+                if digest_store:
+                    digest_store.commit()
+                checkpoint.save()
+                if on_checkpoint:
+                    on_checkpoint()
+                last_save = time.monotonic()
 
-if __name__ == "__main__":
-    url = 'https://static.openfoodfacts.org/data/openfoodfacts-products.jsonl.gz'
+        # Write the last partial batch
+        submit_batch(writer, items, batch_digests, offset, checkpoint, completed)
 
-    print("Downloading the file.")
-    gz_filename = "openfoodfacts-products.jsonl.gz"
-    download_file(url, gz_filename)
-    print("Download complete.")
+        if deferred:
+            print(f"Writing the last version of {len(deferred)} duplicated products.")
+            writer.flush()
+            process_completed_batches(completed, checkpoint, digest_store)
+            items = []
+            batch_digests = []
+            for product_code, product_fields in deferred.items():
+                item = make_item(product_code, product_fields, compress)
+                digest = None
+                if digest_store:
+                    digest = product_digest(item)
+                    if skip_unchanged and digest == digest_store.get(item['product_code']):
+                        unchanged_index += 1
+                        continue
+                items.append({'PutRequest': {'Item': item}})
+                batch_digests.append((item['product_code'], digest))
+                if len(items) == MAX_BATCH_SIZE:
+                    submit_batch(writer, items, batch_digests, offset, checkpoint, completed)
+                    items = []
+                    batch_digests = []
+            submit_batch(writer, items, batch_digests, offset, checkpoint, completed)
 
-    print('unzipping the file')
-    unzip_file(gz_filename)
-    print("Unzipping complete.")
+    process_completed_batches(completed, checkpoint, digest_store)
+    if digest_store:
+        digest_store.commit()
 
-    print("Deleting gz file.")
-    delete_file(gz_filename)
-    print("Deleted gz file.")
+    if last_offsets is not None:
+        print(f"Skipped {duplicate_index} earlier versions of {len(last_offsets)} duplicated products.")
+    else:
+        print(f"Collapsed {duplicate_index} duplicated products into {len(deferred)} last versions "
+              f"among {len(seen_codes)} product codes.")
+    progress.report()
+    print(f"Batch writes retried {writer.retries} times, {writer.throttles} throttled requests.")
+    return writer.written, skipped_index, unchanged_index, writer.failed
 
-    stack_name = sys.argv[1]
+def find_duplicates(products):
+    """
+    Reads the dump once to find the product codes it holds more than once, before loading it.
+
+    Args:
+        products: An iterable of JSON product lines, including their trailing newline.
+
+    Returns:
+        dict: The offset in the dump right after the last version of each duplicated product code.
+    """
+    seen_codes = ProductCodeIndex()
+    last_offsets = {}
+    offset = 0
+    for product in products:
+        offset += len(product)
+        product_code, _ = read_product(product, offset)
+        if product_code and seen_codes.add(product_code):
+            last_offsets[product_code] = offset
+    print(f"Found {len(last_offsets)} duplicated product codes among {len(seen_codes)}.")
+    return last_offsets
+
+def build_index(products, directory):
+    """
+    Writes the barcode index of the dump without loading the table.
+
+    Args:
+        products: An iterable of JSON product lines.
+        directory (str): The directory of the index files.
+    """
+    barcode_index = BarcodeIndexWriter(directory)
+    offset = 0
+    for product in products:
+        offset += len(product)
+        product_code, product_fields = read_product(product, offset)
+        if product_code:
+            barcode_index.add(product_code, product_fields)
+    print(f"Indexed {barcode_index.close()} products in {directory}, "
+          f"{barcode_index.unindexed} products with a non numeric code left out.")
+
+def dump_version(url):
+    """Returns the ETag or the last modification date of the dump, used to tell dumps apart."""
+    response = requests.head(url, allow_redirects=True)
+    response.raise_for_status()
+    return response.headers.get('ETag') or response.headers.get('Last-Modified', '')
+
+def download_state(s3, bucket, path):
+    try:
+        s3.download_file(bucket, os.path.basename(path), path)
+        print(f"Restored {path} from s3://{bucket}.")
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+
+def upload_state(s3, bucket, path):
+    if os.path.exists(path):
+        s3.upload_file(path, bucket, os.path.basename(path))
+    else:
+        s3.delete_object(Bucket=bucket, Key=os.path.basename(path))
+
+def load_table(table_name, products, args, version, last_offsets=None):
+    checkpoint_path = os.path.join(args.state_dir, 'checkpoint.json')
+    digests_path = os.path.join(args.state_dir, 'digests.db')
+    s3 = boto3.client('s3', region_name=os.getenv('AWS_REGION')) if args.state_bucket else None
+
+    def save_state():
+        if s3:
+            upload_state(s3, args.state_bucket, digests_path)
+            upload_state(s3, args.state_bucket, checkpoint_path)
+
+    if s3:
+        download_state(s3, args.state_bucket, checkpoint_path)
+        download_state(s3, args.state_bucket, digests_path)
+
+    checkpoint = Checkpoint(checkpoint_path, version)
+    digest_store = DigestStore(digests_path)
+    barcode_index = None
+    if args.index_dir:
+        if checkpoint.offset:
+            print("The barcode index is not written when resuming a load.")
+        else:
+            barcode_index = BarcodeIndexWriter(args.index_dir)
+    try:
+        uploaded, skipped, unchanged, failed = fill_table(
+            table_name, products, workers=args.writers, write_rate=args.write_rate,
+            checkpoint=checkpoint, digest_store=digest_store, skip_unchanged=not args.full,
+            on_checkpoint=save_state, barcode_index=barcode_index, compress=args.compress,
+            last_offsets=last_offsets,
+        )
+        # The load went through the whole dump, the next one starts from the beginning
+        checkpoint.clear()
+        if barcode_index:
+            print(f"Indexed {barcode_index.close()} products in {args.index_dir}.")
+        print(f"Uploaded {uploaded} products to the table.")
+        print(f"Skipped {skipped} products.")
+        print(f"Unchanged {unchanged} products.")
+        print(f"Failed to write {failed} products.")
+    except Exception as e:
+        print("An error occurred:", e)
+        checkpoint.save()
+    finally:
+        digest_store.close()
+        save_state()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load the Open Food Facts products dump into DynamoDB.")
+    parser.add_argument("stack_name", help="Name of the stack holding the Open Food Facts table.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Download, decompress and load the dump in a single pass without writing it to disk. "
+                             "A product repeated in the dump may then be written more than once.")
+    parser.add_argument("--writers", type=int, default=32,
+                        help="Number of concurrent DynamoDB batch writers.")
+    parser.add_argument("--connections", type=int, default=8,
+                        help="Number of concurrent Range requests when downloading the file.")
+    parser.add_argument("--write-rate", type=float, default=None,
+                        help="Target number of items written per second (unlimited by default).")
+    parser.add_argument("--state-dir", default=".",
+                        help="Directory of the checkpoint and product digests files.")
+    parser.add_argument("--state-bucket", default=os.getenv('STATE_BUCKET'),
+                        help="S3 bucket keeping the checkpoint and product digests between runs.")
+    parser.add_argument("--full", action="store_true",
+                        help="Write every product, including those unchanged since the last load.")
+    parser.add_argument("--compress", action="store_true",
+                        help="Store the large product attributes as compressed binary values.")
+    parser.add_argument("--index-dir", default=None,
+                        help="Also write a memory-mapped barcode index of the dump to this directory.")
+    parser.add_argument("--index-only", action="store_true",
+                        help="Only write the barcode index, without loading the table.")
+    args = parser.parse_args()
+
+    url = 'https://static.openfoodfacts.org/data/openfoodfacts-products.jsonl.gz'
+    stack_name = args.stack_name
     output_key = 'openFoodFactsProductsTableNameOutput'
 
-    # Retrieve the value for the specified output key
-    table_name = describe_stack_output(stack_name, output_key)
-    if table_name:
-        with open(gz_filename[:-3]) as f:
-            try:
-                uploaded, skipped = fill_table(table_name, f)
-                print(f"Uploaded {uploaded} products to the table.")
-                print(f"Skipped {skipped} products.")
-            except Exception as e:
-                print("An error occurred:", e)
+    if args.index_only:
+        if not args.index_dir:
+            parser.error("--index-only requires --index-dir")
+        build_index(stream_products(url), args.index_dir)
+    elif args.stream:
+        version = dump_version(url)
+        # Retrieve the value for the specified output key
+        table_name = describe_stack_output(stack_name, output_key)
+        if table_name:
+            print("Streaming the file into the table.")
+            load_table(table_name, stream_products(url), args, version)
+    else:
+        version = dump_version(url)
+        print("Downloading the file.")
+        gz_filename = "openfoodfacts-products.jsonl.gz"
+        download_file(url, gz_filename, connections=args.connections)
+        print("Download complete.")
+
+        print('unzipping the file')
+        unzip_file(gz_filename)
+        print("Unzipping complete.")
+
+        print("Deleting gz file.")
+        delete_file(gz_filename)
+        print("Deleted gz file.")
 
+        # Retrieve the value for the specified output key
+        table_name = describe_stack_output(stack_name, output_key)
+        if table_name:
+            with open(gz_filename[:-3], 'rb') as f:
+                print("Finding the duplicated products.")
+                last_offsets = find_duplicates(f)
+                f.seek(0)
+                load_table(table_name, f, args, version, last_offsets)
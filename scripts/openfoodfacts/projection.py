@@ -0,0 +1,125 @@
+import json
+import math
+from decimal import Decimal
+
+# Fields of the Open Food Facts products kept in the table, with their default value
+PRODUCT_FIELDS = {
+    'product_name': '',
+    'additives_tags': [],
+    'ingredients_text': None,
+}
+
+# Fields read by the barcode_ingredients Lambda, only stored when the product has a value
+OPTIONAL_FIELDS = (
+    'allergens_tags',
+    'nutriments',
+    'labels_tags',
+    'categories',
+    'nova_group',
+    'nutriscore_grade',
+    'ecoscore_grade',
+    'brands',
+    'image_small_url',
+    'image_thumb_url',
+)
+
+# Same key nutritional fields as filter_nutriments in the barcode_ingredients Lambda
+NUTRIMENT_FIELDS = (
+    'energy-kcal_100g',
+    'carbohydrates_100g',
+    'sugars_100g',
+    'fat_100g',
+    'saturated-fat_100g',
+    'salt_100g',
+    'sodium_100g',
+    'proteins_100g',
+    'fiber_100g',
+)
+
+_EMPTY_VALUES = (None, '', [], {})
+
+# orjson decodes the dump lines several times faster than json, which stays the fallback
+try:
+    from orjson import JSONDecodeError as _DecodeError, loads as _loads
+except ImportError:
+    from json import JSONDecodeError as _DecodeError
+    _loads = json.loads
+
+
+def filter_nutriments(nutriments):
+    """
+    Keeps the key nutritional fields with a finite numeric value.
+
+    Args:
+        nutriments (dict): The nutriments of the product.
+
+    Returns:
+        dict: The key nutritional fields as Decimal.
+    """
+    if not isinstance(nutriments, dict):
+        return {}
+    filtered = {}
+    for field in NUTRIMENT_FIELDS:
+        value = nutriments.get(field)
+        if value is None or isinstance(value, bool):
+            continue
+        try:
+            value = Decimal(str(value))
+        except ArithmeticError:
+            continue
+        if value.is_finite():
+            filtered[field] = value
+    return filtered
+
+
+def project_values(values, fields=PRODUCT_FIELDS, optional_fields=OPTIONAL_FIELDS):
+    """
+    Extracts the product code and the fields stored in the table from a decoded product.
+
+    Args:
+        values (dict): The decoded JSON product, or the fields of a projected product along with its code.
+        fields (dict): The fields to keep, with their default value.
+        optional_fields (tuple): The fields to keep only when the product has a value.
+
+    Returns:
+        tuple: The product code, or None if missing, and a dictionary of the kept fields.
+    """
+    product = {field: values.get(field, default) for field, default in fields.items()}
+    for field in optional_fields:
+        value = values.get(field)
+        if field == 'nutriments':
+            value = filter_nutriments(value)
+        elif isinstance(value, float):
+            # DynamoDB does not accept floats, nor the NaN and Infinity values json decodes
+            value = Decimal(str(value)) if math.isfinite(value) else None
+        if value not in _EMPTY_VALUES:
+            product[field] = value
+    return values.get('code'), product
+
+
+def project_product(line, fields=PRODUCT_FIELDS, optional_fields=OPTIONAL_FIELDS):
+    """
+    Extracts the product code and the fields stored in the table from a line of the dump.
+
+    Args:
+        line (bytes or str): A JSON product from the dump.
+        fields (dict): The fields to keep, with their default value.
+        optional_fields (tuple): The fields to keep only when the product has a value.
+
+    Returns:
+        tuple: The product code, or None if missing, and a dictionary of the kept fields.
+
+    Raises:
+        ValueError: If the line is not valid JSON.
+    """
+    try:
+        values = _loads(line)
+    except _DecodeError:
+        # orjson rejects NaN, Infinity and lone surrogates, which json accepts
+        values = json.loads(line)
+    return project_values(values, fields, optional_fields)
+
+
+def project_product_json(line, fields=PRODUCT_FIELDS, optional_fields=OPTIONAL_FIELDS):
+    """Same as project_product but decodes the line with json, used as the reference path."""
+    return project_values(json.loads(line), fields, optional_fields)
@@ -0,0 +1,192 @@
+"""
+Downloads a large file over several HTTP Range requests at once.
+
+The file is split in fixed-size chunks written in place in a file preallocated to the
+advertised length. The completed chunks are recorded next to it, in <filename>.parts, so an
+interrupted download resumes with the missing chunks only, as long as the remote file keeps
+the same ETag or Last-Modified date. Servers that do not accept Range requests are
+downloaded with a single request.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from tqdm import tqdm
+
+CHUNK_SIZE = 64 * 1024 * 1024
+BLOCK_SIZE = 1024 * 1024
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class DownloadError(Exception):
+    pass
+
+
+class _IncompleteChunk(Exception):
+    pass
+
+
+def _remote_file(session, url, timeout):
+    """
+    Retrieves the length and version of a remote file.
+
+    Returns:
+        tuple: The length in bytes or None if unknown, the ETag or Last-Modified date,
+            and whether the server accepts Range requests.
+    """
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    response.raise_for_status()
+    length = response.headers.get('Content-Length')
+    version = response.headers.get('ETag') or response.headers.get('Last-Modified')
+    accepts_ranges = response.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    return (int(length) if length is not None else None), version, accepts_ranges
+
+
+def _load_parts(parts_path, length, version, chunk_size):
+    if not os.path.exists(parts_path):
+        return set()
+    with open(parts_path) as f:
+        parts = json.load(f)
+    # The chunks of another version of the remote file cannot be reused
+    if version is None or (parts['length'], parts['version'], parts['chunk_size']) != (length, version, chunk_size):
+        return set()
+    return set(parts['done'])
+
+
+def _save_parts(parts_path, length, version, chunk_size, done):
+    tmp_path = parts_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'length': length, 'version': version, 'chunk_size': chunk_size, 'done': sorted(done)}, f)
+    os.replace(tmp_path, parts_path)
+
+
+def _download_chunk(session, url, filename, start, end, version, progress, max_retries, timeout):
+    """
+    Writes the bytes from start to end (inclusive) of the remote file at the same position
+    in the local file, retrying from the first missing byte after a failure.
+    """
+    position = start
+    attempt = 0
+    headers = {}
+    if version and not version.startswith('W/'):
+        # The server answers with the whole file instead of a partial one if it changed
+        headers['If-Range'] = version
+    while True:
+        try:
+            headers['Range'] = f'bytes={position}-{end}'
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 200:
+                    raise DownloadError(f"{url} changed during the download or ignored the Range request")
+                if response.status_code != 206:
+                    response.raise_for_status()
+                    raise DownloadError(f"Unexpected status {response.status_code} for {url}")
+                with open(filename, 'r+b') as f:
+                    f.seek(position)
+                    for data in response.iter_content(BLOCK_SIZE):
+                        data = data[:end + 1 - position]
+                        f.write(data)
+                        position += len(data)
+                        progress(len(data))
+                        if position > end:
+                            break
+            if position > end:
+                return
+            raise _IncompleteChunk(f"Connection closed after {position - start} of {end + 1 - start} bytes")
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code not in RETRYABLE_STATUS_CODES:
+                raise
+            error = e
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                _IncompleteChunk) as e:
+            error = e
+        attempt += 1
+        if attempt > max_retries:
+            raise DownloadError(f"Chunk {start}-{end} of {url} failed after {max_retries} retries") from error
+        time.sleep(min(2 ** attempt * 0.5, 30))
+
+
+def _download_whole(session, url, filename, timeout):
+    with session.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        total_size = int(response.headers.get('content-length', 0))
+        progress_bar = tqdm(total=total_size, unit='B', unit_scale=True)
+        written = 0
+        with open(filename, 'wb') as f:
+            for data in response.iter_content(BLOCK_SIZE):
+                progress_bar.update(len(data))
+                f.write(data)
+                written += len(data)
+        progress_bar.close()
+    if total_size and written != total_size:
+        raise DownloadError(f"Received {written} bytes of {url} instead of {total_size}")
+
+
+def download_file(url, filename, connections=8, chunk_size=CHUNK_SIZE, max_retries=5, timeout=60, session=None):
+    """
+    Downloads a file with concurrent Range requests, resuming a previous partial download.
+
+    Args:
+        url (str): The URL of the file.
+        filename (str): The local path of the file.
+        connections (int): The number of concurrent requests.
+        chunk_size (int): The number of bytes of each Range request.
+        max_retries (int): The number of retries of each chunk.
+        timeout (float): The connect and read timeout of the requests, in seconds.
+        session (requests.Session): The session to use, a new one is created if None.
+
+    Returns:
+        int: The size of the downloaded file in bytes.
+    """
+    session = session or requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    length, version, accepts_ranges = _remote_file(session, url, timeout)
+    if not accepts_ranges or not length:
+        print("The server does not accept Range requests, downloading with a single connection.")
+        _download_whole(session, url, filename, timeout)
+        return os.path.getsize(filename)
+
+    parts_path = filename + '.parts'
+    chunks = [(start, min(start + chunk_size, length) - 1) for start in range(0, length, chunk_size)]
+    done = _load_parts(parts_path, length, version, chunk_size) if os.path.exists(filename) else set()
+    if not done:
+        with open(filename, 'wb') as f:
+            f.truncate(length)
+
+    missing = [i for i in range(len(chunks)) if i not in done]
+    resumed = sum(chunks[i][1] + 1 - chunks[i][0] for i in done)
+    if resumed:
+        print(f"Resuming the download, {len(missing)} of {len(chunks)} chunks left.")
+
+    progress_bar = tqdm(total=length, initial=resumed, unit='B', unit_scale=True)
+    lock = threading.Lock()
+
+    def progress(size):
+        with lock:
+            progress_bar.update(size)
+
+    def download(i):
+        start, end = chunks[i]
+        _download_chunk(session, url, filename, start, end, version, progress, max_retries, timeout)
+        with lock:
+            done.add(i)
+            _save_parts(parts_path, length, version, chunk_size, done)
+
+    try:
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            # Consume the results to raise the first chunk that failed
+            for _ in executor.map(download, missing):
+                pass
+    finally:
+        progress_bar.close()
+
+    size = os.path.getsize(filename)
+    if size != length or len(done) != len(chunks):
+        raise DownloadError(f"Downloaded {size} bytes of {url} instead of {length}")
+    os.remove(parts_path)
+    return size